@@ -0,0 +1,274 @@
+"""Implicit-feedback matrix factorisation (ALS) for collaborative scoring.
+
+Interactions from watch_history, favorites and ratings (the weighted CSR
+matrix built by interactions.InteractionMatrix) are treated as implicit
+confidence, following Hu, Koren & Volinsky: each observed weight r becomes a
+confidence 1 + alpha * r on a preference of 1. Alternating least squares
+updates all users, then all items, using conjugate-gradient steps batched
+through NumPy so there is no per-user Python loop.
+
+A trained model is a directory of .npy files plus a manifest, published
+as a version of an engine_snapshot.SnapshotStore. Serving memory-maps it,
+and scoring a user against the whole catalog is a single matrix-vector
+product.
+
+    python als.py --database database.db --out als_model
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from engine_snapshot import SnapshotStore
+from neighbors import top_k
+
+FORMAT_VERSION = 1
+ARRAYS = ('user_factors', 'item_factors', 'user_ids', 'movie_ids', 'seen_indptr', 'seen_indices')
+
+
+def _solve_rows(confidence, fixed, initial, regularization, cg_steps=3, batch_nnz=262144):
+    """Update the factors of every row of confidence with the other side held fixed.
+
+    Each row solves (Y^T C_u Y + reg I) x = Y^T C_u p_u with a few conjugate
+    gradient steps warm-started from initial, vectorised across a batch of
+    rows so the work is O(nnz * k) per step rather than O(nnz * k^2).
+    """
+    n_rows, k = confidence.shape[0], fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(k, dtype=np.float32)
+    factors = np.array(initial, dtype=np.float32)
+    indptr = confidence.indptr
+
+    start = 0
+    while start < n_rows:
+        # Take as many rows as fit in batch_nnz interactions (always at least one)
+        stop = int(np.searchsorted(indptr, indptr[start] + batch_nnz, side='right')) - 1
+        stop = min(max(stop, start + 1), n_rows)
+        block = confidence[start:stop]
+        owner = np.repeat(np.arange(stop - start), np.diff(block.indptr))
+        vectors = fixed[block.indices]
+
+        def apply(p):
+            # (Y^T Y + reg I) p + Y^T (C_u - I) Y p, for every row in the block
+            dots = np.einsum('nk,nk->n', vectors, p[owner])
+            weighted = sp.csr_matrix((block.data * dots, block.indices, block.indptr),
+                                     shape=block.shape)
+            return p @ gram + weighted @ fixed
+
+        rhs = sp.csr_matrix((block.data + 1, block.indices, block.indptr), shape=block.shape) @ fixed
+        x = factors[start:stop]
+        residual = rhs - apply(x)
+        direction = residual.copy()
+        norm = np.einsum('nk,nk->n', residual, residual)
+        for _ in range(cg_steps):
+            applied = apply(direction)
+            step = norm / np.maximum(np.einsum('nk,nk->n', direction, applied), 1e-12)
+            x += step[:, None] * direction
+            residual -= step[:, None] * applied
+            new_norm = np.einsum('nk,nk->n', residual, residual)
+            direction = residual + (new_norm / np.maximum(norm, 1e-12))[:, None] * direction
+            norm = new_norm
+        factors[start:stop] = x
+        start = stop
+
+    return factors
+
+
+def train_als(interactions, factors=32, regularization=0.1, alpha=20.0, iterations=10,
+              cg_steps=3, seed=0):
+    """Fit (user_factors, item_factors) to a users x items interaction matrix"""
+    confidence = sp.csr_matrix(interactions, dtype=np.float32) * alpha
+    confidence_t = confidence.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    users = (rng.standard_normal((confidence.shape[0], factors)) * 0.01).astype(np.float32)
+    items = (rng.standard_normal((confidence.shape[1], factors)) * 0.01).astype(np.float32)
+
+    for _ in range(iterations):
+        users = _solve_rows(confidence, items, users, regularization, cg_steps)
+        items = _solve_rows(confidence_t, users, items, regularization, cg_steps)
+    return users, items
+
+
+class ALSModel:
+    def __init__(self, user_factors, item_factors, user_ids, movie_ids, seen_indptr, seen_indices,
+                 trained_at=None):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+        self.seen_indptr = seen_indptr
+        self.seen_indices = seen_indices
+        self.trained_at = trained_at
+        self.row_of = {int(user_id): row for row, user_id in enumerate(user_ids)}
+        self.col_of = {int(movie_id): col for col, movie_id in enumerate(movie_ids)}
+
+    @classmethod
+    def train(cls, snapshot, **params):
+        """Train on an interactions.InteractionSnapshot"""
+        interactions = snapshot.interactions
+        user_factors, item_factors = train_als(interactions, **params)
+        return cls(user_factors, item_factors, snapshot.user_ids, snapshot.movie_ids,
+                   interactions.indptr, interactions.indices, time.time())
+
+    def __contains__(self, user_id):
+        return user_id in self.row_of
+
+    def scores(self, user_id):
+        """Predicted preference of user_id for every movie (one matrix-vector product)"""
+        row = self.row_of.get(user_id)
+        if row is None:
+            return None
+        return self.item_factors @ self.user_factors[row]
+
+    def recommend(self, user_id, n=10, scores=None):
+        """Top-n unseen movie ids for user_id"""
+        scores = self.scores(user_id) if scores is None else scores
+        if scores is None:
+            return []
+        row = self.row_of[user_id]
+        scores = np.array(scores, dtype=np.float32)
+        scores[self.seen_indices[self.seen_indptr[row]:self.seen_indptr[row + 1]]] = -np.inf
+        return [int(self.movie_ids[col]) for col in top_k(scores, n) if np.isfinite(scores[col])]
+
+    def save(self, path):
+        """Write the model into the directory path as .npy files plus manifest.json.
+
+        Files are written in place: save into a fresh directory (as
+        SnapshotStore.publish provides) rather than over a model in use.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), np.asarray(getattr(self, name)))
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'users': len(self.user_ids),
+            'movies': len(self.movie_ids),
+            'factors': int(self.user_factors.shape[1]),
+            'trained_at': self.trained_at,
+        }
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved model; factor matrices are memory-mapped unless mmap is False"""
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported ALS model format in {path}")
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None)
+                  for name in ARRAYS}
+        return cls(trained_at=manifest.get('trained_at'), **arrays)
+
+
+class ALSJob:
+    """Retrain the ALS model in a background thread on a fixed interval.
+
+    With a path, models are published as versions of a SnapshotStore there.
+    Only the process holding its build lock trains; the others poll CURRENT
+    and load each model as it is published, so N workers train once between
+    them and never read files from two different models.
+    """
+
+    def __init__(self, interactions, path=None, interval=60 * 60, **params):
+        self.interactions = interactions
+        self.store = SnapshotStore(path) if path else None
+        self.interval = interval
+        self.params = params
+        self.model = None
+        self.version = None
+        self._thread = None
+        self.adopt()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def adopt(self):
+        """Load the published model unless it is already in use; False if there is none"""
+        if self.store is None:
+            return False
+        try:
+            version = self.store.current_version()
+            if version is None:
+                return False
+            if version != self.version:
+                self.model = ALSModel.load(self.store.path(version))
+                self.version = version
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            print("ALS model load error:", e)
+            return False
+
+    def run_once(self):
+        """Train on the latest interactions and publish the model.
+
+        Returns None when there is nothing to train on or another process
+        holds the build lock.
+        """
+        if self.store is not None and not self.store.acquire_build_lock():
+            return None
+        try:
+            return self._train()
+        finally:
+            if self.store is not None:
+                self.store.release_build_lock()
+
+    def _train(self):
+        snapshot = self.interactions.current()
+        if snapshot is None or snapshot.interactions.nnz == 0:
+            return None
+        model = ALSModel.train(snapshot, **self.params)
+        if self.store is not None:
+            self.version = self.store.publish(lambda path, version: model.save(path))
+        self.model = model
+        return model
+
+    def _due(self):
+        model = self.model
+        return model is None or time.time() - (model.trained_at or 0) >= self.interval
+
+    def _loop(self):
+        while True:
+            try:
+                self.adopt()
+                if self._due() and (self.store is None or self.store.acquire_build_lock()):
+                    try:
+                        # Another process may have published while this one waited
+                        self.adopt()
+                        if self._due():
+                            self._train()
+                    finally:
+                        if self.store is not None:
+                            self.store.release_build_lock()
+            except Exception as e:
+                print("ALS training error:", e)
+            time.sleep(min(self.interval, 60))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from interactions import InteractionMatrix
+    from storage import make_storage
+
+    parser = argparse.ArgumentParser(description='Train the ALS model from the app database')
+    parser.add_argument('--database', default='database.db', help='SQLite path or postgresql:// URL')
+    parser.add_argument('--out', default='als_model')
+    parser.add_argument('--factors', type=int, default=32)
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    job = ALSJob(InteractionMatrix(make_storage(args.database)), args.out,
+                 factors=args.factors, iterations=args.iterations)
+    start = time.perf_counter()
+    model = job.run_once()
+    if model is None:
+        print("No interactions to train on, or another process is training")
+    else:
+        print(f"Trained {len(model.user_ids)} users x {len(model.movie_ids)} movies "
+              f"in {time.perf_counter() - start:.1f}s -> {args.out}")
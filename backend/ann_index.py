@@ -0,0 +1,151 @@
+"""Approximate nearest-neighbour index over reduced TF-IDF embeddings.
+
+TF-IDF rows are reduced to a small dense embedding with truncated SVD and
+hashed with random-hyperplane LSH into several tables. A query gathers the
+movies that share a bucket with it (optionally probing buckets one bit
+away), then re-ranks that candidate set by exact cosine, either on the
+embeddings or through a caller-supplied scorer such as the original TF-IDF
+rows. More tables or probes raise recall; more bits per table shrink the
+buckets and lower latency.
+
+All state is plain NumPy arrays, saved as .npy files next to a JSON
+manifest so worker processes can memory-map a prebuilt index at boot;
+similarity.ANNBackend publishes them as SnapshotStore versions.
+"""
+import json
+import os
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+
+FORMAT_VERSION = 1
+ARRAYS = ('components', 'embeddings', 'movie_ids', 'planes', 'codes', 'order')
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+
+class LSHIndex:
+    def __init__(self, components, embeddings, movie_ids, planes, codes, order, probes=1):
+        self.components = components
+        self.embeddings = embeddings
+        self.movie_ids = movie_ids
+        self.planes = planes
+        self.codes = codes
+        self.order = order
+        self.probes = probes
+        self.row_of = {int(movie_id): row for row, movie_id in enumerate(movie_ids)}
+        self._weights = 1 << np.arange(planes.shape[1], dtype=np.int64)
+
+    @classmethod
+    def build(cls, matrix, movie_ids, dimensions=64, n_tables=8, n_bits=12, probes=0, seed=0):
+        """Fit the SVD projection and hash tables for a TF-IDF matrix"""
+        dimensions = max(1, min(dimensions, matrix.shape[1] - 1, matrix.shape[0] - 1))
+        svd = TruncatedSVD(n_components=dimensions, random_state=seed)
+        embeddings = _normalize(svd.fit_transform(matrix))
+        components = svd.components_.astype(np.float32)
+
+        rng = np.random.default_rng(seed)
+        planes = rng.standard_normal((n_tables, n_bits, dimensions)).astype(np.float32)
+        index = cls(components, embeddings, np.asarray(movie_ids, dtype=np.int64), planes,
+                    np.empty((n_tables, 0), dtype=np.int64), np.empty((n_tables, 0), dtype=np.int64),
+                    probes)
+
+        # Each table is a sorted array of bucket codes so a bucket is one searchsorted range
+        all_codes = index._hash(embeddings)
+        index.order = np.argsort(all_codes, axis=1, kind='stable')
+        index.codes = np.take_along_axis(all_codes, index.order, axis=1)
+        return index
+
+    def __contains__(self, movie_id):
+        return movie_id in self.row_of
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def embed(self, tfidf_rows):
+        """Project TF-IDF rows (same vocabulary as the build) into embedding space"""
+        return _normalize(np.asarray(tfidf_rows @ self.components.T))
+
+    def query(self, vector, n=10, exclude=None, probes=None, rerank=None):
+        """Approximate top-n (movie_ids, scores) for an embedding vector.
+
+        rerank, if given, maps an array of candidate rows to their scores and
+        replaces the embedding cosine used for the final ordering.
+        """
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        candidates = self.candidates(vector, self.probes if probes is None else probes)
+        if exclude is not None:
+            candidates = candidates[self.movie_ids[candidates] != exclude]
+        if candidates.size == 0:
+            return [], []
+
+        if rerank is not None:
+            scores = np.asarray(rerank(candidates), dtype=np.float32).ravel()
+        else:
+            scores = self.embeddings[candidates] @ vector
+        n = min(n, candidates.size)
+        best = np.argpartition(-scores, n - 1)[:n]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [int(movie_id) for movie_id in self.movie_ids[candidates[best]]], scores[best].tolist()
+
+    def query_movie(self, movie_id, n=10, probes=None, rerank=None):
+        row = self.row_of.get(movie_id)
+        if row is None:
+            return None
+        return self.query(self.embeddings[row], n, exclude=movie_id, probes=probes, rerank=rerank)[0]
+
+    def candidates(self, vector, probes=1):
+        """Rows that share a bucket with vector in any table, within probes bit flips"""
+        codes = self._hash(vector[None, :])[:, 0]
+        rows = []
+        for table, code in enumerate(codes):
+            probe_codes = [code]
+            if probes:
+                probe_codes += [code ^ (1 << bit) for bit in range(self.planes.shape[1])]
+            for probe in probe_codes:
+                lo, hi = np.searchsorted(self.codes[table], [probe, probe + 1])
+                if hi > lo:
+                    rows.append(self.order[table, lo:hi])
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(rows))
+
+    def save(self, path):
+        """Write the index to a directory of .npy files plus manifest.json.
+
+        Files are written in place: save into a fresh directory (such as a
+        SnapshotStore version) that readers do not see until it is complete.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'movies': len(self.movie_ids),
+            'dimensions': int(self.planes.shape[2]),
+            'tables': int(self.planes.shape[0]),
+            'bits': int(self.planes.shape[1]),
+            'probes': self.probes,
+        }
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved index; arrays are memory-mapped unless mmap is False"""
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported ANN index format in {path}")
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None)
+                  for name in ARRAYS}
+        return cls(probes=manifest['probes'], **arrays)
+
+    def _hash(self, embeddings):
+        # (tables, bits, dim) x (n, dim) -> (tables, n) integer bucket codes
+        bits = np.einsum('tbd,nd->tnb', self.planes, embeddings) > 0
+        return bits.astype(np.int64) @ self._weights
@@ -1,18 +1,34 @@
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, request, jsonify, g
 from utils import search_movie, get_popular_movies, get_top_rated_movies, get_trending_movies, get_new_releases, get_movies_by_genre
+from utils import (cached_results, genre_request, new_releases_request, popular_request, top_rated_request,
+                   trending_request)
+from hydration import MovieHydrator
+from tmdb_cache import cache as tmdb_cache
+from tmdb_client import client as tmdb_client
+from content_index import ContentIndex, movie_text
+from similarity import make_backend
+from interactions import InteractionMatrix
+from als import ALSJob
+from rec_store import RecommendationStore
+from catalog import MovieCatalog, CatalogSync
+from search_index import SearchIndex
+from response_cache import ResponseCache, cacheable
+from feed import HomeFeed, MAX_SECTION_SIZE
+from genres import GenreIndex, GenreRegistry, slug
+from engine_snapshot import EngineState, SnapshotStore
+from storage import make_storage
+from auth import PrincipalCache, principal
 from flask_cors import CORS
-import sqlite3
 import os
 import hashlib
 import secrets
 import jwt
 import datetime
-import requests
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from functools import wraps
+import base64
 import json
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,38 +37,68 @@ TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 print("TMDB API KEY:", TMDB_API_KEY)
 
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "http://localhost:5173"}})
+app.config['CORS_ORIGINS'] = os.getenv('CORS_ORIGINS', 'http://localhost:5173')
+CORS(app, resources={r"/api/*": {"origins": app.config['CORS_ORIGINS']}})
 
 # Configuration
 app.config['SECRET_KEY'] = 'your-secret-key'  # Change this in production
 app.config['TMDB_API_KEY'] = TMDB_API_KEY  # Use env value instead of hardcoding
 app.config['DATABASE'] = 'database.db'
-app.config['TMDB_BASE_URL'] = 'https://api.themoviedb.org/3'
-
-# Database setup
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(app.config['DATABASE'])
-        db.row_factory = sqlite3.Row
-    return db
-
-@app.teardown_appcontext
-def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+app.config['TMDB_BASE_URL'] = os.getenv('TMDB_BASE_URL', 'https://api.themoviedb.org/3')
+app.config['HYDRATION_WORKERS'] = int(os.getenv('HYDRATION_WORKERS', 8))
+app.config['HYDRATION_TIMEOUT'] = float(os.getenv('HYDRATION_TIMEOUT', 3.0))
+app.config['SIMILARITY_BACKEND'] = os.getenv('SIMILARITY_BACKEND', 'table')  # exact, table or ann
+app.config['ANN_INDEX_PATH'] = os.getenv('ANN_INDEX_PATH', 'ann_index')
+app.config['ENGINE_SNAPSHOT_PATH'] = os.getenv('ENGINE_SNAPSHOT_PATH', 'engine_snapshot')  # '' disables
+app.config['SNAPSHOT_POLL_INTERVAL'] = int(os.getenv('SNAPSHOT_POLL_INTERVAL', 30))
+app.config['ALS_MODEL_PATH'] = os.getenv('ALS_MODEL_PATH', 'als_model')
+app.config['ALS_TRAIN_INTERVAL'] = int(os.getenv('ALS_TRAIN_INTERVAL', 60 * 60))
+app.config['CORPUS_SIZE'] = int(os.getenv('CORPUS_SIZE', 5000))
+app.config['CATALOG_SYNC_PAGES'] = int(os.getenv('CATALOG_SYNC_PAGES', 5))
+app.config['CATALOG_SYNC_INTERVAL'] = int(os.getenv('CATALOG_SYNC_INTERVAL', 6 * 60 * 60))
+app.config['CATALOG_SYNC_WORKERS'] = int(os.getenv('CATALOG_SYNC_WORKERS', 4))
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 16))  # 0 opens a connection per request
+app.config['MAX_BATCH_SIZE'] = int(os.getenv('MAX_BATCH_SIZE', 500))  # events per batch write request
+app.config['BATCH_LOOKUP_TIMEOUT'] = float(os.getenv('BATCH_LOOKUP_TIMEOUT', 15.0))  # s to fetch movies missing from the catalog
+app.config['BATCH_LOOKUP_WORKERS'] = int(os.getenv('BATCH_LOOKUP_WORKERS', 4))
+app.config['BATCH_LOOKUP_MAX_FETCHES'] = int(os.getenv('BATCH_LOOKUP_MAX_FETCHES', 50))  # per request
+app.config['ACCESS_TOKEN_MINUTES'] = int(os.getenv('ACCESS_TOKEN_MINUTES', 24 * 60))
+app.config['REFRESH_TOKEN_DAYS'] = int(os.getenv('REFRESH_TOKEN_DAYS', 30))
+app.config['PRINCIPAL_CACHE_TTL'] = int(os.getenv('PRINCIPAL_CACHE_TTL', 300))  # s a changed user may stay cached
+app.config['DATABASE_URL'] = os.getenv('DATABASE_URL', app.config['DATABASE'])  # SQLite path or postgresql:// URL
+app.config['SEARCH_INDEX_REFRESH'] = int(os.getenv('SEARCH_INDEX_REFRESH', 10 * 60))  # s between rebuilds from the catalog
+app.config['SEARCH_MIN_LOCAL_RESULTS'] = int(os.getenv('SEARCH_MIN_LOCAL_RESULTS', 1))  # fewer local matches ask TMDB
+app.config['RESPONSE_MAX_AGE'] = int(os.getenv('RESPONSE_MAX_AGE', 60))  # s clients may reuse a TMDB-backed response
+app.config['FEED_WORKERS'] = int(os.getenv('FEED_WORKERS', 8))
+app.config['FEED_SECTION_TIMEOUT'] = float(os.getenv('FEED_SECTION_TIMEOUT', 2.0))  # s before a feed section is left empty
+app.config['FEED_DEFAULT_SECTIONS'] = os.getenv('FEED_DEFAULT_SECTIONS', 'trending,popular,top_rated,new_releases,action,comedy')
+app.config['GENRE_SYNC_INTERVAL'] = int(os.getenv('GENRE_SYNC_INTERVAL', 24 * 60 * 60))
+app.config['GENRE_INDEX_REFRESH'] = int(os.getenv('GENRE_INDEX_REFRESH', 10 * 60))  # s between rebuilds from the catalog
+app.config['GENRE_MIN_LOCAL_RESULTS'] = int(os.getenv('GENRE_MIN_LOCAL_RESULTS', 20))  # shorter local pages ask TMDB
+
+# Database setup: users, favorites, history and ratings go through the storage backend
+storage = make_storage(app.config['DATABASE_URL'], app.config['DB_POOL_SIZE'])
 
 def init_db():
-    with app.app_context():
-        db = get_db()
-        with app.open_resource('schema.sql', mode='r') as f:
-            db.cursor().executescript(f.read())
-        db.commit()
+    storage.init_schema()
 
 # Create database if it doesn't exist
-if not os.path.exists(app.config['DATABASE']):
-    init_db()
+storage.ensure_schema()
+
+# Local movie catalog, fed by every TMDB response the cache fetches
+movie_catalog = MovieCatalog(app.config['DATABASE'])
+tmdb_cache.listeners.append(movie_catalog.ingest_response)
+
+# Title search over the local catalog, kept current by every catalog write
+movie_search = SearchIndex()
+movie_catalog.listeners.append(movie_search.add)
+movie_search.start(movie_catalog.titles, app.config['SEARCH_INDEX_REFRESH'])
+
+# Genre names (synced from TMDB further down) and per-genre masks over the catalog
+genre_registry = GenreRegistry()
+genre_index = GenreIndex()
+movie_catalog.listeners.append(genre_index.add)
+genre_index.start(movie_catalog.genres, app.config['GENRE_INDEX_REFRESH'])
 
 # Authentication helpers
 def hash_password(password):
@@ -74,12 +120,15 @@ def verify_password(stored_password, provided_password):
     pwdhash = pwdhash.hex()
     return pwdhash == stored_password
 
-def generate_token(user_id):
-    """Generate JWT token for authentication"""
+def generate_token(user):
+    """Generate JWT access token for authentication, carrying the user's public fields"""
     payload = {
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(days=1),
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=app.config['ACCESS_TOKEN_MINUTES']),
         'iat': datetime.datetime.utcnow(),
-        'sub': user_id
+        'sub': user['id'],
+        'typ': 'access',
+        'name': user['username'],
+        'email': user['email']
     }
     return jwt.encode(
         payload,
@@ -87,101 +136,236 @@ def generate_token(user_id):
         algorithm='HS256'
     )
 
+def hash_refresh_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def issue_tokens(user):
+    """Access token plus a new single-use refresh token for user"""
+    refresh_token = secrets.token_urlsafe(32)
+    expires_at = time.time() + app.config['REFRESH_TOKEN_DAYS'] * 24 * 60 * 60
+    storage.add_refresh_token(user['id'], hash_refresh_token(refresh_token), expires_at)
+    return {
+        'token': generate_token(user),
+        'refreshToken': refresh_token,
+        'expiresIn': app.config['ACCESS_TOKEN_MINUTES'] * 60
+    }
+
+# Users behind valid tokens, so authenticated requests rarely need the users table
+principals = PrincipalCache(storage.get_user, ttl=app.config['PRINCIPAL_CACHE_TTL'])
+
+def bearer_token(auth_header):
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header[7:]
+    return None
+
+def decode_access_token(token):
+    """Claims of a valid access token; raises jwt.InvalidTokenError otherwise"""
+    data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+    # Tokens from before refresh tokens existed have no typ
+    if data.get('typ', 'access') != 'access':
+        raise jwt.InvalidTokenError('not an access token')
+    return data
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header[7:]
+        token = bearer_token(request.headers.get('Authorization'))
         
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
         
+        started = time.perf_counter()
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+            data = decode_access_token(token)
             current_user_id = data['sub']
             
-            # Get user from database
-            db = get_db()
-            user = db.execute('SELECT * FROM users WHERE id = ?', (current_user_id,)).fetchone()
+            # Get user from the principal cache, the token's claims or the database
+            user = principals.get(current_user_id, data)
             
             if not user:
                 return jsonify({'message': 'User not found!'}), 401
                 
             # Add user to g object for use in route
-            g.user = dict(user)
+            g.user = user
             
         except jwt.ExpiredSignatureError:
             return jsonify({'message': 'Token has expired!'}), 401
         except jwt.InvalidTokenError:
             return jsonify({'message': 'Invalid token!'}), 401
+        finally:
+            g.auth_seconds = time.perf_counter() - started
+            principals.observe(g.auth_seconds)
             
         return f(*args, **kwargs)
     return decorated
 
 # TMDB API helper
 def tmdb_request(endpoint, params=None):
-    """Make a request to TMDB API"""
+    """Make a request to TMDB API, served from the response cache when possible"""
     if params is None:
         params = {}
     
     params['api_key'] = app.config['TMDB_API_KEY']
     
-    url = f"{app.config['TMDB_BASE_URL']}/{endpoint}"
-    response = requests.get(url, params=params)
+    def fetch():
+        url = f"{app.config['TMDB_BASE_URL']}/{endpoint}"
+        return tmdb_client.get_url(url, params)
     
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {'error': f"TMDB API error: {response.status_code}"}
+    return tmdb_cache.get_or_fetch(endpoint, params, fetch)
+
+# Serialized, compressed bodies of the shared payloads tmdb_request and utils hand out
+response_cache = ResponseCache(lambda payload: app.json.dumps(payload, separators=(',', ':')) + '\n')
+
+def cached_json(payload, private=False, shared=True):
+    """jsonify for TMDB cache payloads: reuses the stored body and answers If-None-Match with 304.
+
+    shared=False is for payloads built fresh on each request, which are matched by content.
+    Errors and empty fallbacks go out as uncached_json instead.
+    """
+    if not cacheable(payload):
+        return uncached_json(payload)
+    status, headers, body = response_cache.respond(
+        payload, request.headers.get('If-None-Match'), request.headers.get('Accept-Encoding'),
+        app.config['RESPONSE_MAX_AGE'], private, shared)
+    return Response(body, status, headers)
+
+def uncached_json(payload):
+    """jsonify that clients and proxies must not store, for failures and partial results"""
+    response = jsonify(payload)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+async def tmdb_request_async(tmdb, endpoint, params=None):
+    """tmdb_request for the ASGI entry point, fetching through an AsyncTMDBClient"""
+    params = dict(params or {}, api_key=app.config['TMDB_API_KEY'])
+    url = f"{app.config['TMDB_BASE_URL']}/{endpoint}"
+    return await tmdb_cache.get_or_fetch_async(endpoint, params, lambda: tmdb.get_url(url, params))
 
 # Recommendation system
 class RecommendationEngine:
-    def __init__(self):
-        self.movies_data = {}
-        self.content_vectors = None
-        self.movie_ids = []
+    def __init__(self, similarity='table', snapshot_path=None, **similarity_options):
+        self.similarity_name = similarity
+        self.similarity_options = similarity_options
+        self.state = self._make_state(None, ContentIndex())
+        self.snapshots = SnapshotStore(snapshot_path) if snapshot_path else None
+        self.ready = threading.Event()
+        self.interactions = InteractionMatrix(storage)
+        self.als_job = ALSJob(self.interactions, app.config['ALS_MODEL_PATH'],
+                              app.config['ALS_TRAIN_INTERVAL'])
+    
+    def start(self):
+        """Warm the engine up, then follow and extend published snapshots, in a background thread"""
+        threading.Thread(target=self._run, daemon=True).start()
+    
+    def _run(self):
+        self.warm_up()
+        while self.snapshots is not None:
+            time.sleep(app.config['SNAPSHOT_POLL_INTERVAL'])
+            self.adopt_snapshot()
+            self.publish_added()
+    
+    def warm_up(self):
+        """Adopt the published engine snapshot, or build and publish the first one"""
+        try:
+            deadline = time.time() + 60
+            while not self.adopt_snapshot():
+                if self.reload_movies() or time.time() > deadline:
+                    break
+                # Another worker holds the build lock; its snapshot will be published shortly
+                time.sleep(1)
+        except Exception as e:
+            print("Recommendation engine warm-up error:", e)
+        finally:
+            self.ready.set()
+    
+    def adopt_snapshot(self):
+        """Swap in the published snapshot unless it is already current; False if there is none"""
+        if self.snapshots is None:
+            return False
+        try:
+            version = self.snapshots.current_version()
+            if version is None:
+                return False
+            if version != self.state.version:
+                snapshot = self.snapshots.load()
+                if snapshot is None:
+                    # CURRENT vanished between the two reads
+                    return False
+                version, index, table = snapshot
+                # Movies this process added that the snapshot lacks are kept until published
+                for movie_id, text in list(self.state.index.added.items()):
+                    index.add(movie_id, text)
+                self.state = self._make_state(version, index, table)
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            print("Engine snapshot load error:", e)
+            return False
+    
+    def publish_added(self):
+        """Publish movies added to the content index (and any refit since) as a new snapshot.
         
-    def load_movies(self):
-        """Load movies from TMDB popular/top-rated for initial recommendations"""
-        if not self.movies_data:
-            # Get popular movies
-            popular = tmdb_request('movie/popular')
-            top_rated = tmdb_request('movie/top_rated')
-            
-            movies = popular.get('results', []) + top_rated.get('results', [])
+        Returns False when there is nothing to publish or another process holds the build lock.
+        """
+        if self.snapshots is None or not self.state.index.added:
+            return False
+        if not self.snapshots.acquire_build_lock():
+            return False
+        try:
+            # Build on top of whatever another worker published meanwhile
+            self.adopt_snapshot()
+            state = self.state
+            self.snapshots.save(state.index, state.similarity.neighbor_table())
+        except OSError as e:
+            print("Engine snapshot save error:", e)
+            return False
+        finally:
+            self.snapshots.release_build_lock()
+        # Reload the published copy so its matrix is memory-mapped again
+        return self.adopt_snapshot()
+    
+    def reload_movies(self):
+        """Refit the content index on the top of the catalog and publish it as a snapshot.
+        
+        Returns False without rebuilding when another process holds the build lock.
+        """
+        if self.snapshots is not None and not self.snapshots.acquire_build_lock():
+            return False
+        try:
+            movies = movie_catalog.popular(app.config['CORPUS_SIZE'])
             
-            # Remove duplicates
-            unique_movies = {}
-            for movie in movies:
-                if movie['id'] not in unique_movies:
-                    unique_movies[movie['id']] = movie
+            if not movies:
+                # Fresh install: these responses are written through to the catalog
+                tmdb_request('movie/popular')
+                tmdb_request('movie/top_rated')
+                movies = movie_catalog.popular(app.config['CORPUS_SIZE'])
             
-            self.movies_data = unique_movies
-            self.movie_ids = list(unique_movies.keys())
+            texts = {movie['id']: movie_text(movie, genre_registry.names) for movie in movies}
+            if not texts:
+                return True
             
-            # Create content vectors
-            self._create_content_vectors()
+            # Build the new index and its neighbour table off to the side, then swap them in
+            index = ContentIndex()
+            index.fit(texts)
+            state = self._make_state(None, index)
+            state.similarity.refresh(wait=True)
             
-        return self.movies_data
+            if self.snapshots is not None:
+                try:
+                    version = self.snapshots.save(index, state.similarity.neighbor_table())
+                    state = EngineState(version, index, state.similarity)
+                except OSError as e:
+                    print("Engine snapshot save error:", e)
+            self.state = state
+            return True
+        finally:
+            if self.snapshots is not None:
+                self.snapshots.release_build_lock()
     
-    def _create_content_vectors(self):
-        """Create TF-IDF vectors for content-based filtering"""
-        texts = []
-        self.movie_ids = []
-        
-        for movie_id, movie in self.movies_data.items():
-            # Combine title, overview, and genres for content analysis
-            genres = ' '.join([g['name'] for g in movie.get('genre_ids', [])])
-            text = f"{movie['title']} {movie['overview']} {genres}"
-            texts.append(text)
-            self.movie_ids.append(movie_id)
-        
-        if texts:
-            tfidf = TfidfVectorizer(stop_words='english')
-            self.content_vectors = tfidf.fit_transform(texts)
+    def _make_state(self, version, index, table=None):
+        similarity = make_backend(self.similarity_name, index, **self.similarity_options)
+        if table is not None:
+            similarity.restore(table)
+        return EngineState(version, index, similarity)
     
     def get_movie_details(self, movie_id):
         """Get detailed movie information for recommendations"""
@@ -189,98 +373,24 @@ class RecommendationEngine:
     
     def content_based_recommendations(self, movie_id):
         """Get content-based recommendations for a movie"""
-        self.load_movies()
+        # Requests get trending results until warm-up is done; background recomputes wait
+        self.ready.wait()
+        state = self.state
         
-        # Get movie details if not in our data
-        if movie_id not in self.movies_data:
-            movie_details = self.get_movie_details(movie_id)
+        # Project movies outside the corpus onto the index, preferring local metadata
+        if movie_id not in state.index:
+            movie_details = movie_catalog.get(movie_id) or self.get_movie_details(movie_id)
             if 'id' in movie_details:
-                self.movies_data[movie_id] = movie_details
-                self._create_content_vectors()
-        
-        # Find movie index
-        if movie_id in self.movie_ids:
-            idx = self.movie_ids.index(movie_id)
-            
-            # Calculate similarity
-            movie_vector = self.content_vectors[idx:idx+1]
-            sim_scores = cosine_similarity(movie_vector, self.content_vectors).flatten()
-            
-            # Get similar movie indices
-            similar_indices = sim_scores.argsort()[:-11:-1]  # Top 10 similar movies
-            
-            # Remove the movie itself
-            similar_indices = [i for i in similar_indices if self.movie_ids[i] != movie_id]
-            
-            # Get movie ids
-            similar_movies = [self.movie_ids[i] for i in similar_indices]
-            
-            return similar_movies
+                state.index.add(movie_id, movie_text(movie_details, genre_registry.names))
         
-        return []
+        # Top 10 similar movies from the configured similarity backend
+        return state.similarity.neighbors(movie_id, 10) or []
     
     def collaborative_recommendations(self, user_id):
         """Get collaborative filtering recommendations based on user history"""
-        db = get_db()
-        
-        # Get user's watch history and favorites
-        history = db.execute('''
-            SELECT movie_id FROM watch_history 
-            WHERE user_id = ? 
-            ORDER BY viewed_at DESC
-        ''', (user_id,)).fetchall()
-        
-        favorites = db.execute('SELECT movie_id FROM favorites WHERE user_id = ?', 
-                             (user_id,)).fetchall()
-        
-        # Extract movie IDs
-        history_ids = [row['movie_id'] for row in history]
-        favorite_ids = [row['movie_id'] for row in favorites]
-        
-        # Combine with weights (favorites count more)
-        user_movies = history_ids + favorite_ids
-        
-        if not user_movies:
-            return []
-        
-        # Simple collaborative approach:
-        # 1. Get all users who watched/favorited these movies
-        # 2. Find what other movies these users liked
-        # 3. Recommend the most popular ones
-        
-        placeholders = ','.join(['?'] * len(user_movies))
-        similar_users = db.execute(f'''
-            SELECT DISTINCT user_id FROM (
-                SELECT user_id FROM watch_history WHERE movie_id IN ({placeholders})
-                UNION
-                SELECT user_id FROM favorites WHERE movie_id IN ({placeholders})
-            )
-            WHERE user_id != ?
-        ''', user_movies + user_movies + (user_id,)).fetchall()
-        
-        if not similar_users:
-            return []
-        
-        similar_user_ids = [row['user_id'] for row in similar_users]
-        users_placeholders = ','.join(['?'] * len(similar_user_ids))
-        
-        # Get movies that similar users liked but the current user hasn't seen
-        recommendations = db.execute(f'''
-            SELECT movie_id, COUNT(*) as count
-            FROM (
-                SELECT movie_id FROM watch_history 
-                WHERE user_id IN ({users_placeholders})
-                UNION ALL
-                SELECT movie_id FROM favorites 
-                WHERE user_id IN ({users_placeholders})
-            )
-            WHERE movie_id NOT IN ({placeholders})
-            GROUP BY movie_id
-            ORDER BY count DESC
-            LIMIT 10
-        ''', similar_user_ids + similar_user_ids + user_movies).fetchall()
-        
-        return [row['movie_id'] for row in recommendations]
+        # Movies most often shared by users who watched, favorited or rated
+        # the same movies, scored from the in-memory interaction matrix
+        return self.interactions.recommend(user_id, 10)
     
     def hybrid_recommendations(self, user_id, movie_id=None):
         """Combine content-based and collaborative filtering"""
@@ -292,16 +402,10 @@ class RecommendationEngine:
             content_recs = self.content_based_recommendations(movie_id)
         else:
             # Otherwise, use user's recent history for content-based
-            db = get_db()
-            recent = db.execute('''
-                SELECT movie_id FROM watch_history 
-                WHERE user_id = ? 
-                ORDER BY viewed_at DESC 
-                LIMIT 1
-            ''', (user_id,)).fetchone()
+            recent = storage.recent_history(user_id, 1)
             
             if recent:
-                content_recs = self.content_based_recommendations(recent['movie_id'])
+                content_recs = self.content_based_recommendations(recent[0])
             else:
                 content_recs = []
         
@@ -309,10 +413,7 @@ class RecommendationEngine:
         # Content-based get higher weight for new users
         # Collaborative get higher weight for users with more history
         
-        db = get_db()
-        history_count = db.execute('''
-            SELECT COUNT(*) as count FROM watch_history WHERE user_id = ?
-        ''', (user_id,)).fetchone()['count']
+        history_count = storage.history_count(user_id)
         
         # Adjust weights based on history size
         if history_count > 10:
@@ -321,6 +422,7 @@ class RecommendationEngine:
         else:
             content_weight = 0.7
             collab_weight = 0.3
+        factor_weight = 0.5
         
         # Combine and rank
         movie_scores = {}
@@ -334,6 +436,21 @@ class RecommendationEngine:
             else:
                 movie_scores[movie] = collab_weight
         
+        # Matrix-factorisation scores come from one matrix-vector product over
+        # the catalog: they add the model's own top picks and rerank everything
+        model = self.als_job.model
+        factor_scores = model.scores(user_id) if model is not None else None
+        if factor_scores is not None and factor_scores.size:
+            for movie in model.recommend(user_id, 10, factor_scores):
+                movie_scores.setdefault(movie, 0)
+            
+            top_score = float(factor_scores.max())
+            if top_score > 0:
+                for movie in movie_scores:
+                    col = model.col_of.get(movie)
+                    if col is not None:
+                        movie_scores[movie] += factor_weight * max(float(factor_scores[col]), 0) / top_score
+        
         # Sort by score and return top recommendations
         sorted_recs = sorted(movie_scores.items(), key=lambda x: x[1], reverse=True)
         return [movie_id for movie_id, _ in sorted_recs[:20]]
@@ -344,7 +461,71 @@ class RecommendationEngine:
         return [movie['id'] for movie in trending.get('results', [])]
 
 # Initialize recommendation engine
-recommendation_engine = RecommendationEngine()
+if app.config['SIMILARITY_BACKEND'] == 'ann':
+    recommendation_engine = RecommendationEngine('ann', app.config['ENGINE_SNAPSHOT_PATH'],
+                                                 path=app.config['ANN_INDEX_PATH'])
+else:
+    recommendation_engine = RecommendationEngine(app.config['SIMILARITY_BACKEND'],
+                                                 app.config['ENGINE_SNAPSHOT_PATH'])
+recommendation_engine.start()
+recommendation_engine.als_job.start()
+
+def compute_user_recommendations(user_id, version=0):
+    """Default recommendation list for a user, run off the request path"""
+    with app.app_context():
+        # Wait for an interaction matrix with the writes that invalidated the list
+        recommendation_engine.interactions.current(user_id, version)
+        has_history = storage.recent_history(user_id, 1)
+        
+        if has_history:
+            return recommendation_engine.hybrid_recommendations(user_id)
+        return recommendation_engine.get_trending_recommendations()
+
+# Materialised per-user recommendations, invalidated by favorite/history writes
+user_recommendations = RecommendationStore(compute_user_recommendations, storage.interaction_version)
+
+# Detail hydration for recommendation results
+movie_hydrator = MovieHydrator(
+    lambda movie_id: tmdb_request(f'movie/{movie_id}'),
+    store=movie_catalog,
+    max_workers=app.config['HYDRATION_WORKERS'],
+    timeout=app.config['HYDRATION_TIMEOUT'],
+    write_back=False
+)
+
+# Batch writes look up missing movies on their own pool, so a large batch
+# cannot starve recommendation hydration
+batch_lookup_hydrator = MovieHydrator(
+    lambda movie_id: tmdb_request(f'movie/{movie_id}'),
+    store=movie_catalog,
+    max_workers=app.config['BATCH_LOOKUP_WORKERS'],
+    timeout=app.config['BATCH_LOOKUP_TIMEOUT'],
+    write_back=False
+)
+
+def fetch_uncached(endpoint, params):
+    """Fetch a TMDB endpoint without going through the response cache"""
+    return tmdb_client.get(endpoint, dict(params, api_key=app.config['TMDB_API_KEY']))
+
+def reload_corpus(stats):
+    """Refit the content corpus once a catalog sync has brought in new movies"""
+    if stats.persisted:
+        # Let warm-up finish first so the two never race for the build lock
+        recommendation_engine.ready.wait()
+        recommendation_engine.reload_movies()
+
+def synced_movies_index():
+    """Content index that synced movies are added to; none before warm-up, when it is still empty"""
+    if recommendation_engine.ready.is_set():
+        return recommendation_engine.state.index
+    return None
+
+# Keep the catalog's category lists current in the background
+catalog_sync = CatalogSync(movie_catalog, fetch_uncached, pages=app.config['CATALOG_SYNC_PAGES'],
+                           interval=app.config['CATALOG_SYNC_INTERVAL'],
+                           workers=app.config['CATALOG_SYNC_WORKERS'], index=synced_movies_index,
+                           on_complete=reload_corpus)
+catalog_sync.start()
 
 # Routes
 @app.route('/api/auth/signup', methods=['POST'])
@@ -355,11 +536,8 @@ def signup():
         if not data or not data.get('username') or not data.get('email') or not data.get('password'):
             return jsonify({'message': 'Missing required fields'}), 400
 
-        db = get_db()
-
         # Check if email already exists
-        existing_user = db.execute('SELECT * FROM users WHERE email = ?', 
-                                   (data['email'],)).fetchone()
+        existing_user = storage.get_user_by_email(data['email'])
         if existing_user:
             return jsonify({'message': 'Email already registered'}), 400
 
@@ -367,21 +545,13 @@ def signup():
         hashed_password = hash_password(data['password'])
 
         # Create user
-        db.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
-                   (data['username'], data['email'], hashed_password))
-        db.commit()
-
-        # Get created user
-        user = db.execute('SELECT id, username, email FROM users WHERE email = ?',
-                          (data['email'],)).fetchone()
-
-        # Generate token
-        token = generate_token(user['id'])
+        user = storage.create_user(data['username'], data['email'], hashed_password)
 
+        # Generate tokens
         return jsonify({
             'message': 'User created successfully',
-            'token': token,
-            'user': dict(user)
+            'user': user,
+            **issue_tokens(user)
         }), 201
 
     except Exception as e:
@@ -394,28 +564,41 @@ def login():
     if not data or not data.get('email') or not data.get('password'):
         return jsonify({'message': 'Missing email or password'}), 400
     
-    db = get_db()
-    
     # Find user
-    user = db.execute('SELECT * FROM users WHERE email = ?', 
-                    (data['email'],)).fetchone()
+    user = storage.get_user_by_email(data['email'])
     
     if not user or not verify_password(user['password'], data['password']):
         return jsonify({'message': 'Invalid email or password'}), 401
     
-    # Generate token
-    token = generate_token(user['id'])
-    
+    # Generate tokens
     return jsonify({
         'message': 'Login successful',
-        'token': token,
-        'user': {
-            'id': user['id'],
-            'username': user['username'],
-            'email': user['email']
-        }
+        'user': principal(user),
+        **issue_tokens(user)
     })
 
+@app.route('/api/auth/refresh', methods=['POST'])
+def refresh():
+    """Trade a refresh token for a new access token and a new refresh token"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('refreshToken'):
+        return jsonify({'message': 'Refresh token is required'}), 400
+    
+    user_id = storage.consume_refresh_token(hash_refresh_token(data['refreshToken']))
+    user = storage.get_user(user_id) if user_id is not None else None
+    if not user:
+        return jsonify({'message': 'Invalid refresh token'}), 401
+    
+    return jsonify(issue_tokens(user))
+
+@app.route('/api/auth/logout', methods=['POST'])
+def logout():
+    """Revoke a refresh token; the access token simply expires"""
+    data = request.get_json(silent=True) or {}
+    if data.get('refreshToken'):
+        storage.revoke_refresh_token(hash_refresh_token(data['refreshToken']))
+    return jsonify({'message': 'Logged out'})
+
 @app.route('/api/auth/me', methods=['GET'])
 @token_required
 def get_user():
@@ -425,20 +608,77 @@ def get_user():
         'email': g.user['email']
     })
 
+@app.route('/api/auth/me', methods=['PUT'])
+@token_required
+def update_user():
+    data = request.get_json(silent=True) or {}
+    username = data.get('username', g.user['username'])
+    email = data.get('email', g.user['email'])
+    if not username or not email:
+        return jsonify({'message': 'Username and email cannot be empty'}), 400
+    
+    existing_user = storage.get_user_by_email(email) if email != g.user['email'] else None
+    if existing_user:
+        return jsonify({'message': 'Email already registered'}), 400
+    
+    storage.update_user(g.user['id'], username, email)
+    principals.invalidate(g.user['id'])
+    
+    user = {'id': g.user['id'], 'username': username, 'email': email}
+    # Tokens issued before the change no longer vouch for the user, so hand out a fresh one
+    return jsonify({'user': user, 'token': generate_token(user)})
+
+@app.route('/api/auth/me', methods=['DELETE'])
+@token_required
+def delete_user():
+    user_id = g.user['id']
+    
+    storage.delete_user(user_id)
+    principals.invalidate(user_id)
+    recommendation_engine.interactions.mark_dirty()
+    user_recommendations.invalidate(user_id)
+    
+    return jsonify({'message': 'Account deleted'})
+
+@app.route('/api/auth/stats')
+def auth_stats():
+    return jsonify(principals.stats())
+
+@app.after_request
+def add_auth_timing(response):
+    """Report time spent authenticating as a Server-Timing entry"""
+    if 'auth_seconds' in g:
+        response.headers.add('Server-Timing', f"auth;dur={g.auth_seconds * 1000:.3f}")
+    return response
+
 @app.route('/api/movies/popular')
 def api_popular_movies():
     page = request.args.get('page', 1, type=int)
     movies = get_popular_movies(TMDB_API_KEY, page)
-    return jsonify(movies)
+    return cached_json(movies)
+
+def local_search(query, limit=20):
+    """Best catalog matches for query, or None when there are too few to skip TMDB"""
+    movie_ids = movie_search.search(query, limit, app.config['SEARCH_MIN_LOCAL_RESULTS'])
+    if not movie_ids:
+        return None
+    found = movie_catalog.get_many(movie_ids, summary=True)
+    return [found[movie_id] for movie_id in movie_ids if movie_id in found]
 
 @app.route('/api/movies/search')
 def api_search_movies():
     query = request.args.get('query')
     if not query:
         return jsonify({'message': 'Query parameter is required'}), 400
-    results = search_movie(query, TMDB_API_KEY)
+    results = local_search(query)
+    if results is None:
+        results = search_movie(query, TMDB_API_KEY)
     return jsonify(results)
 
+@app.route('/api/search/stats')
+def search_stats():
+    return jsonify(movie_search.stats())
+
 @app.route('/api/movie/<int:movie_id>')
 def api_movie_details(movie_id):
     movie = get_movie_details(movie_id, TMDB_API_KEY)
@@ -455,67 +695,107 @@ def get_movies(endpoint):
         user_id = g.user['id']
         movie_id = params.get('movie_id')
         
-        if movie_id:
+        if not recommendation_engine.ready.is_set():
+            # Engine is still warming up: serve trending movies in the meantime
+            recommendations = recommendation_engine.get_trending_recommendations()
+            generated_at = datetime.datetime.now()
+            stale = True
+        elif movie_id:
             movie_id = int(movie_id)
             recommendations = recommendation_engine.hybrid_recommendations(user_id, movie_id)
+            generated_at = datetime.datetime.now()
+            stale = False
         else:
-            # Check if user has watch history
-            db = get_db()
-            has_history = db.execute('SELECT 1 FROM watch_history WHERE user_id = ? LIMIT 1', 
-                                   (user_id,)).fetchone()
-            
-            if has_history:
-                recommendations = recommendation_engine.hybrid_recommendations(user_id)
-            else:
-                recommendations = recommendation_engine.get_trending_recommendations()
+            # Precomputed list for the user; recomputed in the background after writes
+            entry = user_recommendations.get(user_id)
+            recommendations = entry.movie_ids
+            generated_at = datetime.datetime.fromtimestamp(entry.generated_at)
+            stale = entry.stale
+        
+        if params.get('genre'):
+            try:
+                genre_ids = genre_registry.parse(params['genre'])
+            except ValueError as e:
+                return jsonify({'message': str(e)}), 400
+            recommendations = genre_recommendations(recommendations, genre_ids)
         
-        # Get full movie details for recommendations
-        results = []
-        for movie_id in recommendations:
-            movie = tmdb_request(f'movie/{movie_id}')
-            if 'id' in movie:
-                results.append(movie)
+        # Get full movie details for recommendations, keeping rank order
+        results = movie_hydrator.hydrate(recommendations)
         
-        return jsonify({'results': results})
+        return jsonify({
+            'results': results,
+            'generated_at': generated_at.isoformat(),
+            'stale': stale
+        })
     
     response = tmdb_request(endpoint, params)
-    return jsonify(response)
+    return cached_json(response, private=True)
 
 @app.route('/api/movies/<int:movie_id>', methods=['GET'])
 @token_required
 def get_movie_details(movie_id):
     # Get movie details with credits
     response = tmdb_request(f'movie/{movie_id}', {'append_to_response': 'credits'})
-    return jsonify(response)
+    return cached_json(response, private=True)
 
 @app.route('/api/movies/<int:movie_id>/videos', methods=['GET'])
 @token_required
 def get_movie_videos(movie_id):
     response = tmdb_request(f'movie/{movie_id}/videos')
-    return jsonify(response)
+    return cached_json(response, private=True)
 
 @app.route('/api/movies/<int:movie_id>/watch/providers', methods=['GET'])
 @token_required
 def get_movie_providers(movie_id):
     response = tmdb_request(f'movie/{movie_id}/watch/providers')
-    return jsonify(response)
+    return cached_json(response, private=True)
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor):
+    key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(key, list) or len(key) != 2:
+        raise ValueError(cursor)
+    return key
+
+def user_list_response(page, rows, key):
+    """Serve a user's favorites or history in one of three shapes.
+
+    ?limit=N[&cursor=C]  one keyset page: {"items": [...], "nextCursor": C or null}
+    ?format=ndjson       every row, one JSON object per line, streamed
+    (neither)            every row as a JSON array, streamed
+
+    The streamed shapes read the table a page at a time, so memory stays
+    flat however long the list is.
+    """
+    if 'limit' in request.args or 'cursor' in request.args:
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        try:
+            after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        items = page(g.user['id'], limit, after)
+        next_cursor = encode_cursor([items[-1][key], items[-1]['id']]) if len(items) == limit else None
+        return jsonify({'items': items, 'nextCursor': next_cursor})
+
+    if request.args.get('format') == 'ndjson':
+        return Response((json.dumps(row) + '\n' for row in rows), mimetype='application/x-ndjson')
+
+    def json_array():
+        yield '['
+        for i, row in enumerate(rows):
+            yield (',' if i else '') + json.dumps(row)
+        yield ']'
+    return Response(json_array(), mimetype='application/json')
 
 # User favorites routes
 @app.route('/api/user/favorites', methods=['GET'])
 @token_required
 def get_favorites():
-    db = get_db()
     user_id = g.user['id']
     
-    favorites = db.execute('''
-        SELECT f.id, f.movie_id as movieId, f.title, f.poster_path as posterPath, 
-               f.release_date as releaseDate, f.vote_average as voteAverage
-        FROM favorites f
-        WHERE f.user_id = ?
-        ORDER BY f.created_at DESC
-    ''', (user_id,)).fetchall()
-    
-    return jsonify([dict(f) for f in favorites])
+    return user_list_response(storage.favorites_page, storage.iter_favorites(user_id), 'createdAt')
 
 @app.route('/api/user/favorites/toggle', methods=['POST'])
 @token_required
@@ -525,40 +805,31 @@ def toggle_favorite():
     if not data or 'movieId' not in data:
         return jsonify({'message': 'Movie ID is required'}), 400
     
-    db = get_db()
+    movie_id = event_movie_id(data)
+    if movie_id is None:
+        return jsonify({'message': 'Movie ID must be a number'}), 400
     user_id = g.user['id']
-    movie_id = data['movieId']
     
     # Check if movie is already in favorites
-    existing = db.execute('SELECT * FROM favorites WHERE user_id = ? AND movie_id = ?', 
-                        (user_id, movie_id)).fetchone()
+    existing = storage.get_favorite(user_id, movie_id)
     
     if existing:
         # Remove from favorites
-        db.execute('DELETE FROM favorites WHERE id = ?', (existing['id'],))
-        db.commit()
+        storage.remove_favorite(existing['id'])
+        recommendation_engine.interactions.mark_dirty()
+        user_recommendations.invalidate(user_id)
         return jsonify({'message': 'Removed from favorites'})
     else:
-        # Get movie details
-        movie = tmdb_request(f'movie/{movie_id}')
+        # Get movie details from the local catalog, falling back to TMDB
+        movie = movie_catalog.get(movie_id) or tmdb_request(f'movie/{movie_id}')
         
         if 'id' not in movie:
             return jsonify({'message': 'Movie not found'}), 404
         
         # Add to favorites
-        db.execute('''
-            INSERT INTO favorites 
-            (user_id, movie_id, title, poster_path, release_date, vote_average) 
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            user_id, 
-            movie_id, 
-            movie['title'], 
-            movie.get('poster_path', ''), 
-            movie.get('release_date', ''), 
-            movie.get('vote_average', 0)
-        ))
-        db.commit()
+        storage.add_favorite(user_id, movie)
+        recommendation_engine.interactions.mark_dirty()
+        user_recommendations.invalidate(user_id)
         
         return jsonify({'message': 'Added to favorites'})
 
@@ -566,18 +837,9 @@ def toggle_favorite():
 @app.route('/api/user/history', methods=['GET'])
 @token_required
 def get_watch_history():
-    db = get_db()
     user_id = g.user['id']
     
-    history = db.execute('''
-        SELECT h.id, h.movie_id as movieId, h.title, h.poster_path as posterPath, 
-               h.viewed_at as viewedAt
-        FROM watch_history h
-        WHERE h.user_id = ?
-        ORDER BY h.viewed_at DESC
-    ''', (user_id,)).fetchall()
-    
-    return jsonify([dict(h) for h in history])
+    return user_list_response(storage.history_page, storage.iter_history(user_id), 'viewedAt')
 
 @app.route('/api/user/history/add', methods=['POST'])
 @token_required
@@ -587,102 +849,385 @@ def add_to_watch_history():
     if not data or 'movieId' not in data:
         return jsonify({'message': 'Movie ID is required'}), 400
     
-    db = get_db()
+    movie_id = event_movie_id(data)
+    if movie_id is None:
+        return jsonify({'message': 'Movie ID must be a number'}), 400
     user_id = g.user['id']
-    movie_id = data['movieId']
     
-    # Get movie details
-    movie = tmdb_request(f'movie/{movie_id}')
+    # Get movie details from the local catalog, falling back to TMDB
+    movie = movie_catalog.get(movie_id) or tmdb_request(f'movie/{movie_id}')
     
     if 'id' not in movie:
         return jsonify({'message': 'Movie not found'}), 404
     
     # Check if movie is already in history
-    existing = db.execute('''
-        SELECT * FROM watch_history 
-        WHERE user_id = ? AND movie_id = ? 
-        ORDER BY viewed_at DESC LIMIT 1
-    ''', (user_id, movie_id)).fetchone()
+    last_viewed = storage.last_viewed_at(user_id, movie_id)
     
     # Only update if it's been more than 1 hour since last view
-    if existing:
-        last_viewed = datetime.datetime.fromisoformat(existing['viewed_at'])
+    if last_viewed:
         now = datetime.datetime.now()
         
         if (now - last_viewed).total_seconds() < 3600:  # 1 hour
             return jsonify({'message': 'Already in watch history'})
     
     # Add to watch history
-    db.execute('''
-        INSERT INTO watch_history 
-        (user_id, movie_id, title, poster_path, viewed_at) 
-        VALUES (?, ?, ?, ?, ?)
-    ''', (
-        user_id, 
-        movie_id, 
-        movie['title'], 
-        movie.get('poster_path', ''), 
-        datetime.datetime.now().isoformat()
-    ))
-    db.commit()
+    storage.add_history(user_id, movie, datetime.datetime.now())
+    recommendation_engine.interactions.mark_dirty()
+    user_recommendations.invalidate(user_id)
     
     return jsonify({'message': 'Added to watch history'})
 
 @app.route('/api/user/history/<int:movie_id>', methods=['DELETE'])
 @token_required
 def remove_from_watch_history(movie_id):
-    db = get_db()
     user_id = g.user['id']
     
-    db.execute('DELETE FROM watch_history WHERE user_id = ? AND movie_id = ?', 
-             (user_id, movie_id))
-    db.commit()
+    storage.remove_history(user_id, movie_id)
+    recommendation_engine.interactions.mark_dirty()
+    user_recommendations.invalidate(user_id)
     
     return jsonify({'message': 'Removed from watch history'})
 
 @app.route('/api/user/history', methods=['DELETE'])
 @token_required
 def clear_watch_history():
-    db = get_db()
     user_id = g.user['id']
     
-    db.execute('DELETE FROM watch_history WHERE user_id = ?', (user_id,))
-    db.commit()
+    storage.clear_history(user_id)
+    recommendation_engine.interactions.mark_dirty()
+    user_recommendations.invalidate(user_id)
     
     return jsonify({'message': 'Watch history cleared'})
 
+# User ratings routes
+def parse_movie_ids(value):
+    """Movie ids from a comma-separated query parameter, or None if malformed"""
+    try:
+        return [int(movie_id) for movie_id in value.split(',') if movie_id.strip()]
+    except ValueError:
+        return None
+
+@app.route('/api/user/ratings', methods=['GET'])
+@token_required
+def get_ratings():
+    """The user's ratings, or {movieId: rating} for ?movieIds=1,2,3"""
+    user_id = g.user['id']
+    if 'movieIds' not in request.args:
+        return jsonify(storage.list_ratings(user_id))
+    movie_ids = parse_movie_ids(request.args['movieIds'])
+    if movie_ids is None or len(movie_ids) > app.config['MAX_BATCH_SIZE']:
+        return jsonify({'message': 'movieIds must be a comma-separated list of ids'}), 400
+    return jsonify(storage.user_ratings(user_id, movie_ids))
+
+@app.route('/api/user/ratings/<int:movie_id>', methods=['PUT'])
+@token_required
+def rate_movie(movie_id):
+    data = request.get_json(silent=True) or {}
+    rating = data.get('rating')
+    if type(rating) is not int or not 1 <= rating <= 10:
+        return jsonify({'message': 'rating must be an integer from 1 to 10'}), 400
+    
+    user_id = g.user['id']
+    
+    # Get movie details from the local catalog, falling back to TMDB
+    movie = movie_catalog.get(movie_id) or tmdb_request(f'movie/{movie_id}')
+    
+    if 'id' not in movie:
+        return jsonify({'message': 'Movie not found'}), 404
+    
+    storage.set_rating(user_id, movie_id, rating)
+    recommendation_engine.interactions.mark_dirty()
+    user_recommendations.invalidate(user_id)
+    
+    return jsonify({'movieId': movie_id, 'rating': rating,
+                    'stats': storage.rating_stats([movie_id]).get(movie_id)})
+
+@app.route('/api/user/ratings/<int:movie_id>', methods=['DELETE'])
+@token_required
+def remove_rating(movie_id):
+    user_id = g.user['id']
+    
+    storage.remove_rating(user_id, movie_id)
+    recommendation_engine.interactions.mark_dirty()
+    user_recommendations.invalidate(user_id)
+    
+    return jsonify({'message': 'Rating removed'})
+
+@app.route('/api/ratings/stats')
+def rating_stats():
+    """{movieId: {count, average, stddev}} for ?ids=1,2,3; unrated movies are left out"""
+    movie_ids = parse_movie_ids(request.args.get('ids', ''))
+    if not movie_ids or len(movie_ids) > app.config['MAX_BATCH_SIZE']:
+        return jsonify({'message': 'ids must be a comma-separated list of ids'}), 400
+    return jsonify(storage.rating_stats(movie_ids))
+
+# Batch writes: arrays of events, validated together and committed in one transaction
+def read_batch():
+    """(events, None) for a valid batch request body, else (None, error response)"""
+    data = request.get_json(silent=True)
+    events = data.get('events') if isinstance(data, dict) else None
+    if not isinstance(events, list) or not events:
+        return None, (jsonify({'message': 'events must be a non-empty list'}), 400)
+    if len(events) > app.config['MAX_BATCH_SIZE']:
+        return None, (jsonify({'message': f"At most {app.config['MAX_BATCH_SIZE']} events per batch"}), 413)
+    return events, None
+
+def event_movie_id(event):
+    try:
+        return int(event['movieId'])
+    except (TypeError, KeyError, ValueError):
+        return None
+
+def lookup_movies(movie_ids):
+    """{movie_id: movie} from the local catalog, fetching up to BATCH_LOOKUP_MAX_FETCHES it lacks from TMDB"""
+    movies = batch_lookup_hydrator.hydrate(movie_ids, max_fetches=app.config['BATCH_LOOKUP_MAX_FETCHES'])
+    return {movie['id']: movie for movie in movies}
+
+def batch_written(user_id):
+    recommendation_engine.interactions.mark_dirty()
+    user_recommendations.invalidate(user_id)
+
+@app.route('/api/user/favorites/batch', methods=['POST'])
+@token_required
+def batch_favorites():
+    """Apply {"movieId", "action": "add" | "remove"} events in order"""
+    events, error = read_batch()
+    if error:
+        return error
+    user_id = g.user['id']
+    movie_ids = [event_movie_id(event) for event in events]
+    valid = {movie_id for movie_id in movie_ids if movie_id is not None}
+
+    initial = storage.favorite_movie_ids(user_id, valid)
+    current = set(initial)
+    movies = lookup_movies(movie_id for movie_id, event in zip(movie_ids, events)
+                           if movie_id is not None and movie_id not in initial
+                           and event.get('action', 'add') == 'add')
+
+    results = []
+    for movie_id, event in zip(movie_ids, events):
+        action = event.get('action', 'add') if movie_id is not None else None
+        if action not in ('add', 'remove'):
+            status = 'invalid'
+        elif action == 'add' and movie_id in current:
+            status = 'unchanged'
+        elif action == 'add' and movie_id not in movies:
+            status = 'not_found'
+        elif action == 'add':
+            current.add(movie_id)
+            status = 'added'
+        elif movie_id in current:
+            current.discard(movie_id)
+            status = 'removed'
+        else:
+            status = 'unchanged'
+        results.append({'movieId': movie_id, 'status': status})
+
+    add = [movies[movie_id] for movie_id in current - initial]
+    remove = list(initial - current)
+    if add or remove:
+        storage.update_favorites(user_id, add, remove)
+        batch_written(user_id)
+    return jsonify({'results': results, 'written': len(add) + len(remove)})
+
+@app.route('/api/user/history/batch', methods=['POST'])
+@token_required
+def batch_watch_history():
+    """Record {"movieId", "viewedAt"?} events; like /history/add, views within an hour of the last one are skipped"""
+    events, error = read_batch()
+    if error:
+        return error
+    user_id = g.user['id']
+    now = datetime.datetime.now()
+    parsed = []
+    for event in events:
+        movie_id = event_movie_id(event)
+        viewed_at = now
+        if movie_id is not None and event.get('viewedAt'):
+            try:
+                viewed_at = datetime.datetime.fromisoformat(event['viewedAt'])
+            except (TypeError, ValueError):
+                movie_id = None
+            else:
+                if viewed_at.tzinfo is not None:
+                    viewed_at = viewed_at.astimezone().replace(tzinfo=None)
+        parsed.append((movie_id, viewed_at))
+
+    valid = {movie_id for movie_id, _ in parsed if movie_id is not None}
+    movies = lookup_movies(valid)
+    last_viewed = storage.last_views(user_id, valid)
+
+    results, entries = [], []
+    for movie_id, viewed_at in parsed:
+        if movie_id is None:
+            status = 'invalid'
+        elif movie_id not in movies:
+            status = 'not_found'
+        elif movie_id in last_viewed and abs((viewed_at - last_viewed[movie_id]).total_seconds()) < 3600:
+            status = 'skipped'
+        else:
+            entries.append((movies[movie_id], viewed_at))
+            last_viewed[movie_id] = max(viewed_at, last_viewed.get(movie_id, viewed_at))
+            status = 'added'
+        results.append({'movieId': movie_id, 'status': status})
+
+    if entries:
+        storage.add_history_many(user_id, entries)
+        batch_written(user_id)
+    return jsonify({'results': results, 'written': len(entries)})
+
+@app.route('/api/user/ratings/batch', methods=['POST'])
+@token_required
+def batch_ratings():
+    """Apply {"movieId", "rating": 1-10 or null to remove} events; the last one per movie wins"""
+    events, error = read_batch()
+    if error:
+        return error
+    user_id = g.user['id']
+    movie_ids = [event_movie_id(event) for event in events]
+    movies = lookup_movies({movie_id for movie_id in movie_ids if movie_id is not None})
+
+    results, final = [], {}
+    for movie_id, event in zip(movie_ids, events):
+        rating = event.get('rating') if movie_id is not None else None
+        if movie_id is None or (rating is not None and (type(rating) is not int or not 1 <= rating <= 10)):
+            status = 'invalid'
+        elif movie_id not in movies:
+            status = 'not_found'
+        else:
+            final[movie_id] = rating
+            status = 'rated' if rating is not None else 'removed'
+        results.append({'movieId': movie_id, 'status': status})
+
+    ratings = [(movie_id, rating) for movie_id, rating in final.items() if rating is not None]
+    remove = [movie_id for movie_id, rating in final.items() if rating is None]
+    if final:
+        storage.update_ratings(user_id, ratings, remove)
+        batch_written(user_id)
+    return jsonify({'results': results, 'written': len(final)})
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    return jsonify(tmdb_cache.stats())
+
+@app.route("/api/cache/responses")
+def response_cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route("/api/ready")
+def readiness():
+    """503 until the recommendation engine has finished warming up"""
+    state = recommendation_engine.state
+    status = {
+        'ready': recommendation_engine.ready.is_set(),
+        'snapshot_version': state.version,
+        'movies': len(state.index),
+    }
+    return jsonify(status), 200 if status['ready'] else 503
+
 @app.route("/api/trending")
 def trending():
     movies = get_trending_movies(TMDB_API_KEY)
-    return jsonify(movies)
+    return cached_json(movies)
 
 @app.route("/api/popular")
 def popular():
     movies = get_popular_movies(TMDB_API_KEY)
-    return jsonify(movies)
+    return cached_json(movies)
 
 @app.route("/api/top_rated")
 def top_rated():
     movies = get_top_rated_movies(TMDB_API_KEY)
-    return jsonify(movies)
+    return cached_json(movies)
 
 @app.route("/api/new_releases")
 def new_releases():
     movies = get_new_releases(TMDB_API_KEY)
-    return jsonify(movies)
+    return cached_json(movies)
+
+def catalog_genre_movies(genre_ids, page=1):
+    """A page of the most popular catalog movies in all of genre_ids"""
+    movie_ids = genre_index.browse(genre_ids, MAX_SECTION_SIZE, (page - 1) * MAX_SECTION_SIZE)
+    found = movie_catalog.get_many(movie_ids, summary=True)
+    return [found[movie_id] for movie_id in movie_ids if movie_id in found]
+
+def genre_page(genre_ids, page=1):
+    """catalog_genre_movies(), or None when the catalog has too few"""
+    movies = catalog_genre_movies(genre_ids, page)
+    return movies if len(movies) >= app.config['GENRE_MIN_LOCAL_RESULTS'] else None
+
+def genre_recommendations(movie_ids, genre_ids, size=20):
+    """The recommended movies in all of genre_ids, topped up with the genres' most popular ones"""
+    kept = genre_index.filter(movie_ids, genre_ids)
+    if len(kept) < size:
+        seen = set(kept)
+        kept += [movie_id for movie_id in genre_index.browse(genre_ids, size + len(kept))
+                 if movie_id not in seen][:size - len(kept)]
+    return kept
 
 @app.route("/api/genre/<genre_name>")
 def genre_movies(genre_name):
-    genre_map = {
-        "action": 28,
-        "comedy": 35,
-        # add more if needed
-    }
-    genre_id = genre_map.get(genre_name.lower())
-    if genre_id:
-        movies = get_movies_by_genre(genre_id, TMDB_API_KEY)
-        return jsonify(movies)
-    return jsonify([]), 404
+    # A slug ("science-fiction"), a TMDB id, or several of either for movies in all of them
+    try:
+        genre_ids = genre_registry.parse(genre_name)
+    except ValueError:
+        return jsonify([]), 404
+    page = max(request.args.get('page', 1, type=int), 1)
+    movies = genre_page(genre_ids, page)
+    if movies is not None:
+        return cached_json(movies, shared=False)
+    return cached_json(get_movies_by_genre(genre_ids, TMDB_API_KEY, page))
+
+@app.route("/api/genres")
+def list_genres():
+    counts = genre_index.counts()
+    return jsonify([dict(genre, movies=counts.get(genre['id'], 0)) for genre in genre_registry.genres()])
+
+@app.route("/api/genres/stats")
+def genre_stats():
+    return jsonify(dict(genre_index.stats(), synced_at=genre_registry.synced_at))
+
+# Home feed sections: the list routes above, plus one per genre by slug, served
+# from the genre index once it has the genre's movies
+home_feed = HomeFeed({
+    'trending': lambda: trending_request(TMDB_API_KEY),
+    'popular': lambda: popular_request(TMDB_API_KEY),
+    'top_rated': lambda: top_rated_request(TMDB_API_KEY),
+    'new_releases': lambda: new_releases_request(TMDB_API_KEY),
+}, cached_results, defaults=app.config['FEED_DEFAULT_SECTIONS'].split(','),
+    max_workers=app.config['FEED_WORKERS'], timeout=app.config['FEED_SECTION_TIMEOUT'])
+
+def add_genre_sections(names):
+    for genre_id, name in names.items():
+        home_feed.sections.setdefault(slug(name), lambda genre_id=genre_id: genre_request(genre_id, TMDB_API_KEY))
+        # discover/movie while the catalog has too few movies in the genre, as for /api/genre
+        home_feed.local.setdefault(slug(name), lambda genre_id=genre_id: genre_page([genre_id]))
+
+add_genre_sections(genre_registry.names)
+genre_registry.listeners.append(add_genre_sections)
+genre_registry.start(lambda: tmdb_request('genre/movie/list'), app.config['GENRE_SYNC_INTERVAL'])
+
+def feed_args(args):
+    """(section names, movies per section) from the /api/feed query string; ValueError if invalid"""
+    try:
+        limit = int(args.get('limit', MAX_SECTION_SIZE))
+    except ValueError:
+        raise ValueError('limit must be a number')
+    return home_feed.parse(args.get('sections')), max(1, min(limit, MAX_SECTION_SIZE))
+
+@app.route("/api/feed")
+def get_feed():
+    try:
+        names, limit = feed_args(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    payload, complete = home_feed.get(names, limit)
+    # A feed missing a section is not worth caching
+    return cached_json(payload) if complete else uncached_json(payload)
+
+@app.route("/api/feed/stats")
+def feed_stats():
+    return jsonify(home_feed.stats())
 
 # Run the app
 if __name__ == '__main__':
@@ -0,0 +1,338 @@
+"""ASGI entry point: serves the TMDB proxy and movie list routes on asyncio.
+
+Those routes spend nearly all their time waiting on TMDB. Under WSGI each
+one holds a worker thread for the whole round trip; here they are
+coroutines on one event loop, fetching through an AsyncTMDBClient and the
+same response cache, so a worker can have hundreds in flight at once.
+
+Routing goes through Flask's own url_map, so paths, converters and
+precedence are exactly those of app.py. Every other route, and the few
+proxy requests that need the recommendation engine, fall through to the
+Flask app on a thread pool (WSGI_THREADS), so the API is unchanged.
+
+    uvicorn asgi:application --port 5000 --workers 4
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import jwt
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+import app as flask_app
+from response_cache import cacheable
+from tmdb_client import AsyncTMDBClient, client as tmdb_client
+from utils import (cached_results_async, genre_request, new_releases_request, popular_request,
+                   search_request, top_rated_request, trending_request)
+
+app = flask_app.app
+app.config['WSGI_THREADS'] = int(os.getenv('WSGI_THREADS', 16))
+app.config['TMDB_ASYNC_POOL_SIZE'] = int(os.getenv('TMDB_ASYNC_POOL_SIZE', 100))
+
+
+class JSONReply:
+    __slots__ = ('body', 'status', 'cache', 'shared')
+
+    def __init__(self, body, status=200, cache=None, shared=True):
+        self.body = body
+        self.status = status
+        self.cache = cache  # 'public' or 'private': a payload for app.response_cache; 'no-store'
+        self.shared = shared  # False when the payload was built for this request
+
+
+def query_args(scope):
+    """Query parameters like Flask's request.args.to_dict(): first value wins"""
+    args = {}
+    for key, value in parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True):
+        args.setdefault(key, value)
+    return args
+
+
+def page_arg(args):
+    try:
+        return int(args.get('page', 1))
+    except ValueError:
+        return 1
+
+
+# Native handlers, keyed by the Flask endpoint they stand in for. Each gets
+# (tmdb, args, **view_args) and returns a JSONReply, or None to hand the
+# request to Flask instead.
+
+async def get_movies(tmdb, args, endpoint):
+    if endpoint == 'recommendations':
+        return None
+    return JSONReply(await flask_app.tmdb_request_async(tmdb, endpoint, args), cache='private')
+
+
+async def get_movie_details(tmdb, args, movie_id):
+    return JSONReply(await flask_app.tmdb_request_async(
+        tmdb, f'movie/{movie_id}', {'append_to_response': 'credits'}), cache='private')
+
+
+async def get_movie_videos(tmdb, args, movie_id):
+    return JSONReply(await flask_app.tmdb_request_async(tmdb, f'movie/{movie_id}/videos'), cache='private')
+
+
+async def get_movie_providers(tmdb, args, movie_id):
+    return JSONReply(await flask_app.tmdb_request_async(tmdb, f'movie/{movie_id}/watch/providers'),
+                     cache='private')
+
+
+async def api_popular_movies(tmdb, args):
+    return JSONReply(await cached_results_async(
+        tmdb, *popular_request(flask_app.TMDB_API_KEY, page_arg(args))), cache='public')
+
+
+async def api_search_movies(tmdb, args):
+    if not args.get('query'):
+        return JSONReply({'message': 'Query parameter is required'}, 400)
+    results = await asyncio.to_thread(flask_app.local_search, args['query'])
+    if results is None:
+        results = await cached_results_async(tmdb, *search_request(args['query'], flask_app.TMDB_API_KEY))
+    return JSONReply(results)
+
+
+async def trending(tmdb, args):
+    return JSONReply(await cached_results_async(tmdb, *trending_request(flask_app.TMDB_API_KEY)),
+                     cache='public')
+
+
+async def popular(tmdb, args):
+    return JSONReply(await cached_results_async(tmdb, *popular_request(flask_app.TMDB_API_KEY)),
+                     cache='public')
+
+
+async def top_rated(tmdb, args):
+    return JSONReply(await cached_results_async(tmdb, *top_rated_request(flask_app.TMDB_API_KEY)),
+                     cache='public')
+
+
+async def new_releases(tmdb, args):
+    return JSONReply(await cached_results_async(tmdb, *new_releases_request(flask_app.TMDB_API_KEY)),
+                     cache='public')
+
+
+async def genre_movies(tmdb, args, genre_name):
+    try:
+        genre_ids = flask_app.genre_registry.parse(genre_name)
+    except ValueError:
+        return JSONReply([], 404)
+    page = max(page_arg(args), 1)
+    movies = await asyncio.to_thread(flask_app.genre_page, genre_ids, page)
+    if movies is not None:
+        return JSONReply(movies, cache='public', shared=False)
+    return JSONReply(await cached_results_async(
+        tmdb, *genre_request(genre_ids, flask_app.TMDB_API_KEY, page)), cache='public')
+
+
+async def get_feed(tmdb, args):
+    try:
+        names, limit = flask_app.feed_args(args)
+    except ValueError as e:
+        return JSONReply({'message': str(e)}, 400)
+    payload, complete = await flask_app.home_feed.get_async(
+        lambda endpoint, params: cached_results_async(tmdb, endpoint, params), names, limit)
+    return JSONReply(payload, cache='public' if complete else 'no-store')
+
+
+# endpoint -> (handler, requires a token like @token_required)
+HANDLERS = {
+    'get_movies': (get_movies, True),
+    'get_movie_details': (get_movie_details, True),
+    'get_movie_videos': (get_movie_videos, True),
+    'get_movie_providers': (get_movie_providers, True),
+    'api_popular_movies': (api_popular_movies, False),
+    'api_search_movies': (api_search_movies, False),
+    'trending': (trending, False),
+    'popular': (popular, False),
+    'top_rated': (top_rated, False),
+    'new_releases': (new_releases, False),
+    'genre_movies': (genre_movies, False),
+    'get_feed': (get_feed, False),
+}
+
+
+class AsyncApp:
+    def __init__(self, wsgi_app, threads=16, tmdb_pool_size=100):
+        self.wsgi_app = wsgi_app
+        self.tmdb_pool_size = tmdb_pool_size
+        self.urls = app.url_map.bind('localhost')
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+        self._tmdb = None
+
+    @property
+    def tmdb(self):
+        # Created on first use so it binds to the server's event loop
+        if self._tmdb is None:
+            self._tmdb = AsyncTMDBClient(tmdb_client, pool_size=self.tmdb_pool_size)
+        return self._tmdb
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        if scope['method'] == 'GET':
+            try:
+                endpoint, view_args = self.urls.match(scope['path'], method='GET')
+            except (HTTPException, RequestRedirect):
+                endpoint = None
+            if endpoint in HANDLERS:
+                if await self.serve(scope, send, endpoint, view_args):
+                    return
+        await self.call_wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._tmdb is not None:
+                    await self._tmdb.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def serve(self, scope, send, endpoint, view_args):
+        """Answer a request natively; False if the handler passed it on to Flask"""
+        handler, needs_auth = HANDLERS[endpoint]
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                   for name, value in scope['headers']}
+        extra_headers = []
+
+        if needs_auth:
+            token = flask_app.bearer_token(headers.get('authorization'))
+            if not token:
+                await self.reply(send, headers, JSONReply({'message': 'Token is missing!'}, 401))
+                return True
+            started = time.perf_counter()
+            user, error = await self.authenticate(token)
+            auth_seconds = time.perf_counter() - started
+            flask_app.principals.observe(auth_seconds)
+            extra_headers.append(('Server-Timing', f"auth;dur={auth_seconds * 1000:.3f}"))
+            if user is None:
+                await self.reply(send, headers, JSONReply({'message': error}, 401), extra_headers)
+                return True
+
+        reply = await handler(self.tmdb, query_args(scope), **view_args)
+        if reply is None:
+            return False
+        await self.reply(send, headers, reply, extra_headers)
+        return True
+
+    async def authenticate(self, token):
+        """(principal, None) or (None, message), as token_required would decide"""
+        try:
+            data = flask_app.decode_access_token(token)
+        except jwt.ExpiredSignatureError:
+            return None, 'Token has expired!'
+        except jwt.InvalidTokenError:
+            return None, 'Invalid token!'
+
+        principals = flask_app.principals
+        user = principals.peek(data['sub'], data)
+        if user is None:
+            # Needs the users table: read it off the event loop
+            user = await asyncio.to_thread(principals.get, data['sub'], data)
+        if user is None:
+            return None, 'User not found!'
+        return user, None
+
+    async def reply(self, send, request_headers, reply, extra_headers=()):
+        if reply.cache in ('public', 'private') and cacheable(reply.body):
+            # Same stored body, ETag and 304 handling as cached_json on the Flask side
+            status, headers, body = flask_app.response_cache.respond(
+                reply.body, request_headers.get('if-none-match'), request_headers.get('accept-encoding'),
+                app.config['RESPONSE_MAX_AGE'], reply.cache == 'private', reply.shared)
+        else:
+            # Byte-for-byte what jsonify produces outside debug mode
+            status = reply.status
+            body = (app.json.dumps(reply.body, separators=(',', ':')) + '\n').encode('utf-8')
+            headers = [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))]
+            if reply.cache:
+                # An error, empty fallback or partial feed, as uncached_json sends it
+                headers.append(('Cache-Control', 'no-store'))
+        headers += list(extra_headers)
+        # Same policy flask_cors applies to /api/* on the Flask side
+        origin = request_headers.get('origin')
+        if origin and origin in app.config['CORS_ORIGINS'].split(','):
+            headers += [('Access-Control-Allow-Origin', origin), ('Vary', 'Origin')]
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def call_wsgi(self, scope, receive, send):
+        """Run the Flask app for this request on the thread pool, streaming its body"""
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+        loop = asyncio.get_running_loop()
+        chunks = await loop.run_in_executor(
+            self.executor, lambda: self.wsgi_app(wsgi_environ(scope, bytes(body)), start_response))
+        try:
+            await send({'type': 'http.response.start', 'status': response['status'],
+                        'headers': response['headers']})
+            iterator = iter(chunks)
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(chunks, 'close'):
+                await loop.run_in_executor(self.executor, chunks.close)
+
+
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+application = AsyncApp(app.wsgi_app, threads=app.config['WSGI_THREADS'],
+                       tmdb_pool_size=app.config['TMDB_ASYNC_POOL_SIZE'])
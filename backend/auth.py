@@ -0,0 +1,110 @@
+"""Verified principals for token_required, so most requests skip the users table.
+
+A principal is the public part of a user row: id, username and email.
+PrincipalCache answers "who is user N" in this order:
+
+    1. a bounded LRU of principals loaded in the last ttl seconds
+    2. the username/email claims embedded in an access token issued in the
+       last ttl seconds, unless the user changed after it was issued
+    3. the users table, whose answer then goes into the LRU
+
+invalidate(user_id) drops the cached principal and stops older tokens'
+claims from being trusted. It only reaches this process, so ttl is also the
+longest another worker can keep serving a changed or deleted user.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+PRINCIPAL_FIELDS = ('id', 'username', 'email')
+
+
+def principal(user):
+    return {field: user[field] for field in PRINCIPAL_FIELDS}
+
+
+class PrincipalCache:
+    def __init__(self, load, max_entries=10000, ttl=300):
+        self.load = load
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # user_id -> (principal, expires_at)
+        self._changed = {}  # user_id -> time of the last invalidate
+        self._lock = threading.Lock()
+        self.counters = {'cache_hits': 0, 'claim_hits': 0, 'loads': 0, 'invalidations': 0}
+        self._timings = {'requests': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+
+    def get(self, user_id, claims=None):
+        """Principal for user_id, or None if the user does not exist"""
+        found, changed_at = self._lookup(user_id, claims)
+        if found is not None:
+            return found
+
+        user = self.load(user_id)
+        with self._lock:
+            self.counters['loads'] += 1
+            if user is None:
+                return None
+            found = principal(user)
+            # Skip the store if the user changed while we were reading it
+            if self._changed.get(user_id) == changed_at:
+                self._entries[user_id] = (found, time.time() + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return found
+
+    def peek(self, user_id, claims=None):
+        """Principal from the cache or the claims alone, or None if it needs a load"""
+        return self._lookup(user_id, claims)[0]
+
+    def _lookup(self, user_id, claims):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.counters['cache_hits'] += 1
+                return entry[0], None
+            changed_at = self._changed.get(user_id)
+
+        if claims and self._trust_claims(claims, changed_at, now):
+            with self._lock:
+                self.counters['claim_hits'] += 1
+            return {'id': user_id, 'username': claims['name'], 'email': claims['email']}, changed_at
+        return None, changed_at
+
+    def _trust_claims(self, claims, changed_at, now):
+        issued_at = claims.get('iat', 0)
+        return ('name' in claims and 'email' in claims and now - issued_at < self.ttl
+                and (changed_at is None or issued_at > changed_at))
+
+    def invalidate(self, user_id):
+        """Forget user_id after its row changed or was deleted"""
+        now = time.time()
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._changed[user_id] = now
+            self.counters['invalidations'] += 1
+            # Tokens issued more than ttl ago are never trusted anyway
+            for stale in [uid for uid, at in self._changed.items() if now - at > self.ttl]:
+                del self._changed[stale]
+
+    def observe(self, seconds):
+        """Record how long one request spent authenticating"""
+        ms = seconds * 1000
+        with self._lock:
+            self._timings['requests'] += 1
+            self._timings['total_ms'] += ms
+            self._timings['max_ms'] = max(self._timings['max_ms'], ms)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self._entries)
+            requests = self._timings['requests']
+            stats['requests'] = requests
+            stats['avg_auth_ms'] = round(self._timings['total_ms'] / requests, 3) if requests else 0.0
+            stats['max_auth_ms'] = round(self._timings['max_ms'], 3)
+        return stats
@@ -0,0 +1,71 @@
+"""Training time and serving latency of the ALS collaborative model.
+
+Builds a synthetic implicit-feedback matrix with popularity-skewed items
+(history weight 1, favorites 2, ratings scaled as in interactions.py),
+trains it, and times scoring a user against the whole catalog.
+
+    python benchmarks/bench_als.py --users 100000 --movies 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from als import ALSModel, train_als  # noqa: E402
+
+
+def synthetic_interactions(n_users, n_movies, per_user=20, seed=0):
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, n_movies + 1) ** 0.8
+    popularity /= popularity.sum()
+    counts = rng.poisson(per_user, n_users) + 1
+    rows = np.repeat(np.arange(n_users), counts)
+    cols = rng.choice(n_movies, size=rows.size, p=popularity)
+    weights = rng.choice([1.0, 2.0, 1.6], size=rows.size, p=[0.7, 0.2, 0.1]).astype(np.float32)
+    return sp.coo_matrix((weights, (rows, cols)), shape=(n_users, n_movies)).tocsr()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--movies', type=int, default=20000)
+    parser.add_argument('--per-user', type=int, default=20)
+    parser.add_argument('--factors', type=int, default=32)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    interactions = synthetic_interactions(args.users, args.movies, args.per_user)
+    print(f"{args.users} users x {args.movies} movies, {interactions.nnz} interactions, "
+          f"{args.factors} factors, {args.iterations} iterations")
+
+    start = time.perf_counter()
+    user_factors, item_factors = train_als(interactions, args.factors, iterations=args.iterations)
+    train = time.perf_counter() - start
+    print(f"  training: {train:.1f}s ({train / args.iterations:.2f}s per iteration)")
+
+    model = ALSModel(user_factors, item_factors, np.arange(args.users), np.arange(args.movies),
+                     interactions.indptr, interactions.indices)
+    users = np.random.default_rng(1).integers(args.users, size=args.requests)
+
+    start = time.perf_counter()
+    for user_id in users:
+        model.scores(int(user_id))
+    score_ms = (time.perf_counter() - start) / args.requests * 1000
+
+    start = time.perf_counter()
+    for user_id in users:
+        model.recommend(int(user_id), 10)
+    recommend_ms = (time.perf_counter() - start) / args.requests * 1000
+
+    print(f"  serving: {score_ms:.3f} ms to score the catalog, "
+          f"{recommend_ms:.3f} ms for top-10 unseen")
+
+
+if __name__ == '__main__':
+    main()
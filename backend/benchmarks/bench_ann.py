@@ -0,0 +1,88 @@
+"""Recall and latency of the LSH similarity backend against exact search.
+
+Ground truth is the exact TF-IDF cosine top-n for each query movie. Each
+row of the output is one (tables, bits, probes) setting of the index, with
+candidates re-ranked on the SVD embeddings and on the full TF-IDF rows (what
+the "ann" backend does when the index was built from the live corpus).
+
+    python benchmarks/bench_ann.py --movies 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import LSHIndex  # noqa: E402
+from bench_neighbors import synthetic_corpus  # noqa: E402
+from neighbors import top_k  # noqa: E402
+
+SETTINGS = [
+    # (tables, bits, probes)
+    (4, 12, 0),
+    (8, 12, 0),
+    (8, 10, 1),
+    (16, 10, 1),
+    (16, 8, 1),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--movies', type=int, default=50000)
+    parser.add_argument('--dimensions', type=int, default=64)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--n', type=int, default=10)
+    args = parser.parse_args()
+
+    matrix = TfidfVectorizer().fit_transform(synthetic_corpus(args.movies)).tocsr()
+    movie_ids = np.arange(1, args.movies + 1)
+    rng = np.random.default_rng(1)
+    rows = rng.choice(args.movies, args.queries, replace=False)
+
+    start = time.perf_counter()
+    truth = []
+    for row in rows:
+        scores = (matrix @ matrix[row].T).toarray().ravel()
+        truth.append(set(movie_ids[top_k(scores, args.n, exclude=row)].tolist()))
+    exact_ms = (time.perf_counter() - start) / len(rows) * 1000
+
+    print(f"{args.movies} movies, {args.dimensions} dims, recall@{args.n} over {args.queries} queries")
+    print(f"  exact scan: {exact_ms:.3f} ms/query")
+    print(f"  {'tables':>6} {'bits':>5} {'probes':>6} {'build s':>8} {'candidates':>10} "
+          f"{'emb ms':>7} {'recall':>7} {'tfidf ms':>8} {'recall':>7}")
+    for tables, bits, probes in SETTINGS:
+        start = time.perf_counter()
+        index = LSHIndex.build(matrix, movie_ids, args.dimensions, tables, bits, probes)
+        build = time.perf_counter() - start
+
+        candidates = 0
+        for row in rows[:50]:
+            candidates += index.candidates(index.embeddings[row], probes).size
+
+        results = []
+        for tfidf in (False, True):
+            hits = 0
+            start = time.perf_counter()
+            for row, expected in zip(rows, truth):
+                rerank = None
+                if tfidf:
+                    vector = matrix[row]
+                    rerank = lambda candidates: (matrix[candidates] @ vector.T).toarray()
+                found = index.query_movie(int(movie_ids[row]), args.n, rerank=rerank)
+                hits += len(expected.intersection(found))
+            results.append(((time.perf_counter() - start) / len(rows) * 1000,
+                            hits / (len(rows) * args.n)))
+
+        (emb_ms, emb_recall), (tfidf_ms, tfidf_recall) = results
+        print(f"  {tables:>6} {bits:>5} {probes:>6} {build:>8.2f} "
+              f"{candidates // min(50, len(rows)):>10} {emb_ms:>7.3f} {emb_recall:>7.3f} "
+              f"{tfidf_ms:>8.3f} {tfidf_recall:>7.3f}")
+
+
+if __name__ == '__main__':
+    main()
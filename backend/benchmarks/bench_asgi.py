@@ -0,0 +1,185 @@
+"""Concurrent request capacity of one worker: WSGI thread pool vs the ASGI entry point.
+
+Starts the stub TMDB server and then, one at a time, two single-process
+backends in subprocesses:
+
+    wsgi  app.py on a WSGI server with a fixed pool of --threads threads,
+          the way a threaded gunicorn worker runs it
+    asgi  asgi:application on uvicorn (one event loop)
+
+Each is driven with an increasing number of concurrent clients requesting
+/api/movies/discover/movie with a fresh page every time, so every request
+is a cache miss that waits --latency on upstream. Needs aiohttp and uvicorn.
+
+    python benchmarks/bench_asgi.py --threads 16 --latency 0.05 --seconds 5
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_wsgi(port, threads):
+    from concurrent.futures import ThreadPoolExecutor
+    from socketserver import ThreadingMixIn
+
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    import app as appmod
+
+    class PooledWSGIServer(ThreadingMixIn, BaseWSGIServer):
+        """A fixed pool of request threads, like a threaded gunicorn worker"""
+        request_queue_size = 1024
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+    class Handler(WSGIRequestHandler):
+        # One request per connection, so idle keep-alive clients cannot pin pool threads
+        protocol_version = 'HTTP/1.0'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    PooledWSGIServer('127.0.0.1', port, appmod.app, handler=Handler).serve_forever()
+
+
+def serve_asgi(port):
+    import uvicorn
+
+    import asgi
+    uvicorn.run(asgi.application, host='127.0.0.1', port=port, log_level='warning',
+                backlog=1024, lifespan='on')
+
+
+async def wait_until_up(base_url, timeout=60):
+    deadline = time.time() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.time() < deadline:
+            try:
+                async with session.get(f"{base_url}/api/cache/stats"):
+                    return
+            except aiohttp.ClientConnectionError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+async def fetch(conn, host, path, token):
+    """One GET over a raw keep-alive connection; returns (status, conn or None if closed)"""
+    if conn is None:
+        conn = await asyncio.open_connection(*host)
+    reader, writer = conn
+    writer.write((f"GET {path} HTTP/1.1\r\nHost: {host[0]}\r\n"
+                  f"Authorization: Bearer {token}\r\n\r\n").encode('latin-1'))
+    status_line, *header_lines = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    headers = dict(line.lower().split(': ', 1) for line in header_lines if line)
+    await reader.readexactly(int(headers.get('content-length', 0)))
+    if status_line.startswith('HTTP/1.0') or headers.get('connection') == 'close':
+        writer.close()
+        conn = None
+    return int(status_line.split()[1]), conn
+
+
+async def drive(host, token, concurrency, seconds, pages):
+    """Keep `concurrency` clients busy for `seconds`; returns (req/s, p50 ms, p99 ms, errors)"""
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        nonlocal errors
+        conn = None
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status, conn = await fetch(conn, host, f"/api/movies/discover/movie?page={next(pages)}", token)
+            except (OSError, asyncio.IncompleteReadError):
+                status, conn = None, None
+            latencies.append(time.perf_counter() - start)
+            errors += status != 200
+        if conn is not None:
+            conn[1].close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return (len(latencies) / elapsed, latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.99)] * 1000, errors)
+
+
+async def bench(mode, args, env):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen([sys.executable, __file__, '--serve', mode, '--port', str(port),
+                               '--threads', str(args.threads)],
+                              env=env, cwd=tempfile.mkdtemp(), stdout=subprocess.DEVNULL)
+    try:
+        await wait_until_up(base_url)
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{base_url}/api/auth/signup", json={
+                    'username': mode, 'email': f"{mode}@example.com", 'password': 'pw'}) as response:
+                token = (await response.json())['token']
+
+        # Distinct pages per run so every request misses the cache
+        pages = itertools.count(1 + 10 ** 6 * ('wsgi', 'asgi').index(mode))
+        for concurrency in args.concurrency:
+            rate, p50, p99, errors = await drive(('127.0.0.1', port), token, concurrency,
+                                                 args.seconds, pages)
+            print(f"{mode:>5} {concurrency:>7} {rate:>8.0f} {p50:>8.1f} {p99:>8.1f} {errors:>7}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16, help='WSGI pool size')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub TMDB latency in seconds')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32, 128, 256])
+    parser.add_argument('--serve', choices=('wsgi', 'asgi'), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        sys.path.insert(0, BACKEND)
+        return serve_wsgi(args.port, args.threads) if args.serve == 'wsgi' else serve_asgi(args.port)
+
+    stub_port = free_port()
+    stub = subprocess.Popen([sys.executable, os.path.join(BACKEND, 'benchmarks', 'stub_tmdb.py'),
+                             '--port', str(stub_port), '--latency', str(args.latency)],
+                            stdout=subprocess.DEVNULL)
+    env = dict(os.environ, TMDB_BASE_URL=f"http://127.0.0.1:{stub_port}/3", TMDB_API_KEY='bench',
+               TMDB_CACHE_DB='', ENGINE_SNAPSHOT_PATH='', CATALOG_SYNC_PAGES='0',
+               TMDB_POOL_SIZE=str(max(args.threads, 20)))
+    try:
+        print(f"{'mode':>5} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for mode in ('wsgi', 'asgi'):
+            asyncio.run(bench(mode, args, env))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == '__main__':
+    main()
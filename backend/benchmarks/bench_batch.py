@@ -0,0 +1,104 @@
+"""Single-event writes against the batch write endpoints.
+
+Serves the app on a local threaded WSGI server (TMDB calls go to the stub
+server) and records the same N favourites, history views and ratings for a
+fresh user twice: once as N single requests to the per-movie endpoints and
+once as batch requests of up to MAX_BATCH_SIZE events each. Every run
+uses its own movie ids; with --cold they are not preloaded into the local
+catalog, so each one costs a TMDB fetch.
+
+    python benchmarks/bench_batch.py --events 1000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_tmdb import start_stub_server  # noqa: E402
+
+
+def signup(session, base_url, name):
+    response = session.post(f"{base_url}/api/auth/signup", json={
+        'username': name, 'email': f"{name}@example.com", 'password': 'pw'})
+    session.headers['Authorization'] = f"Bearer {response.json()['token']}"
+
+
+def single(session, base_url, kind, movie_ids):
+    for movie_id in movie_ids:
+        if kind == 'favorites':
+            session.post(f"{base_url}/api/user/favorites/toggle", json={'movieId': movie_id})
+        elif kind == 'history':
+            session.post(f"{base_url}/api/user/history/add", json={'movieId': movie_id})
+        else:
+            session.put(f"{base_url}/api/user/ratings/{movie_id}", json={'rating': 7})
+
+
+def batched(session, base_url, kind, movie_ids, batch_size):
+    written = 0
+    for start in range(0, len(movie_ids), batch_size):
+        chunk = movie_ids[start:start + batch_size]
+        if kind == 'ratings':
+            events = [{'movieId': movie_id, 'rating': 7} for movie_id in chunk]
+        else:
+            events = [{'movieId': movie_id} for movie_id in chunk]
+        response = session.post(f"{base_url}/api/user/{kind}/batch", json={'events': events})
+        response.raise_for_status()
+        written += response.json()['written']
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--cold', action='store_true', help='start with an empty local catalog')
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    stub, stub_url = start_stub_server(0.005)
+    os.environ.update({'TMDB_BASE_URL': stub_url, 'TMDB_API_KEY': 'bench',
+                       'TMDB_CACHE_DB': '', 'ENGINE_SNAPSHOT_PATH': ''})
+    os.chdir(tempfile.mkdtemp())
+
+    import app as appmod
+    kinds = ('favorites', 'history', 'ratings')
+    if not args.cold:
+        # tmdb_request writes every fetched movie through to the catalog
+        appmod.movie_hydrator.hydrate(range(1, 2 * len(kinds) * args.events + 1), timeout=120)
+
+    server = make_server('127.0.0.1', 0, appmod.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    batch_size = appmod.app.config['MAX_BATCH_SIZE']
+
+    print(f"{'kind':>10} {'single s':>9} {'batch s':>8} {'speedup':>8}")
+    first_id = 1
+    for kind in kinds:
+        timings = []
+        for i, write in enumerate((single, batched)):
+            movie_ids = list(range(first_id, first_id + args.events))
+            first_id += args.events
+            session = requests.Session()
+            signup(session, base_url, f"{kind}{i}")
+            start = time.perf_counter()
+            if write is single:
+                write(session, base_url, kind, movie_ids)
+            else:
+                if write(session, base_url, kind, movie_ids, batch_size) != len(movie_ids):
+                    print(f"warning: {kind} batch wrote fewer than {len(movie_ids)} events")
+            timings.append(time.perf_counter() - start)
+        print(f"{kind:>10} {timings[0]:>9.2f} {timings[1]:>8.3f} {timings[0] / timings[1]:>7.0f}x")
+
+    server.shutdown()
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
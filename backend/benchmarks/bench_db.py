@@ -0,0 +1,117 @@
+"""Mixed read/write throughput on the /api/user/* endpoints.
+
+Serves the app on a local threaded WSGI server (TMDB calls go to the stub
+server) and drives it from concurrent clients, each with its own account,
+doing favourites/history reads and writes. Runs once with a connection
+per request in rollback-journal mode and once with the WAL connection pool.
+
+    python benchmarks/bench_db.py --clients 16 --seconds 10 --write-ratio 0.3
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_tmdb import start_stub_server  # noqa: E402
+
+MOVIE_IDS = list(range(1, 201))
+
+
+def client_loop(base_url, token, deadline, write_ratio, latencies, errors):
+    session = requests.Session()
+    session.headers['Authorization'] = f"Bearer {token}"
+    rng = random.Random(token)
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            if rng.random() < write_ratio:
+                if rng.random() < 0.5:
+                    response = session.post(f"{base_url}/api/user/history/add",
+                                            json={'movieId': rng.choice(MOVIE_IDS)})
+                else:
+                    response = session.post(f"{base_url}/api/user/favorites/toggle",
+                                            json={'movieId': rng.choice(MOVIE_IDS)})
+            else:
+                response = session.get(f"{base_url}/api/user/{rng.choice(('favorites', 'history'))}")
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        latencies.append(time.perf_counter() - start)
+        if not ok:
+            errors.append(1)
+
+
+def run(appmod, label, args):
+    server = make_server('127.0.0.1', 0, appmod.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    tokens = []
+    for i in range(args.clients):
+        response = requests.post(f"{base_url}/api/auth/signup", json={
+            'username': f"{label}{i}", 'email': f"{label}{i}@example.com", 'password': 'pw'})
+        tokens.append(response.json()['token'])
+
+    latencies, errors = [], []
+    deadline = time.time() + args.seconds
+    threads = [threading.Thread(target=client_loop,
+                                args=(base_url, token, deadline, args.write_ratio, latencies, errors))
+               for token in tokens]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{label:>10} {len(latencies):>8} {len(latencies) / elapsed:>8.0f} {p50:>8.1f} "
+          f"{p99:>8.1f} {len(errors):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    stub, stub_url = start_stub_server(0.005)
+    os.environ.update({'TMDB_BASE_URL': stub_url, 'TMDB_API_KEY': 'bench',
+                       'TMDB_CACHE_DB': '', 'ENGINE_SNAPSHOT_PATH': ''})
+    os.chdir(tempfile.mkdtemp())
+
+    import app as appmod
+    from storage import SQLiteStorage
+    # Put the movies the clients touch in the catalog so writes stay local
+    for movie_id in MOVIE_IDS:
+        appmod.tmdb_request(f'movie/{movie_id}')
+
+    print(f"{'mode':>10} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+
+    # Baseline: connection per request, default rollback journal
+    appmod.storage = SQLiteStorage(os.path.abspath('baseline.db'), pool_size=0, pragmas={})
+    appmod.init_db()
+    run(appmod, 'per-req', args)
+
+    appmod.storage = SQLiteStorage(os.path.abspath('pooled.db'), pool_size=args.clients)
+    appmod.init_db()
+    run(appmod, 'pool+wal', args)
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
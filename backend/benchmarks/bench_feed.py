@@ -0,0 +1,70 @@
+"""Home page load: one /api/feed request vs the separate list routes in turn.
+
+The separate routes are /api/trending, /api/popular, /api/top_rated,
+/api/new_releases and /api/genre/<name> for the feed's default sections,
+requested one after another; the feed asks for the same sections at once.
+Genre rows and pages all come from TMDB, not the local genre index, so both
+wait on the same fetches. Each is timed --rounds times with the TMDB cache
+emptied first (every section waits --latency on the stub server) and then
+warm.
+
+    python benchmarks/bench_feed.py --latency 0.15
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_tmdb import start_stub_server  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.15, help='stub TMDB latency in seconds')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub_server(args.latency)
+    os.environ.update({'TMDB_BASE_URL': stub_url, 'TMDB_API_KEY': 'bench', 'TMDB_CACHE_DB': '',
+                       'ENGINE_SNAPSHOT_PATH': '', 'CATALOG_SYNC_PAGES': '0',
+                       'GENRE_MIN_LOCAL_RESULTS': str(10 ** 9)})
+    os.chdir(tempfile.mkdtemp())
+
+    import app as appmod
+    appmod.home_feed.local.clear()
+    client = appmod.app.test_client()
+    sections = appmod.home_feed.parse('')
+    paths = [f'/api/genre/{name}' if appmod.genre_registry.resolve(name) else f'/api/{name}'
+             for name in sections]
+
+    def evict():
+        for name in sections:
+            appmod.tmdb_cache.invalidate(*appmod.home_feed.sections[name]())
+
+    def load(urls):
+        start = time.perf_counter()
+        size = sum(len(client.get(url).data) for url in urls)
+        return (time.perf_counter() - start) * 1000, size
+
+    print(f"{'mode':>9} {'cache':>5} {'requests':>8} {'ms':>8} {'bytes':>7}")
+    for mode, urls in (('separate', paths), ('feed', ['/api/feed'])):
+        for state in ('cold', 'warm'):
+            timings = []
+            for _ in range(args.rounds):
+                if state == 'cold':
+                    evict()
+                else:
+                    load(urls)
+                ms, size = load(urls)
+                timings.append(ms)
+            print(f"{mode:>9} {state:>5} {len(urls):>8} {sorted(timings)[len(timings) // 2]:>8.1f} {size:>7}")
+
+    print(appmod.home_feed.stats())
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Genre browsing: the local genre index vs discover/movie.
+
+Fills the local catalog with --movies stub movies, times the index itself
+(one genre, then two genres ANDed), then requests --requests genre pages
+through /api/genre/<name>: answered from the index, and from TMDB (the
+stub server with --latency) by raising GENRE_MIN_LOCAL_RESULTS past any
+page size. Every TMDB request asks for a fresh page, so none is cached.
+
+    python benchmarks/bench_genres.py --movies 100000 --latency 0.15
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_tmdb import GENRES, fake_movie, start_stub_server  # noqa: E402
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--movies', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.15, help='stub TMDB latency in seconds')
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub_server(args.latency)
+    os.environ.update({'TMDB_BASE_URL': stub_url, 'TMDB_API_KEY': 'bench', 'TMDB_CACHE_DB': '',
+                       'ENGINE_SNAPSHOT_PATH': '', 'CATALOG_SYNC_PAGES': '0'})
+    os.chdir(tempfile.mkdtemp())
+
+    import app as appmod
+    # rebuild() indexes the bulk load; the catalog listeners would repeat it in the background
+    listeners, appmod.movie_catalog.listeners = appmod.movie_catalog.listeners, []
+    appmod.movie_catalog.upsert_many([fake_movie(movie_id) for movie_id in range(1, args.movies + 1)])
+    appmod.movie_catalog.listeners = listeners
+    start = time.perf_counter()
+    appmod.genre_index.rebuild(appmod.movie_catalog.genres)
+    stats = appmod.genre_index.stats()
+    print(f"indexed {stats['movies']} movies, {stats['genres']} genres in {time.perf_counter() - start:.2f} s")
+
+    random.seed(1)
+    genre_ids = [genre_id for genre_id, _ in GENRES]
+    print(f"{'query':>12} {'p50 us':>8} {'p99 us':>8}")
+    for label, pick in (('one genre', lambda: [random.choice(genre_ids)]),
+                        # Stub movies have neighbouring genres, so this pair always overlaps
+                        ('two genres', lambda: genre_ids[random.randrange(len(genre_ids) - 1):][:2])):
+        timings = []
+        for _ in range(1000):
+            wanted, page = pick(), random.randrange(5)
+            started = time.perf_counter()
+            appmod.genre_index.browse(wanted, 20, page * 20)
+            timings.append((time.perf_counter() - started) * 1e6)
+        print(f"{label:>12} {percentiles(timings)[0]:>8.1f} {percentiles(timings)[1]:>8.1f}")
+
+    client = appmod.app.test_client()
+    names = [name for _, name in GENRES]
+    print(f"{'source':>6} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8} {'TMDB calls':>11}")
+    for source, min_results in (('local', 20), ('tmdb', 10 ** 9)):
+        appmod.app.config['GENRE_MIN_LOCAL_RESULTS'] = min_results
+        calls = stub.RequestHandlerClass.request_count
+        timings = []
+        for i in range(args.requests):
+            path = f"/api/genre/{names[i % len(names)]}?page={1 + i // len(names)}"
+            started = time.perf_counter()
+            client.get(path)
+            timings.append((time.perf_counter() - started) * 1000)
+        p50, p99 = percentiles(timings)
+        print(f"{source:>6} {len(timings):>8} {p50:>8.2f} {p99:>8.2f} "
+              f"{stub.RequestHandlerClass.request_count - calls:>11}")
+
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Wall-clock comparison of serial vs concurrent recommendation hydration.
+
+Runs against the local stub TMDB server so the numbers only reflect how the
+detail fetches are scheduled, not the state of the real API.
+
+    python benchmarks/bench_hydration.py --ids 20 --latency 0.08
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hydration import DetailStore, MovieHydrator  # noqa: E402
+from stub_tmdb import start_stub_server  # noqa: E402
+from tmdb_client import TMDBClient  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ids', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.08)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.latency)
+    client = TMDBClient(base_url, pool_size=args.workers)
+
+    def fetch(movie_id):
+        return client.get(f'movie/{movie_id}', {'api_key': 'stub'})
+
+    # Ranked output with a couple of duplicates, as the hybrid ranking can produce
+    movie_ids = list(range(1, args.ids + 1))
+    movie_ids += movie_ids[:2]
+
+    def serial():
+        results = []
+        for movie_id in movie_ids:
+            movie = fetch(movie_id)
+            if 'id' in movie:
+                results.append(movie)
+        return results
+
+    hydrator = MovieHydrator(fetch, max_workers=args.workers, timeout=10)
+    warm_hydrator = MovieHydrator(fetch, store=DetailStore(), max_workers=args.workers, timeout=10)
+    warm_hydrator.hydrate(movie_ids)
+
+    cases = [
+        ('serial', serial),
+        (f'concurrent ({args.workers} workers)', lambda: hydrator.hydrate(movie_ids)),
+        ('concurrent, warm store', lambda: warm_hydrator.hydrate(movie_ids)),
+    ]
+
+    print(f"{args.ids} IDs, stub latency {args.latency * 1000:.0f} ms, best of {args.rounds}")
+    baseline = None
+    for name, run in cases:
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            results = run()
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        baseline = baseline or best
+        print(f"  {name:<28} {best * 1000:8.1f} ms  {len(results):3d} movies  "
+              f"{baseline / best:6.1f}x")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
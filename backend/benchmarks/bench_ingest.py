@@ -0,0 +1,72 @@
+"""Throughput and peak memory of the bulk ingestion pipeline.
+
+Ingests a generated TMDB-format JSONL dump of increasing size, then pages
+through the stub TMDB server, into a throwaway catalog. Flat peak memory
+across dump sizes is the point of the streaming stages.
+
+    python benchmarks/bench_ingest.py --sizes 10000 50000 --pages 50
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingest  # noqa: E402
+from catalog import MovieCatalog  # noqa: E402
+from stub_tmdb import fake_movie, start_stub_server  # noqa: E402
+from tmdb_client import TMDBClient  # noqa: E402
+
+
+def write_dump(path, size):
+    with open(path, 'w') as f:
+        for movie_id in range(1, size + 1):
+            f.write(json.dumps(fake_movie(movie_id)) + '\n')
+
+
+def measure(pages_factory, db_path):
+    catalog = MovieCatalog(db_path)
+    checkpoint = ingest.Checkpoint()
+    tracemalloc.start()
+    stats = ingest.run(pages_factory(checkpoint), catalog, checkpoint, report_every=0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return stats, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--pages', type=int, default=50, help='Pages per endpoint from the stub')
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    print(f"{'source':>14} {'records':>8} {'persisted':>9} {'seconds':>8} {'rec/s':>8} {'peak MB':>8}")
+
+    for size in args.sizes:
+        dump = os.path.join(workdir, f"dump{size}.jsonl")
+        write_dump(dump, size)
+        stats, peak = measure(lambda checkpoint: ingest.jsonl_pages(dump, checkpoint),
+                              os.path.join(workdir, f"dump{size}.db"))
+        print(f"{'jsonl':>14} {stats.records:>8} {stats.persisted:>9} {stats.elapsed():>8.2f} "
+              f"{stats.rate():>8.0f} {peak / 2**20:>8.1f}")
+
+    server, base_url = start_stub_server(args.latency)
+    client = TMDBClient(base_url, pool_size=args.workers)
+    for workers in (1, args.workers):
+        stats, peak = measure(
+            lambda checkpoint: ingest.tmdb_pages(client.get, checkpoint, max_pages=args.pages,
+                                                 workers=workers),
+            os.path.join(workdir, f"tmdb{workers}.db"))
+        print(f"{f'tmdb x{workers}':>14} {stats.records:>8} {stats.persisted:>9} "
+              f"{stats.elapsed():>8.2f} {stats.rate():>8.0f} {peak / 2**20:>8.1f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Per-request latency of content-based similarity: full scan vs neighbour table.
+
+The "scan" path is what content_based_recommendations used to do on every
+request (list.index, cosine_similarity against the whole matrix, argsort).
+The "table" path is a lookup in a precomputed NeighborTable.
+
+    python benchmarks/bench_neighbors.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from neighbors import NeighborTable  # noqa: E402
+
+
+def synthetic_corpus(n_movies, vocabulary=20000, words_per_doc=40, topics=200,
+                     topic_words=60, topic_share=0.6, seed=0):
+    """Overview-like documents: a Zipf-ish background plus one topic's words"""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, vocabulary + 1)
+    weights /= weights.sum()
+    topic_vocab = rng.choice(vocabulary, size=(topics, topic_words))
+
+    docs = []
+    n_topic = int(words_per_doc * topic_share)
+    background = rng.choice(vocabulary, size=(n_movies, words_per_doc - n_topic), p=weights)
+    doc_topics = rng.integers(topics, size=n_movies)
+    for row, topic in zip(background, doc_topics):
+        words = np.concatenate([row, rng.choice(topic_vocab[topic], n_topic)])
+        docs.append(' '.join(f"w{w}" for w in words))
+    return docs
+
+
+def time_per_request(fn, movie_ids, repeat):
+    start = time.perf_counter()
+    for movie_id in movie_ids[:repeat]:
+        fn(movie_id)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'movies':>8} {'build s':>9} {'scan ms/req':>12} {'table ms/req':>13} {'speedup':>8}")
+    for n_movies in args.sizes:
+        matrix = TfidfVectorizer().fit_transform(synthetic_corpus(n_movies))
+        movie_ids = list(range(1, n_movies + 1))
+        rng = np.random.default_rng(1)
+        queries = [int(movie_id) for movie_id in rng.choice(movie_ids, args.requests)]
+
+        def scan(movie_id):
+            idx = movie_ids.index(movie_id)
+            scores = cosine_similarity(matrix[idx:idx + 1], matrix).flatten()
+            return [movie_ids[i] for i in scores.argsort()[:-11:-1] if movie_ids[i] != movie_id]
+
+        start = time.perf_counter()
+        table = NeighborTable.build(matrix, movie_ids, k=args.k)
+        build = time.perf_counter() - start
+
+        scan_ms = time_per_request(scan, queries, min(args.requests, 50)) * 1000
+        table_ms = time_per_request(lambda movie_id: table.lookup(movie_id, 10),
+                                    queries, args.requests) * 1000
+        print(f"{n_movies:>8} {build:>9.2f} {scan_ms:>12.3f} {table_ms:>13.4f} "
+              f"{scan_ms / table_ms:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Cost and size of a cached movie list response: jsonify vs the response cache.
+
+Warms /api/trending and /api/movies/popular from the stub TMDB server,
+then requests each --requests times through the Flask test client:
+
+    jsonify   the payload serialized on every request, as before
+    identity  the stored body, uncompressed
+    gzip, br  the stored compressed bodies (br needs the brotli package)
+    304       a revalidation carrying the ETag
+
+    python benchmarks/bench_responses.py --requests 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_tmdb import start_stub_server  # noqa: E402
+
+
+def timed(client, path, headers, requests):
+    response = client.get(path, headers=headers)
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get(path, headers=headers)
+    return (time.perf_counter() - start) / requests * 1e6, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub_server(0)
+    os.environ.update({'TMDB_BASE_URL': stub_url, 'TMDB_API_KEY': 'bench', 'TMDB_CACHE_DB': '',
+                       'ENGINE_SNAPSHOT_PATH': '', 'CATALOG_SYNC_PAGES': '0'})
+    os.chdir(tempfile.mkdtemp())
+
+    import app as appmod
+    from flask import jsonify
+
+    @appmod.app.route('/bench/jsonify/<path:path>')
+    def bench_jsonify(path):
+        # The route as it was: serialize the shared payload every time
+        return jsonify(appmod.get_popular_movies(appmod.TMDB_API_KEY) if path == 'popular'
+                       else appmod.get_trending_movies(appmod.TMDB_API_KEY))
+
+    client = appmod.app.test_client()
+    print(f"{'route':>20} {'mode':>9} {'us/req':>8} {'bytes':>7}")
+    for name, path in (('trending', '/api/trending'), ('popular', '/api/movies/popular')):
+        etag = client.get(path).headers['ETag']
+        modes = [('jsonify', f'/bench/jsonify/{name}', {}),
+                 ('identity', path, {}),
+                 ('gzip', path, {'Accept-Encoding': 'gzip'}),
+                 ('br', path, {'Accept-Encoding': 'br, gzip'}),
+                 ('304', path, {'If-None-Match': etag})]
+        for mode, url, headers in modes:
+            us, response = timed(client, url, headers, args.requests)
+            if mode == 'br' and response.headers.get('Content-Encoding') != 'br':
+                continue
+            print(f"{path:>20} {mode:>9} {us:>8.1f} {len(response.data):>7}")
+
+    print(appmod.response_cache.stats())
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
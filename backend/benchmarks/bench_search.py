@@ -0,0 +1,86 @@
+"""Autocomplete latency of /api/movies/search: local index vs TMDB.
+
+Fills the local catalog with --movies stub movies, then types --titles of
+their titles into /api/movies/search one keystroke at a time (from the
+second letter on), plus each title with two letters swapped. Every query
+is answered twice: by the local search index, and by TMDB (the stub server
+with --latency) as before, by raising SEARCH_MIN_LOCAL_RESULTS past any
+possible result count.
+
+    python benchmarks/bench_search.py --movies 50000 --latency 0.15
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_tmdb import fake_movie, start_stub_server  # noqa: E402
+
+
+def keystrokes(title):
+    return [title[:end] for end in range(2, len(title) + 1)]
+
+
+def swapped(title):
+    i = random.randrange(1, max(len(title) - 1, 2))
+    return title[:i] + title[i + 1:i + 2] + title[i:i + 1] + title[i + 2:]
+
+
+def run(client, queries):
+    timings, empty = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        response = client.get('/api/movies/search', query_string={'query': query})
+        timings.append((time.perf_counter() - start) * 1000)
+        empty += not response.get_json()
+    timings.sort()
+    return timings, empty
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--movies', type=int, default=50000)
+    parser.add_argument('--titles', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.15, help='stub TMDB latency in seconds')
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub_server(args.latency)
+    os.environ.update({'TMDB_BASE_URL': stub_url, 'TMDB_API_KEY': 'bench', 'TMDB_CACHE_DB': '',
+                       'ENGINE_SNAPSHOT_PATH': '', 'CATALOG_SYNC_PAGES': '0'})
+    os.chdir(tempfile.mkdtemp())
+
+    import app as appmod
+    movies = [fake_movie(movie_id) for movie_id in range(1, args.movies + 1)]
+    # rebuild() indexes the bulk load; the catalog listeners would repeat it in the background
+    listeners, appmod.movie_catalog.listeners = appmod.movie_catalog.listeners, []
+    appmod.movie_catalog.upsert_many(movies)
+    appmod.movie_catalog.listeners = listeners
+    start = time.perf_counter()
+    appmod.movie_search.rebuild(appmod.movie_catalog.titles)
+    stats = appmod.movie_search.stats()
+    print(f"indexed {stats['movies']} movies, {stats['terms']} terms in {time.perf_counter() - start:.2f} s")
+
+    random.seed(1)
+    titles = [movie['title'] for movie in random.sample(movies, args.titles)]
+    queries = [query for title in titles for query in keystrokes(title) + [swapped(title)]]
+    client = appmod.app.test_client()
+
+    print(f"{'source':>6} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'empty':>6} {'TMDB calls':>11}")
+    for source, min_results in (('local', 1), ('tmdb', 10 ** 9)):
+        appmod.app.config['SEARCH_MIN_LOCAL_RESULTS'] = min_results
+        calls = stub.RequestHandlerClass.request_count
+        timings, empty = run(client, queries)
+        calls = stub.RequestHandlerClass.request_count - calls
+        print(f"{source:>6} {len(timings):>8} {timings[len(timings) // 2]:>8.2f} "
+              f"{timings[int(len(timings) * 0.99)]:>8.2f} {sum(timings) / len(timings):>8.2f} "
+              f"{empty:>6} {calls:>11}")
+
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Bulk load, interaction streaming and per-user reads for each storage backend.
+
+Loads synthetic users and watch history with bulk_load (executemany on
+SQLite, COPY on Postgres), streams every interaction the way the
+collaborative model does, and times per-user history reads. Postgres runs
+against DATABASE_URL if set, otherwise a throwaway local cluster when the
+server binaries are installed; otherwise it is skipped.
+
+    python benchmarks/bench_storage.py --users 2000 --per-user 50
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interactions import DEFAULT_WEIGHTS  # noqa: E402
+from local_postgres import start_local_postgres  # noqa: E402
+from storage import SQLiteStorage, make_storage  # noqa: E402
+
+
+def workload(storage, args):
+    storage.init_schema()
+    rng = random.Random(0)
+    users = [(i, f"user{i}", f"user{i}@example.com", 'x', '2024-01-01 00:00:00')
+             for i in range(1, args.users + 1)]
+    history = []
+    for user_id, *_ in users:
+        for _ in range(args.per_user):
+            history.append((len(history) + 1, user_id, rng.randrange(1, args.movies), 'Movie', None,
+                            '2024-01-01T00:00:00'))
+
+    start = time.perf_counter()
+    storage.bulk_load('users', ('id', 'username', 'email', 'password', 'created_at'), users)
+    storage.bulk_load('watch_history',
+                      ('id', 'user_id', 'movie_id', 'title', 'poster_path', 'viewed_at'), history)
+    load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    streamed = sum(len(rows) for rows in storage.iter_interactions(DEFAULT_WEIGHTS))
+    stream = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for user_id in rng.sample(range(1, args.users + 1), min(args.reads, args.users)):
+        storage.list_history(user_id)
+    reads = time.perf_counter() - start
+
+    return len(history), load, streamed, stream, reads / min(args.reads, args.users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--per-user', type=int, default=50)
+    parser.add_argument('--movies', type=int, default=20000)
+    parser.add_argument('--reads', type=int, default=500)
+    args = parser.parse_args()
+
+    backends = [('sqlite', lambda: SQLiteStorage(os.path.join(tempfile.mkdtemp(), 'bench.db')))]
+    stop = None
+    dsn = os.getenv('DATABASE_URL')
+    if not dsn:
+        try:
+            stop, dsn = start_local_postgres()
+        except (RuntimeError, OSError) as e:
+            print(f"Skipping Postgres: {e}")
+    if dsn:
+        backends.append(('postgres', lambda: make_storage(dsn)))
+
+    print(f"{'backend':>9} {'rows':>8} {'load s':>7} {'rows/s':>9} {'stream s':>8} {'read ms':>8}")
+    try:
+        for name, factory in backends:
+            rows, load, streamed, stream, read = workload(factory(), args)
+            print(f"{name:>9} {rows:>8} {load:>7.2f} {rows / load:>9.0f} {stream:>8.2f} "
+                  f"{read * 1000:>8.2f}")
+    finally:
+        if stop is not None:
+            stop()
+
+
+if __name__ == '__main__':
+    main()
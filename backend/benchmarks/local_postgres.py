@@ -0,0 +1,42 @@
+"""Throwaway PostgreSQL server for exercising storage.PostgresStorage locally.
+
+Needs the PostgreSQL server binaries (initdb, pg_ctl) on PATH. The cluster
+lives in a temporary directory, listens only on a Unix socket and a free
+localhost port, and is deleted on stop().
+
+    from local_postgres import start_local_postgres
+    stop, dsn = start_local_postgres()
+"""
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_local_postgres(port=0):
+    """Start a temporary cluster; returns (stop, dsn)"""
+    if shutil.which('initdb') is None or shutil.which('pg_ctl') is None:
+        raise RuntimeError("initdb/pg_ctl not found; install the PostgreSQL server binaries")
+
+    port = port or _free_port()
+    root = tempfile.mkdtemp(prefix='pg-')
+    data = os.path.join(root, 'data')
+    subprocess.run(['initdb', '-D', data, '-U', 'postgres', '--auth=trust', '-E', 'UTF8'],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(['pg_ctl', '-D', data, '-l', os.path.join(root, 'server.log'), '-w',
+                    '-o', f"-p {port} -k {root} -c listen_addresses=127.0.0.1 -c fsync=off",
+                    'start'], check=True, stdout=subprocess.DEVNULL)
+
+    def stop():
+        subprocess.run(['pg_ctl', '-D', data, '-m', 'fast', '-w', 'stop'],
+                       check=False, stdout=subprocess.DEVNULL)
+        shutil.rmtree(root, ignore_errors=True)
+
+    return stop, f"postgresql://postgres@127.0.0.1:{port}/postgres"
@@ -0,0 +1,156 @@
+"""Local stand-in for the TMDB API, used by the benchmarks in this folder.
+
+Serves deterministic fake payloads for the handful of endpoints the backend
+talks to, with a configurable per-request latency so upstream I/O dominates
+the way it does against the real service.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+GENRES = [
+    (28, 'Action'), (12, 'Adventure'), (16, 'Animation'), (35, 'Comedy'),
+    (80, 'Crime'), (99, 'Documentary'), (18, 'Drama'), (10751, 'Family'),
+    (14, 'Fantasy'), (36, 'History'), (27, 'Horror'), (10402, 'Music'),
+    (9648, 'Mystery'), (10749, 'Romance'), (878, 'Science Fiction'),
+    (10770, 'TV Movie'), (53, 'Thriller'), (10752, 'War'), (37, 'Western'),
+]
+
+WORDS = ('space heist love war dragon city night secret family robot ocean '
+         'detective ghost king island revenge school music storm journey').split()
+
+PAGE_SIZE = 20
+
+
+def fake_movie(movie_id):
+    """Build a TMDB-shaped list item for movie_id"""
+    words = [WORDS[(movie_id * (i + 3)) % len(WORDS)] for i in range(8)]
+    genre_ids = [GENRES[(movie_id + i) % len(GENRES)][0] for i in range(2)]
+    return {
+        'id': movie_id,
+        'title': f"{words[0].title()} {words[1].title()} {movie_id}",
+        'overview': ' '.join(words),
+        'genre_ids': genre_ids,
+        'poster_path': f"/poster{movie_id}.jpg",
+        'backdrop_path': f"/backdrop{movie_id}.jpg",
+        'release_date': f"20{movie_id % 25:02d}-01-01",
+        'vote_average': round((movie_id % 90) / 10 + 1, 1),
+        'vote_count': movie_id % 5000,
+        'popularity': float(10000 - movie_id % 10000),
+        'original_language': 'en',
+        'adult': False,
+    }
+
+
+def fake_details(movie_id):
+    """Build a TMDB-shaped movie/{id} payload"""
+    movie = fake_movie(movie_id)
+    movie['genres'] = [{'id': gid, 'name': dict(GENRES)[gid]} for gid in movie.pop('genre_ids')]
+    movie['runtime'] = 90 + movie_id % 60
+    movie['tagline'] = movie['overview'][:30]
+    return movie
+
+
+def fake_page(seed, page, total_pages=500):
+    start = seed * 100000 + (page - 1) * PAGE_SIZE + 1
+    return {
+        'page': page,
+        'results': [fake_movie(i) for i in range(start, start + PAGE_SIZE)],
+        'total_pages': total_pages,
+        'total_results': total_pages * PAGE_SIZE,
+    }
+
+
+LIST_ENDPOINTS = {
+    '/movie/popular': 0,
+    '/movie/top_rated': 1,
+    '/movie/now_playing': 2,
+    '/trending/movie/week': 3,
+    '/trending/movie/day': 3,
+    '/discover/movie': 4,
+    '/search/movie': 5,
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real API, so clients reuse their pooled connections
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; with Nagle on, the body of
+    # every reused connection waited ~40 ms for the client's delayed ACK
+    disable_nagle_algorithm = True
+    latency = 0.05
+    request_count = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with StubHandler.lock:
+            StubHandler.request_count += 1
+        time.sleep(self.latency)
+
+        url = urlparse(self.path)
+        path = url.path
+        if path.startswith('/3/'):
+            path = path[2:]
+        query = parse_qs(url.query)
+        page = int(query.get('page', ['1'])[0])
+
+        match = re.fullmatch(r'/movie/(\d+)', path)
+        if match:
+            body = fake_details(int(match.group(1)))
+        elif path in LIST_ENDPOINTS:
+            seed = LIST_ENDPOINTS[path]
+            if path == '/discover/movie':
+                seed += int(query.get('with_genres', ['0'])[0].split(',')[0]) % 7
+            body = fake_page(seed, page)
+        elif path == '/genre/movie/list':
+            body = {'genres': [{'id': gid, 'name': name} for gid, name in GENRES]}
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StubServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 turns bursts of concurrent clients into SYN retries
+    request_queue_size = 1024
+
+
+def start_stub_server(latency=0.05, port=0):
+    """Start the stub in a daemon thread and return (server, base_url)"""
+    handler = type('Handler', (StubHandler,), {'latency': latency})
+    server = StubServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/3"
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run a local stub TMDB API')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.latency, args.port)
+    print(f"Stub TMDB listening on {base_url} (latency {args.latency * 1000:.0f} ms)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
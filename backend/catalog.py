@@ -0,0 +1,208 @@
+"""Persistent local catalog of TMDB movie metadata.
+
+Every movie the backend sees in a TMDB response is written through to the
+movies table, and a background job keeps the main category lists synced.
+Write endpoints, recommendation hydration, the recommendation engine and
+local search read movie metadata from here instead of calling TMDB.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+
+import db_pool
+import ingest
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    overview TEXT,
+    poster_path TEXT,
+    backdrop_path TEXT,
+    release_date TEXT,
+    vote_average REAL,
+    vote_count INTEGER,
+    popularity REAL,
+    original_language TEXT,
+    genre_ids TEXT,
+    details TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_movies_popularity ON movies (popularity DESC);
+CREATE INDEX IF NOT EXISTS idx_movies_release_date ON movies (release_date);
+'''
+
+COLUMNS = ('id', 'title', 'overview', 'poster_path', 'backdrop_path', 'release_date',
+           'vote_average', 'vote_count', 'popularity', 'original_language')
+
+DETAIL_ENDPOINT = re.compile(r'movie/\d+')
+
+# SQLite's default limit on bound parameters per statement is 999
+MAX_VARIABLES = 900
+
+
+def _is_movie(item):
+    # TV shows and people carry 'name' instead of 'title'
+    return isinstance(item, dict) and 'id' in item and 'title' in item
+
+
+class MovieCatalog:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self.listeners = []  # called with each batch of movies written
+        db = self._connection()
+        db.executescript(SCHEMA)
+        db.commit()
+
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = db_pool.connect(self.db_path)
+        return db
+
+    def upsert_many(self, movies, details=False):
+        """Insert or refresh movies; details=True stores each payload as the full record"""
+        now = time.time()
+        rows = []
+        movies = [movie for movie in movies if _is_movie(movie)]
+        for movie in movies:
+            genre_ids = movie.get('genre_ids')
+            if genre_ids is None and movie.get('genres'):
+                genre_ids = [g['id'] for g in movie['genres'] if isinstance(g, dict)]
+            rows.append(tuple(movie.get(column) for column in COLUMNS) + (
+                json.dumps(genre_ids or []),
+                json.dumps(movie) if details else None,
+                now,
+            ))
+        if not rows:
+            return 0
+
+        db = self._connection()
+        # List payloads never overwrite a stored detail payload
+        db.executemany(f'''
+            INSERT INTO movies ({', '.join(COLUMNS)}, genre_ids, details, updated_at)
+            VALUES ({', '.join('?' * (len(COLUMNS) + 3))})
+            ON CONFLICT(id) DO UPDATE SET
+                {', '.join(f'{column} = excluded.{column}' for column in COLUMNS[1:])},
+                genre_ids = excluded.genre_ids,
+                details = COALESCE(excluded.details, movies.details),
+                updated_at = excluded.updated_at
+        ''', rows)
+        db.commit()
+        for listener in self.listeners:
+            listener(movies)
+        return len(rows)
+
+    def put(self, movie_id, movie):
+        self.upsert_many([movie], details=True)
+
+    def ingest_response(self, endpoint, payload):
+        """Write through any movies found in a TMDB response"""
+        if not isinstance(payload, dict) or 'error' in payload:
+            return
+        try:
+            if DETAIL_ENDPOINT.fullmatch(endpoint.strip('/')) and _is_movie(payload):
+                self.upsert_many([payload], details=True)
+            elif isinstance(payload.get('results'), list):
+                self.upsert_many(payload['results'])
+        except sqlite3.Error as e:
+            print("Catalog write error:", e)
+
+    def get(self, movie_id):
+        return self.get_many([movie_id]).get(movie_id)
+
+    def get_many(self, movie_ids, summary=False):
+        """Return {movie_id: movie} for the ids present in the catalog.
+
+        summary=True returns every movie in the list-result shape, even when
+        its full detail payload is stored.
+        """
+        movie_ids = list(dict.fromkeys(int(movie_id) for movie_id in movie_ids))
+        found = {}
+        db = self._connection()
+        for start in range(0, len(movie_ids), MAX_VARIABLES):
+            chunk = movie_ids[start:start + MAX_VARIABLES]
+            rows = db.execute(f'SELECT * FROM movies WHERE id IN ({",".join("?" * len(chunk))})',
+                              chunk).fetchall()
+            for row in rows:
+                found[row['id']] = self._to_movie(row, summary)
+        return found
+
+    def popular(self, limit=1000):
+        """Most popular movies in the catalog, best first"""
+        rows = self._connection().execute(
+            'SELECT * FROM movies ORDER BY popularity DESC LIMIT ?', (limit,)
+        ).fetchall()
+        return [self._to_movie(row) for row in rows]
+
+    def titles(self):
+        """(id, title, popularity) for every movie, for the search index"""
+        return self._connection().execute('SELECT id, title, popularity FROM movies').fetchall()
+
+    def genres(self):
+        """(id, genre_ids, popularity) for every movie, for the genre index"""
+        rows = self._connection().execute('SELECT id, genre_ids, popularity FROM movies').fetchall()
+        return [(row['id'], json.loads(row['genre_ids'] or '[]'), row['popularity']) for row in rows]
+
+    def count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM movies').fetchone()[0]
+
+    def _to_movie(self, row, summary=False):
+        if row['details'] and not summary:
+            return json.loads(row['details'])
+        movie = {column: row[column] for column in COLUMNS}
+        movie['genre_ids'] = json.loads(row['genre_ids'] or '[]')
+        return movie
+
+
+class CatalogSync:
+    """Periodically re-ingest the first pages of the TMDB category lists.
+
+    fetch(endpoint, params) returns a decoded TMDB response. Pages go through
+    the ingest pipeline straight into the catalog, bypassing the response
+    cache so a sync does not evict hot entries. index is the ContentIndex
+    the vectorize stage adds them to, or a function returning the current
+    one (or None to skip it). on_complete(stats), if given, runs after each
+    sync.
+    """
+
+    def __init__(self, catalog, fetch, endpoints=ingest.ENDPOINTS, pages=5, interval=6 * 60 * 60,
+                 workers=4, index=None, on_complete=None):
+        self.catalog = catalog
+        self.fetch = fetch
+        self.index = index
+        self.endpoints = endpoints
+        self.pages = pages
+        self.interval = interval
+        self.workers = workers
+        self.on_complete = on_complete
+        self.last_run = None
+        self.last_stats = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def run_once(self):
+        # Always start from page 1: the lists change, so there is nothing to resume
+        checkpoint = ingest.Checkpoint()
+        pages = ingest.tmdb_pages(self.fetch, checkpoint, self.endpoints, self.pages, self.workers)
+        index = self.index() if callable(self.index) else self.index
+        self.last_stats = ingest.run(pages, self.catalog, checkpoint, index, report_every=0)
+        self.last_run = time.time()
+        if self.on_complete is not None:
+            self.on_complete(self.last_stats)
+        return self.last_stats
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print("Catalog sync error:", e)
+            time.sleep(self.interval)
@@ -0,0 +1,356 @@
+"""Incremental TF-IDF index over movie text for content-based recommendations.
+
+The vectorizer is fitted once on the corpus and then frozen: movies seen
+later are projected onto the existing vocabulary and appended, so a cold
+movie costs one transform instead of a full refit. Appended rows live in a
+small side matrix next to the main one, which is never copied to make room
+for them: a loaded main matrix stays memory-mapped. A full refit runs in a
+background thread when enough out-of-vocabulary text has accumulated or the
+fit is older than the refit interval. added holds the movies appended since
+the index was loaded or saved, for the engine to publish in a new snapshot.
+
+The index state is an immutable IndexView. Writers build a new view under a
+lock and swap it in; readers take view() once and never lock or wait.
+
+save/load write the fitted state (vocabulary, idf weights, the CSR matrix
+and the corpus text) as .npy and JSON files. Loading memory-maps the matrix
+and leaves the corpus text on disk until a refit or save needs it, so worker
+processes loading the same files share one copy through the page cache. The
+corpus file is opened at load time, so it stays readable after the snapshot
+directory holding it is pruned.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from genres import TMDB_GENRES
+
+FORMAT_VERSION = 2
+ARRAYS = ('movie_ids', 'data', 'indices', 'indptr', 'idf')
+DEFAULT_GENRE_NAMES = dict(TMDB_GENRES)
+
+
+def movie_text(movie, genre_names=None):
+    """Text used to describe a movie: title, overview and genre names.
+
+    Detail payloads name their genres; list items only carry genre_ids,
+    which genre_names (TMDB's genre list by default) maps to names.
+    """
+    if movie.get('genres'):
+        genres = [g['name'] for g in movie['genres'] if isinstance(g, dict) and g.get('name')]
+    else:
+        names = genre_names if genre_names is not None else DEFAULT_GENRE_NAMES
+        genres = [names[genre_id] for genre_id in movie.get('genre_ids') or () if genre_id in names]
+    return f"{movie.get('title') or ''} {movie.get('overview') or ''} {' '.join(genres)}"
+
+
+class IndexView:
+    """One version of a ContentIndex; never modified once published.
+
+    matrix holds the rows for movie_ids. Movies appended since the fit or
+    load are the side matrix extra, in extra_ids order, kept as a few CSR
+    chunks that halve in size towards the end, like a binary counter, so
+    each appended row is copied O(log n) times.
+    """
+
+    __slots__ = ('vectorizer', 'matrix', 'movie_ids', 'row_of', 'extra', 'extra_ids',
+                 'extra_row_of', 'version')
+
+    def __init__(self, vectorizer, matrix, movie_ids, version, row_of=None, extra=(),
+                 extra_ids=(), extra_row_of=None):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.movie_ids = movie_ids
+        self.row_of = row_of if row_of is not None else {m: i for i, m in enumerate(movie_ids)}
+        self.extra = extra
+        self.extra_ids = extra_ids
+        self.extra_row_of = extra_row_of or {}
+        self.version = version
+
+    def __contains__(self, movie_id):
+        return movie_id in self.row_of or movie_id in self.extra_row_of
+
+    def __len__(self):
+        return len(self.movie_ids) + len(self.extra_ids)
+
+    def row(self, movie_id):
+        """Row of movie_id across matrix and extra, or None"""
+        row = self.row_of.get(movie_id)
+        if row is None:
+            row = self.extra_row_of.get(movie_id)
+            if row is not None:
+                row += self.matrix.shape[0]
+        return row
+
+    def all_ids(self):
+        return list(self.movie_ids) + list(self.extra_ids)
+
+    def vector(self, row):
+        row -= self.matrix.shape[0]
+        if row < 0:
+            return self.matrix[row + self.matrix.shape[0]]
+        for chunk in self.extra:
+            if row < chunk.shape[0]:
+                return chunk[row]
+            row -= chunk.shape[0]
+        raise IndexError(row)
+
+    def rows(self, rows):
+        """Sparse matrix of the given rows"""
+        rows = np.asarray(rows)
+        if self.extra and (rows >= self.matrix.shape[0]).any():
+            return sp.vstack([self.vector(int(row)) for row in rows], format='csr')
+        return self.matrix[rows]
+
+    def scores(self, vector):
+        """Cosine similarity of vector to every row (rows are L2-normalised)"""
+        scores = (self.matrix @ vector.T).toarray().ravel()
+        if self.extra:
+            scores = np.concatenate([scores, *((chunk @ vector.T).toarray().ravel() for chunk in self.extra)])
+        return scores
+
+    def stacked(self):
+        """All rows as one CSR matrix"""
+        if not self.extra:
+            return self.matrix
+        return sp.vstack([self.matrix, *self.extra], format='csr')
+
+    def append(self, movie_id, vector, version):
+        extra_row_of = dict(self.extra_row_of)
+        extra_row_of[movie_id] = len(self.extra_ids)
+        chunks = list(self.extra) + [vector.tocsr()]
+        while len(chunks) > 1 and chunks[-2].shape[0] <= chunks[-1].shape[0]:
+            last = chunks.pop()
+            chunks[-1] = sp.vstack([chunks[-1], last], format='csr')
+        return IndexView(self.vectorizer, self.matrix, self.movie_ids, version,
+                         self.row_of, tuple(chunks), self.extra_ids + (movie_id,), extra_row_of)
+
+
+class ContentIndex:
+    def __init__(self, drift_threshold=0.25, min_drift_docs=20, refit_interval=6 * 60 * 60):
+        self.drift_threshold = drift_threshold
+        self.min_drift_docs = min_drift_docs
+        self.refit_interval = refit_interval
+
+        self.texts = {}
+        self.added = {}  # movie_id -> text, appended since the last load or save
+        self.fitted_at = 0.0
+
+        self._view = None
+        self._corpus_file = None  # texts.json of a loaded index, left unread until needed
+        self._version = 0
+        # Serialises writers; readers only ever dereference _view
+        self._lock = threading.RLock()
+        self._refitting = False
+        self._drift_docs = 0
+        self._drift_tokens = 0
+        self._drift_oov = 0
+
+    def view(self):
+        """The current IndexView (None before the first fit)"""
+        return self._view
+
+    @property
+    def vectorizer(self):
+        view = self._view
+        return view.vectorizer if view is not None else None
+
+    @property
+    def version(self):
+        view = self._view
+        return view.version if view is not None else self._version
+
+    @property
+    def movie_ids(self):
+        view = self._view
+        return view.all_ids() if view is not None else []
+
+    def __contains__(self, movie_id):
+        view = self._view
+        return view is not None and movie_id in view
+
+    def __len__(self):
+        view = self._view
+        return len(view) if view is not None else 0
+
+    def fit(self, texts):
+        """Fit a fresh vectorizer on texts ({movie_id: text}) and replace the index"""
+        movie_ids = list(texts)
+        vectorizer, matrix = self._fit(movie_ids, texts)
+        with self._lock:
+            self._install(vectorizer, matrix, movie_ids, dict(texts))
+
+    def add(self, movie_id, text):
+        """Project a new movie onto the frozen vocabulary and append it"""
+        with self._lock:
+            view = self._view
+            if view is None:
+                self._install(*self._fit([movie_id], {movie_id: text}), [movie_id], {movie_id: text})
+                self.added[movie_id] = text
+                return
+            if movie_id in view:
+                return
+
+            self._version += 1
+            self._view = view.append(movie_id, view.vectorizer.transform([text]), self._version)
+            self.texts[movie_id] = text
+            self.added[movie_id] = text
+
+            self._track_drift(view.vectorizer, text)
+        self.maybe_refit()
+
+    def vectors(self):
+        """Return (matrix, movie_ids) covering every indexed movie"""
+        view = self._view
+        return view.stacked(), view.all_ids()
+
+    def similarities(self, movie_id):
+        """Cosine similarity of movie_id to every indexed movie.
+
+        Returns (scores, movie_ids) aligned row for row, or None when the
+        movie is not indexed.
+        """
+        view = self._view
+        row = view.row(movie_id) if view is not None else None
+        if row is None:
+            return None
+        return view.scores(view.vector(row)), view.all_ids()
+
+    def save(self, path):
+        """Write the index to the directory path"""
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            view, fitted_at = self._view, self.fitted_at
+            texts = self._corpus()
+            added = dict(self.added)
+        matrix, movie_ids = view.stacked(), view.all_ids()
+
+        arrays = {
+            'movie_ids': np.asarray(movie_ids, dtype=np.int64),
+            'data': matrix.data,
+            'indices': matrix.indices,
+            'indptr': matrix.indptr,
+            'idf': view.vectorizer.idf_,
+        }
+        for name in ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), arrays[name])
+        with open(os.path.join(path, 'vocabulary.json'), 'w') as f:
+            json.dump(view.vectorizer.get_feature_names_out().tolist(), f)
+        with open(os.path.join(path, 'texts.json'), 'w') as f:
+            json.dump({str(movie_id): texts[movie_id] for movie_id in movie_ids}, f)
+        with open(os.path.join(path, 'index.json'), 'w') as f:
+            json.dump({
+                'format_version': FORMAT_VERSION,
+                'movies': len(movie_ids),
+                'terms': int(matrix.shape[1]),
+                'fitted_at': fitted_at,
+            }, f)
+        with self._lock:
+            for movie_id in added:
+                self.added.pop(movie_id, None)
+
+    @classmethod
+    def load(cls, path, mmap=True, **options):
+        """Load an index written by save; matrix arrays are memory-mapped unless mmap is False"""
+        with open(os.path.join(path, 'index.json')) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported content index format in {path}")
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None)
+                  for name in ARRAYS}
+        with open(os.path.join(path, 'vocabulary.json')) as f:
+            terms = json.load(f)
+
+        vectorizer = TfidfVectorizer(stop_words='english')
+        vectorizer.vocabulary_ = {term: column for column, term in enumerate(terms)}
+        vectorizer.idf_ = np.asarray(arrays['idf'])
+        movie_ids = [int(movie_id) for movie_id in arrays['movie_ids']]
+        matrix = sp.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                               shape=(len(movie_ids), manifest['terms']), copy=False)
+
+        index = cls(**options)
+        index._install(vectorizer, matrix, movie_ids, {})
+        index._corpus_file = open(os.path.join(path, 'texts.json'), 'rb')
+        index.fitted_at = manifest['fitted_at']
+        return index
+
+    def drift(self):
+        """Fraction of tokens in appended text that the frozen vocabulary misses"""
+        with self._lock:
+            return self._drift_oov / self._drift_tokens if self._drift_tokens else 0.0
+
+    def maybe_refit(self):
+        """Start a background refit if drift or age calls for one"""
+        with self._lock:
+            if self._refitting or self._view is None:
+                return False
+            drifted = (self._drift_docs >= self.min_drift_docs
+                       and self.drift() > self.drift_threshold)
+            stale = self._drift_docs > 0 and time.time() - self.fitted_at > self.refit_interval
+            if not (drifted or stale):
+                return False
+            try:
+                texts = self._corpus()
+            except (OSError, ValueError) as e:
+                print("Content index refit skipped, corpus unreadable:", e)
+                return False
+            self._refitting = True
+            movie_ids = self._view.all_ids()
+
+        threading.Thread(target=self._refit, args=(movie_ids, texts), daemon=True).start()
+        return True
+
+    def _refit(self, movie_ids, texts):
+        try:
+            vectorizer, matrix = self._fit(movie_ids, texts)
+            with self._lock:
+                # Movies appended while the refit ran are projected onto the new vocabulary
+                late_ids = self._view.all_ids()[len(movie_ids):]
+                for movie_id in late_ids:
+                    texts[movie_id] = self.texts[movie_id]
+                if late_ids:
+                    late = vectorizer.transform([texts[movie_id] for movie_id in late_ids])
+                    matrix = sp.vstack([matrix, late], format='csr')
+                self._install(vectorizer, matrix, movie_ids + late_ids, texts)
+        except Exception as e:
+            print("Content index refit error:", e)
+        finally:
+            with self._lock:
+                self._refitting = False
+
+    def _fit(self, movie_ids, texts):
+        vectorizer = TfidfVectorizer(stop_words='english')
+        matrix = vectorizer.fit_transform([texts[movie_id] for movie_id in movie_ids])
+        return vectorizer, matrix.tocsr()
+
+    def _corpus(self):
+        """Text of every indexed movie, reading the saved corpus if it was left on disk"""
+        texts = {}
+        if self._corpus_file is not None:
+            # Callers hold _lock, so the shared handle is read by one thread at a time
+            self._corpus_file.seek(0)
+            texts = {int(movie_id): text for movie_id, text in json.load(self._corpus_file).items()}
+        texts.update(self.texts)
+        return texts
+
+    def _install(self, vectorizer, matrix, movie_ids, texts):
+        self._version += 1
+        self._view = IndexView(vectorizer, matrix, movie_ids, self._version)
+        self.texts = texts
+        if self._corpus_file is not None:
+            self._corpus_file.close()
+            self._corpus_file = None
+        self.fitted_at = time.time()
+        self._drift_docs = self._drift_tokens = self._drift_oov = 0
+
+    def _track_drift(self, vectorizer, text):
+        tokens = vectorizer.build_analyzer()(text)
+        vocabulary = vectorizer.vocabulary_
+        self._drift_docs += 1
+        self._drift_tokens += len(tokens)
+        self._drift_oov += sum(1 for token in tokens if token not in vocabulary)
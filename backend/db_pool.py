@@ -0,0 +1,114 @@
+"""Pooled, tuned SQLite connections for the request handlers.
+
+Each connection is opened once and reused across requests, so its
+statement cache (sqlite3's cached_statements) survives from one request to
+the next. New connections are switched to WAL, which lets readers carry on
+while a writer commits, and get synchronous=NORMAL, a busy timeout,
+memory-mapped I/O and a larger page cache.
+"""
+import queue
+import sqlite3
+import threading
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms
+    'mmap_size': 256 * 1024 * 1024,  # bytes
+    'cache_size': -64 * 1024,  # negative means KiB: 64 MB
+    'temp_store': 'MEMORY',
+}
+
+
+def connect(db_path, pragmas=PRAGMAS, cached_statements=256):
+    """Open a connection usable from any thread (one at a time) with pragmas applied"""
+    db = sqlite3.connect(db_path, timeout=pragmas.get('busy_timeout', 5000) / 1000,
+                         check_same_thread=False, cached_statements=cached_statements)
+    db.row_factory = sqlite3.Row
+    for name, value in pragmas.items():
+        db.execute(f'PRAGMA {name} = {value}')
+    return db
+
+
+class ConnectionPool:
+    """A bounded LIFO pool of connections to one database file.
+
+    acquire blocks once size connections are checked out. size=0 disables
+    pooling: every acquire opens a connection and release closes it.
+    """
+
+    def __init__(self, db_path, size=8, pragmas=PRAGMAS, cached_statements=256, timeout=10.0):
+        self.db_path = db_path
+        self.size = size
+        self.pragmas = pragmas
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._waits = 0
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self.size == 0 or self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                self._waits += 1
+                create = False
+        if create:
+            try:
+                return connect(self.db_path, self.pragmas, self.cached_statements)
+            except sqlite3.Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection") from None
+
+    def release(self, db):
+        """Return a connection, rolling back anything the request left uncommitted"""
+        try:
+            if db.in_transaction:
+                db.rollback()
+        except sqlite3.Error:
+            self._discard(db)
+            return
+        if self.size == 0:
+            self._discard(db)
+        else:
+            self._idle.put(db)
+
+    def close(self):
+        """Close the idle connections"""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'idle': self._idle.qsize(),
+                'waits': self._waits,
+            }
+
+    def _discard(self, db):
+        with self._lock:
+            self._created -= 1
+        try:
+            db.close()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,140 @@
+"""Versioned on-disk snapshots of the recommendation engine state.
+
+A snapshot is the fitted ContentIndex plus, when the similarity backend has
+one, its NeighborTable. Each save goes into a new version directory under
+root and is published by replacing the CURRENT file, so readers only ever
+see complete snapshots. Loading memory-maps the arrays, which lets every
+worker process share one copy of the matrix through the page cache.
+
+Only the holder of the BUILDING lock file builds a new snapshot; the other
+workers poll CURRENT and swap the published version in as an EngineState.
+publish() is the same protocol for any set of files; the ALS model uses it.
+
+    engine_snapshot/
+        CURRENT                           name of the newest complete version
+        BUILDING                          present while a process builds the next one
+        20240101T120000.000000000-1234/   manifest.json, content index and table files
+"""
+import json
+import os
+import shutil
+import time
+
+from content_index import ContentIndex
+from neighbors import NeighborTable
+
+FORMAT_VERSION = 2
+
+
+class EngineState:
+    """One generation of the content model, swapped into the engine whole.
+
+    version is the snapshot it was loaded from or published as (None if
+    it was never saved). The index keeps accepting cold movies, but only
+    through copy-on-write views, so readers never see a partial update.
+    """
+
+    __slots__ = ('version', 'index', 'similarity')
+
+    def __init__(self, version, index, similarity):
+        self.version = version
+        self.index = index
+        self.similarity = similarity
+
+
+class SnapshotStore:
+    def __init__(self, root, keep=2):
+        self.root = root
+        self.keep = keep
+
+    def current_version(self):
+        """Name of the published snapshot, or None"""
+        try:
+            with open(os.path.join(self.root, 'CURRENT')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def acquire_build_lock(self, stale_after=10 * 60):
+        """Claim the right to build the next snapshot; False if another process holds it"""
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, 'BUILDING')
+        try:
+            if time.time() - os.path.getmtime(path) > stale_after:
+                # The holder died mid-build
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def release_build_lock(self):
+        try:
+            os.unlink(os.path.join(self.root, 'BUILDING'))
+        except FileNotFoundError:
+            pass
+
+    def path(self, version):
+        return os.path.join(self.root, version)
+
+    def publish(self, write):
+        """Fill a new version directory with write(directory, version), publish it and prune old ones"""
+        now = time.time_ns()
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(now // 10**9))
+        version = f"{stamp}.{now % 10**9:09d}-{os.getpid()}"
+        path = self.path(version)
+        tmp_path = f"{path}.tmp"
+        os.makedirs(tmp_path)
+        write(tmp_path, version)
+        os.replace(tmp_path, path)
+
+        with open(os.path.join(self.root, 'CURRENT.tmp'), 'w') as f:
+            f.write(version)
+        os.replace(os.path.join(self.root, 'CURRENT.tmp'), os.path.join(self.root, 'CURRENT'))
+        self._prune(version)
+        return version
+
+    def save(self, index, table=None):
+        """Write a new snapshot version, publish it and prune old versions"""
+        def write(path, version):
+            index.save(path)
+            if table is not None:
+                table.save(path)
+            with open(os.path.join(path, 'manifest.json'), 'w') as f:
+                json.dump({
+                    'format_version': FORMAT_VERSION,
+                    'version': version,
+                    'movies': len(index),
+                    'neighbors': table is not None,
+                    'created_at': time.time(),
+                }, f)
+        return self.publish(write)
+
+    def load(self, mmap=True):
+        """Return (version, index, table) for the published snapshot, or None"""
+        version = self.current_version()
+        if version is None:
+            return None
+        path = self.path(version)
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported engine snapshot format in {path}")
+
+        index = ContentIndex.load(path, mmap=mmap)
+        table = NeighborTable.load(path, mmap=mmap) if manifest['neighbors'] else None
+        return version, index, table
+
+    def _prune(self, current):
+        # Names sort by creation time. Workers still on a pruned version keep
+        # reading it: its arrays are mapped and its corpus file held open
+        versions = sorted(name for name in os.listdir(self.root)
+                          if os.path.isdir(os.path.join(self.root, name))
+                          and name != current and not name.endswith('.tmp'))
+        for name in versions[:max(len(versions) - (self.keep - 1), 0)]:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
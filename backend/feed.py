@@ -0,0 +1,150 @@
+"""Home feed: several movie list rows fetched in one request.
+
+Every requested section is fetched at once, on a shared worker pool (or as
+coroutines for the ASGI entry point), through the same response cache as
+the single-list routes; sections with a local hook are served from the
+local catalog instead while it has enough of their movies. Sections still
+waiting when the timeout passes come back empty and marked timedOut; their
+fetches finish in the background and warm the cache for the next request.
+A feed with a timed-out, failed or empty section is not complete, and
+callers should not let it be cached. A movie is shown in the first section
+that has it only, and every movie is cut down to the fields a card needs.
+
+A complete feed built from the same lists is the same object every time,
+so the response cache can keep serving its stored body and ETag.
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+CARD_FIELDS = ('id', 'title', 'poster_path', 'release_date', 'vote_average')
+MAX_SECTION_SIZE = 20  # one TMDB page
+
+
+def card(movie):
+    return {field: movie.get(field) for field in CARD_FIELDS}
+
+
+def build_feed(names, results, limit):
+    """{"sections": [...]} from {name: results}; names missing from results timed out"""
+    seen = set()
+    sections = []
+    for name in names:
+        if name not in results:
+            sections.append({'name': name, 'movies': [], 'timedOut': True})
+            continue
+        movies = []
+        for movie in results[name]:
+            if len(movies) == limit:
+                break
+            if movie.get('id') is not None and movie['id'] not in seen:
+                seen.add(movie['id'])
+                movies.append(card(movie))
+        sections.append({'name': name, 'movies': movies})
+    return {'sections': sections}
+
+
+class HomeFeed:
+    """Fan out to the section lists and assemble the feed.
+
+    sections maps a section name to a function returning its (endpoint,
+    params); defaults names the ones a request without sections gets (all of
+    them if None). fetch(endpoint, params) returns the results list, and the
+    async methods take an equivalent coroutine function. local maps a section
+    name to a function returning its movies from the local catalog, or None
+    to fetch them as usual.
+    """
+
+    def __init__(self, sections, fetch, defaults=None, max_workers=8, timeout=2.0, max_entries=256):
+        self.sections = sections
+        self.defaults = defaults
+        self.fetch = fetch
+        self.local = {}
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='feed')
+        self._built = OrderedDict()  # (names, limit) -> (section results, feed)
+        self._lock = threading.Lock()
+        self.counters = {'feeds': 0, 'reused': 0, 'timeouts': 0, 'errors': 0}
+
+    def parse(self, value):
+        """Section names from a comma-separated list (the defaults if empty); ValueError if unknown"""
+        names = list(dict.fromkeys(name.strip().lower() for name in (value or '').split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.sections]
+        if unknown:
+            raise ValueError(f"Unknown sections: {', '.join(unknown)}")
+        return names or list(self.defaults or self.sections)
+
+    def get(self, names, limit=MAX_SECTION_SIZE, timeout=None):
+        """(feed, complete) for the named sections"""
+        futures = {self._executor.submit(self._fetch, name): name for name in names}
+        done, _ = wait(futures, timeout=self.timeout if timeout is None else timeout)
+        results = {}
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                # Shown empty, as a TMDB error response would be
+                print(f"Feed error for section {futures[future]}:", e)
+                results[futures[future]] = []
+                self._count('errors')
+        return self._assemble(names, results, limit)
+
+    async def get_async(self, fetch_async, names, limit=MAX_SECTION_SIZE, timeout=None):
+        """get() on the event loop; fetch_async(endpoint, params) is a coroutine function"""
+        tasks = {asyncio.ensure_future(self._fetch_async(fetch_async, name)): name for name in names}
+        done, _ = await asyncio.wait(tasks, timeout=self.timeout if timeout is None else timeout)
+        results = {}
+        for task in done:
+            try:
+                results[tasks[task]] = task.result()
+            except Exception as e:
+                # Shown empty, as a TMDB error response would be
+                print(f"Feed error for section {tasks[task]}:", e)
+                results[tasks[task]] = []
+                self._count('errors')
+        return self._assemble(names, results, limit)
+
+    def _fetch(self, name):
+        movies = self.local[name]() if name in self.local else None
+        return movies if movies is not None else self.fetch(*self.sections[name]())
+
+    async def _fetch_async(self, fetch_async, name):
+        movies = await asyncio.to_thread(self.local[name]) if name in self.local else None
+        return movies if movies is not None else await fetch_async(*self.sections[name]())
+
+    def _assemble(self, names, results, limit):
+        # An empty list is what a failed TMDB fetch falls back to
+        complete = all(results.get(name) for name in names)
+        with self._lock:
+            self.counters['feeds'] += 1
+            self.counters['timeouts'] += len(names) - len(results)
+            if not complete:
+                return build_feed(names, results, limit), False
+            key = (tuple(names), limit)
+            entry = self._built.get(key)
+            # Cached lists are shared objects and local ones are rebuilt equal, so
+            # this is mostly identity checks: the same lists give the same feed
+            if entry is not None and all(entry[0][name] == results[name] for name in names):
+                self._built.move_to_end(key)
+                self.counters['reused'] += 1
+                return entry[1], True
+
+        feed = build_feed(names, results, limit)
+        with self._lock:
+            self._built[key] = (results, feed)
+            self._built.move_to_end(key)
+            while len(self._built) > self.max_entries:
+                self._built.popitem(last=False)
+        return feed, True
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self._built)
+        return stats
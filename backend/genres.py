@@ -0,0 +1,207 @@
+"""TMDB movie genres: the id/name registry and per-genre indexes of the local catalog.
+
+GenreRegistry starts from TMDB's movie genre list and is kept in sync with
+genre/movie/list. Routes take any genre by slug ("science-fiction") or id,
+and list payloads, which only carry genre_ids, can be given genre names.
+
+GenreIndex keeps one boolean mask per genre over the catalog, with movies
+numbered by descending popularity. Browsing one or more genres ANDs their
+masks and reads the result from the front; filtering a recommendation list
+checks each movie's genre set. Neither calls discover/movie. LiveIndex (see
+live_index.py) keeps the views up to date with the catalog, as it does for
+the search index.
+"""
+import threading
+import time
+
+import numpy as np
+
+from live_index import LiveIndex
+from search_index import tokenize
+
+# genre/movie/list as TMDB returns it; sync() picks up any change
+TMDB_GENRES = (
+    (28, 'Action'), (12, 'Adventure'), (16, 'Animation'), (35, 'Comedy'), (80, 'Crime'),
+    (99, 'Documentary'), (18, 'Drama'), (10751, 'Family'), (14, 'Fantasy'), (36, 'History'),
+    (27, 'Horror'), (10402, 'Music'), (9648, 'Mystery'), (10749, 'Romance'),
+    (878, 'Science Fiction'), (10770, 'TV Movie'), (53, 'Thriller'), (10752, 'War'),
+    (37, 'Western'),
+)
+
+
+def slug(name):
+    """URL form of a genre name: "Science Fiction" -> "science-fiction" """
+    return '-'.join(tokenize(name))
+
+
+def genre_ids_of(movie):
+    """Genre ids of a list item (genre_ids) or a detail payload (genres); None if it has neither"""
+    if movie.get('genre_ids') is not None:
+        return movie['genre_ids']
+    if movie.get('genres') is not None:
+        return [g['id'] for g in movie['genres'] if isinstance(g, dict) and 'id' in g]
+    return None
+
+
+class GenreRegistry:
+    def __init__(self, genres=TMDB_GENRES):
+        self.listeners = []  # called with {genre_id: name} after a sync that changed it
+        self.synced_at = None
+        self._thread = None
+        self._set(dict(genres))
+
+    def _set(self, names):
+        # Both maps are replaced, never modified, so readers need no lock
+        self.names = names  # genre_id -> name
+        self.ids = {slug(name): genre_id for genre_id, name in names.items()}
+
+    def resolve(self, value):
+        """Genre id for a slug, name or numeric id, or None"""
+        value = str(value).strip()
+        if value.isdigit():
+            return int(value) if int(value) in self.names else None
+        return self.ids.get(slug(value))
+
+    def parse(self, value):
+        """Genre ids from a comma-separated list; ValueError naming any unknown genre"""
+        genre_ids, unknown = [], []
+        for part in (value or '').split(','):
+            if not part.strip():
+                continue
+            genre_id = self.resolve(part)
+            if genre_id is None:
+                unknown.append(part.strip())
+            elif genre_id not in genre_ids:
+                genre_ids.append(genre_id)
+        if unknown:
+            raise ValueError(f"Unknown genres: {', '.join(unknown)}")
+        if not genre_ids:
+            raise ValueError('At least one genre is required')
+        return genre_ids
+
+    def sync(self, fetch):
+        """Merge in the genres of fetch(), a genre/movie/list response; False if it failed"""
+        payload = fetch()
+        genres = payload.get('genres') if isinstance(payload, dict) else None
+        if not genres:
+            print("Genre sync error:", payload.get('error') if isinstance(payload, dict) else payload)
+            return False
+        # Genres TMDB stops listing are kept, so old links keep working
+        names = dict(self.names)
+        names.update({g['id']: g['name'] for g in genres if isinstance(g, dict) and g.get('id') and g.get('name')})
+        changed = names != self.names
+        self._set(names)
+        self.synced_at = time.time()
+        if changed:
+            for listener in self.listeners:
+                listener(names)
+        return True
+
+    def start(self, fetch, interval):
+        """sync(fetch) in a background thread now and every interval seconds"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, args=(fetch, interval), daemon=True)
+            self._thread.start()
+
+    def _loop(self, fetch, interval):
+        while True:
+            try:
+                self.sync(fetch)
+            except Exception as e:
+                print("Genre sync error:", e)
+            time.sleep(interval)
+
+    def genres(self):
+        names = self.names
+        return [{'id': genre_id, 'name': name, 'slug': slug(name)}
+                for genre_id, name in sorted(names.items(), key=lambda item: item[1])]
+
+
+class GenreView:
+    """Genre masks over one fixed set of movies; never modified once built.
+
+    movies maps movie_id -> (genre ids, popularity); the ids are kept as a
+    frozenset. Documents are numbered by descending popularity, ties by
+    movie id.
+    """
+
+    def __init__(self, movies):
+        order = sorted(movies, key=lambda movie_id: (-(movies[movie_id][1] or 0), movie_id))
+        self.movies = {movie_id: (frozenset(movies[movie_id][0]), movies[movie_id][1]) for movie_id in order}
+        self.ids = np.array(order, dtype=np.int64)
+        self.popularity = np.array([movies[m][1] or 0 for m in order], dtype=np.float64)
+
+        docs = {}
+        for doc, movie_id in enumerate(order):
+            for genre_id in movies[movie_id][0]:
+                docs.setdefault(genre_id, []).append(doc)
+        self.masks = {}
+        for genre_id, genre_docs in docs.items():
+            mask = np.zeros(len(order), dtype=bool)
+            mask[genre_docs] = True
+            self.masks[genre_id] = mask
+
+    def __len__(self):
+        return len(self.ids)
+
+    def match(self, genre_ids, skip=None):
+        """Mask of the documents in every one of genre_ids, leaving out skip"""
+        mask = np.ones(len(self.ids), dtype=bool) if skip is None else ~skip
+        for genre_id in genre_ids:
+            genre_mask = self.masks.get(genre_id)
+            if genre_mask is None:
+                return np.zeros(len(self.ids), dtype=bool)
+            mask &= genre_mask
+        return mask
+
+
+class GenreIndex(LiveIndex):
+    view = GenreView
+    label = 'Genre index'
+
+    def __init__(self, merge_size=64):
+        super().__init__(merge_size)
+        self.counters.update({'browses': 0, 'filters': 0})
+
+    def entry(self, movie):
+        """Index by genre set; movies that carry no genres are left out"""
+        genre_ids = genre_ids_of(movie)
+        if genre_ids is None:
+            return None
+        return movie.get('id'), (frozenset(genre_ids), movie.get('popularity'))
+
+    def browse(self, genre_ids, limit=20, offset=0):
+        """Ids of the most popular catalog movies in every one of genre_ids"""
+        end = offset + limit
+        hits = []
+        for view, mask in self._levels:
+            docs = np.flatnonzero(view.match(genre_ids, mask))[:end]
+            hits += zip((-view.popularity[docs]).tolist(), view.ids[docs].tolist())
+        hits.sort()
+        self._count('browses')
+        return [movie_id for _, movie_id in hits[offset:end]]
+
+    def filter(self, movie_ids, genre_ids):
+        """movie_ids, in order, that are catalog movies in every one of genre_ids"""
+        levels = self._levels
+        wanted = set(genre_ids)
+        kept = []
+        for movie_id in movie_ids:
+            entry = self._find(levels, movie_id)
+            if entry is not None and wanted <= entry[0]:
+                kept.append(movie_id)
+        self._count('filters')
+        return kept
+
+    def counts(self):
+        """{genre_id: number of catalog movies}"""
+        counts = {}
+        for view, hidden in self._levels:
+            for genre_id, mask in view.masks.items():
+                counts[genre_id] = counts.get(genre_id, 0) + int((mask if hidden is None else mask & ~hidden).sum())
+        return counts
+
+    def stats(self):
+        stats = super().stats()
+        stats['genres'] = len(self.counts())
+        return stats
@@ -0,0 +1,90 @@
+"""Concurrent hydration of ranked movie IDs into full TMDB detail objects."""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class DetailStore:
+    """Bounded in-process store of movie detail payloads keyed by movie ID"""
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, movie_id):
+        return self.get_many([movie_id]).get(movie_id)
+
+    def get_many(self, movie_ids):
+        found = {}
+        with self._lock:
+            for movie_id in movie_ids:
+                movie = self._items.get(movie_id)
+                if movie is not None:
+                    self._items.move_to_end(movie_id)
+                    found[movie_id] = movie
+        return found
+
+    def put(self, movie_id, movie):
+        with self._lock:
+            self._items[movie_id] = movie
+            self._items.move_to_end(movie_id)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+class MovieHydrator:
+    """Turn a ranked list of movie IDs into detail objects.
+
+    Duplicate IDs are dropped, the local store (anything with get_many and
+    put, such as DetailStore or catalog.MovieCatalog) is consulted first and
+    the remaining IDs are fetched on a bounded, shared worker pool. Whatever
+    has arrived when the deadline passes is returned, still in ranked order.
+    Pass write_back=False when fetch already persists what it returns.
+    """
+
+    def __init__(self, fetch, store=None, max_workers=8, timeout=3.0, write_back=True):
+        self.fetch = fetch
+        self.store = store
+        self.write_back = write_back
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='hydrate')
+
+    def _fetch_and_store(self, movie_id):
+        # Late arrivals still land in the store and warm the next request
+        movie = self.fetch(movie_id)
+        if movie and 'id' in movie and self.store is not None and self.write_back:
+            self.store.put(movie_id, movie)
+        return movie
+
+    def hydrate(self, movie_ids, timeout=None, max_fetches=None):
+        """Return detail objects for movie_ids in ranked order.
+
+        At most max_fetches of the IDs missing from the store are fetched;
+        the rest are left out as if they had timed out.
+        """
+        ranked = list(dict.fromkeys(movie_ids))
+        found = self.store.get_many(ranked) if self.store is not None else {}
+        missing = [movie_id for movie_id in ranked if movie_id not in found][:max_fetches]
+
+        if missing:
+            futures = {self._executor.submit(self._fetch_and_store, movie_id): movie_id
+                       for movie_id in missing}
+            done, not_done = wait(futures, timeout=self.timeout if timeout is None else timeout)
+
+            # Anything still queued is dropped; running fetches finish in the background
+            for future in not_done:
+                future.cancel()
+
+            for future in done:
+                movie_id = futures[future]
+                try:
+                    movie = future.result()
+                except Exception as e:
+                    print(f"Hydration error for movie {movie_id}:", e)
+                    continue
+                if movie and 'id' in movie:
+                    found[movie_id] = movie
+
+        return [found[movie_id] for movie_id in ranked if movie_id in found]
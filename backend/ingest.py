@@ -0,0 +1,293 @@
+"""Streaming bulk ingestion of TMDB movies into the local catalog.
+
+Records flow through generator stages one page at a time:
+
+    fetch -> normalize -> dedupe -> vectorize -> persist
+
+so memory stays flat however many pages are read. The fetch stage either
+pages through TMDB list endpoints (discover and the main categories) with a
+bounded number of requests in flight, or reads a local JSONL dump of
+TMDB-shaped movie records for offline runs. Persisting a batch also records
+a checkpoint, so an interrupted run picks up after the last stored page.
+
+    python ingest.py --database database.db --pages 100
+    python ingest.py --database database.db --dump movies.jsonl --snapshot engine_snapshot
+
+In the app, CatalogSync feeds the vectorize stage the live content index.
+From the command line, --snapshot adds the movies to the published engine
+snapshot's content index and publishes the result for the workers to adopt.
+"""
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from content_index import movie_text
+
+ENDPOINTS = (
+    ('discover/movie', {'sort_by': 'popularity.desc'}),
+    ('discover/movie', {'sort_by': 'vote_count.desc'}),
+    ('movie/popular', {}),
+    ('movie/top_rated', {}),
+    ('movie/now_playing', {}),
+)
+
+# TMDB refuses list pages past 500
+MAX_TMDB_PAGES = 500
+
+FIELDS = ('id', 'title', 'overview', 'poster_path', 'backdrop_path', 'release_date',
+          'vote_average', 'vote_count', 'popularity', 'original_language', 'genre_ids')
+
+
+class Checkpoint:
+    """Resume positions for each source, saved as JSON after every persisted batch"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.positions = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.positions = json.load(f)
+
+    def get(self, key, default=None):
+        return self.positions.get(key, default)
+
+    def update(self, positions):
+        self.positions.update(positions)
+        if self.path:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.positions, f)
+            os.replace(tmp_path, self.path)
+
+
+class IngestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.pages = 0
+        self.records = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.persisted = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def rate(self):
+        """Persisted records per second"""
+        return self.persisted / max(self.elapsed(), 1e-9)
+
+    def as_dict(self):
+        return {
+            'pages': self.pages,
+            'records': self.records,
+            'duplicates': self.duplicates,
+            'invalid': self.invalid,
+            'persisted': self.persisted,
+            'seconds': round(self.elapsed(), 2),
+            'records_per_sec': round(self.rate(), 1),
+        }
+
+
+def _source_key(endpoint, params):
+    query = '&'.join(f'{key}={value}' for key, value in sorted(params.items()))
+    return f"{endpoint}?{query}" if query else endpoint
+
+
+def _bounded_map(fn, items, workers):
+    """Like executor.map, in order, but with at most 2 * workers calls outstanding"""
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest') as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def tmdb_pages(fetch, checkpoint, endpoints=ENDPOINTS, max_pages=MAX_TMDB_PAGES, workers=4):
+    """Fetch stage: yield (positions, records) for every TMDB list page not yet ingested.
+
+    fetch(endpoint, params) returns the decoded TMDB response. The first
+    page of each endpoint is fetched on its own to learn total_pages; the
+    rest are fetched concurrently but yielded in page order so a checkpoint
+    never skips over a page that has not been stored.
+    """
+    for endpoint, params in endpoints:
+        key = _source_key(endpoint, params)
+        start = checkpoint.get(key, 0) + 1
+        if start > max_pages:
+            continue
+
+        first = fetch(endpoint, dict(params, page=start))
+        if not isinstance(first, dict) or 'error' in first:
+            print(f"Ingest fetch error for {key}:", (first or {}).get('error'))
+            continue
+        yield {key: start}, first.get('results', [])
+
+        last = min(first.get('total_pages', start), max_pages, MAX_TMDB_PAGES)
+        pages = range(start + 1, last + 1)
+        responses = _bounded_map(lambda page: (page, fetch(endpoint, dict(params, page=page))),
+                                 pages, workers)
+        for page, response in responses:
+            if not isinstance(response, dict) or 'error' in response:
+                # Stop here so the checkpoint resumes from this page next run
+                print(f"Ingest fetch error for {key} page {page}:", (response or {}).get('error'))
+                break
+            yield {key: page}, response.get('results', [])
+
+
+def jsonl_pages(path, checkpoint, page_size=500):
+    """Fetch stage for a local JSONL dump: yield (positions, records) per page_size lines.
+
+    The checkpoint stores the byte offset after the last yielded line.
+    """
+    key = f"file:{os.path.abspath(path)}"
+    with open(path, 'rb') as f:
+        f.seek(checkpoint.get(key, 0))
+        records = []
+        for line in iter(f.readline, b''):
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    records.append(None)
+            if len(records) >= page_size:
+                yield {key: f.tell()}, records
+                records = []
+        if records:
+            yield {key: f.tell()}, records
+
+
+def normalize(pages, stats):
+    """Keep the catalog fields of each movie record and drop anything that is not a movie"""
+    for positions, records in pages:
+        stats.pages += 1
+        movies = []
+        for record in records:
+            stats.records += 1
+            if not isinstance(record, dict) or record.get('adult') or 'id' not in record:
+                stats.invalid += 1
+                continue
+            title = record.get('title') or record.get('original_title')
+            if not title:
+                stats.invalid += 1
+                continue
+            movie = {field: record.get(field) for field in FIELDS}
+            movie['id'] = int(record['id'])
+            movie['title'] = title
+            if movie['genre_ids'] is None and record.get('genres'):
+                movie['genre_ids'] = [g['id'] for g in record['genres'] if isinstance(g, dict)]
+            movies.append(movie)
+        yield positions, movies
+
+
+def dedupe(pages, stats, window=200000):
+    """Drop movies already seen in this run; the set of remembered ids is capped at window"""
+    seen = OrderedDict()
+    for positions, movies in pages:
+        fresh = []
+        for movie in movies:
+            if movie['id'] in seen:
+                stats.duplicates += 1
+                continue
+            seen[movie['id']] = None
+            if len(seen) > window:
+                seen.popitem(last=False)
+            fresh.append(movie)
+        yield positions, fresh
+
+
+def vectorize(pages, index=None):
+    """Add each movie's text to a content_index.ContentIndex, when one is given"""
+    for positions, movies in pages:
+        if index is not None:
+            for movie in movies:
+                index.add(movie['id'], movie_text(movie))
+        yield positions, movies
+
+
+def persist(pages, catalog, checkpoint, stats, batch_size=1000):
+    """Upsert movies in batches, checkpointing the pages each batch completes"""
+    batch, positions = [], {}
+    for page_positions, movies in pages:
+        batch.extend(movies)
+        positions.update(page_positions)
+        if len(batch) >= batch_size:
+            stats.persisted += catalog.upsert_many(batch)
+            checkpoint.update(positions)
+            batch, positions = [], {}
+            yield stats
+    if batch or positions:
+        stats.persisted += catalog.upsert_many(batch)
+        checkpoint.update(positions)
+    yield stats
+
+
+def run(pages, catalog, checkpoint, index=None, batch_size=1000, report_every=10.0):
+    """Drive the pipeline to completion and return its IngestStats"""
+    stats = IngestStats()
+    stages = persist(vectorize(dedupe(normalize(pages, stats), stats), index),
+                     catalog, checkpoint, stats, batch_size)
+    last_report = time.perf_counter()
+    for stats in stages:
+        if report_every and time.perf_counter() - last_report >= report_every:
+            print(f"Ingested {stats.persisted} movies ({stats.rate():.0f} records/s)")
+            last_report = time.perf_counter()
+    return stats
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from dotenv import load_dotenv
+
+    from catalog import MovieCatalog
+    from engine_snapshot import SnapshotStore
+    from tmdb_client import client
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Bulk-load movies into the local catalog')
+    parser.add_argument('--database', default='database.db')
+    parser.add_argument('--dump', help='TMDB-format JSONL file to read instead of the API')
+    parser.add_argument('--pages', type=int, default=MAX_TMDB_PAGES, help='Max pages per endpoint')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--checkpoint', default='ingest_checkpoint.json')
+    parser.add_argument('--snapshot', help='engine snapshot directory (ENGINE_SNAPSHOT_PATH) whose '
+                                           'content index the movies are added to')
+    args = parser.parse_args()
+
+    store = index = loaded = None
+    if args.snapshot:
+        store = SnapshotStore(args.snapshot)
+        snapshot = store.load(mmap=False)
+        if snapshot is None:
+            parser.error(f"No published engine snapshot in {args.snapshot}")
+        loaded, index, _ = snapshot
+
+    checkpoint = Checkpoint(args.checkpoint)
+    if args.dump:
+        pages = jsonl_pages(args.dump, checkpoint)
+    else:
+        api_key = os.getenv('TMDB_API_KEY')
+        pages = tmdb_pages(lambda endpoint, params: client.get(endpoint, dict(params, api_key=api_key)),
+                           checkpoint, max_pages=args.pages, workers=args.workers)
+    stats = run(pages, MovieCatalog(args.database), checkpoint, index, batch_size=args.batch_size)
+    print(json.dumps(stats.as_dict()))
+
+    if store is not None:
+        # Publishing over a snapshot built since this run loaded its own would drop that one
+        if store.acquire_build_lock():
+            try:
+                if store.current_version() == loaded:
+                    print(f"Published engine snapshot {store.save(index)}")
+                else:
+                    print("Engine snapshot changed during the run; the app picks the movies up at its next refit")
+            finally:
+                store.release_build_lock()
+        else:
+            print("Another process is building an engine snapshot; the app picks the movies up at its next refit")
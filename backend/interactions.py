@@ -0,0 +1,207 @@
+"""In-memory user-item interaction matrix for collaborative recommendations.
+
+watch_history, favorites and ratings are folded into one weighted users x
+movies CSR matrix. From it an item-item co-occurrence matrix is built once
+(how strongly each pair of movies is shared by the same users), so scoring
+a user is a single sparse row product instead of a series of SQL scans.
+
+Explicit ratings are also kept on their own, centred so that 1 maps to -1
+and 10 to +1. When scoring a user, a rated movie counts with that weight
+instead of 1, so neighbours of movies they disliked are pushed down.
+"""
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from neighbors import top_k
+
+# Weight per interaction; ratings are scaled by rating / 10
+DEFAULT_WEIGHTS = {
+    'history': 1.0,
+    'favorites': 2.0,
+    'ratings': 2.0,
+}
+
+# Ratings run 1-10; centred weight = (rating - RATING_MIDPOINT) / RATING_SPREAD
+RATING_MIDPOINT = 5.5
+RATING_SPREAD = 4.5
+
+
+class InteractionSnapshot:
+    """Immutable matrices built from one pass over the interaction tables.
+
+    versions are the interaction_versions read before the pass, so the
+    snapshot has at least those writes for each user; version is their sum.
+    """
+
+    def __init__(self, user_ids, movie_ids, interactions, cooccurrence, built_at, ratings=None,
+                 versions=None):
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+        self.interactions = interactions
+        self.cooccurrence = cooccurrence
+        self.ratings = ratings if ratings is not None else sp.csr_matrix(interactions.shape,
+                                                                          dtype=np.float32)
+        self.built_at = built_at
+        self.versions = versions or {}
+        self.version = sum(self.versions.values())
+        self.row_of = {int(user_id): row for row, user_id in enumerate(user_ids)}
+
+
+class InteractionMatrix:
+    """Keeps an InteractionSnapshot fresh and scores users against it.
+
+    The first read builds the matrices; after that, mark_dirty() schedules
+    a background rebuild (at most once per min_interval) and readers keep
+    using the previous snapshot until the new one is swapped in. Writes
+    handled by other processes are picked up by comparing the stored
+    interaction version with the snapshot's, at most every check_interval.
+    """
+
+    def __init__(self, storage, weights=None, min_interval=30, check_interval=5):
+        self.storage = storage
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.min_interval = min_interval
+        self.check_interval = check_interval
+        self.snapshot = None
+
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._dirty = True
+        self._running = False
+        self._checked_at = 0.0
+
+    def mark_dirty(self):
+        """Note that the interaction tables changed since the last build"""
+        self._dirty = True
+
+    def recommend(self, user_id, n=10):
+        """Movie ids most co-occurring with the user's movies, unseen ones only"""
+        snapshot = self.current()
+        if snapshot is None:
+            return []
+        row = snapshot.row_of.get(user_id)
+        if row is None:
+            return []
+
+        user_vector = snapshot.interactions[row]
+        if user_vector.nnz == 0:
+            return []
+        weights = (user_vector > 0).astype(np.float32)
+        rated = snapshot.ratings[row]
+        if rated.nnz:
+            # Explicit ratings replace the implicit weight of 1 on the movies they cover
+            weights = weights - weights.multiply(rated != 0) + rated
+        scores = (weights @ snapshot.cooccurrence).toarray().ravel()
+        scores[user_vector.indices] = 0
+
+        best = top_k(scores, n)
+        return [int(snapshot.movie_ids[i]) for i in best if scores[i] > 0]
+
+    def current(self, user_id=None, version=0):
+        """Return the live snapshot, building or refreshing it as needed.
+
+        With user_id, the snapshot has to include the user's interactions up
+        to version (Storage.interaction_version); one is built inline if not.
+        """
+        if not self._covers(user_id, version):
+            self.refresh(wait=True, need=(user_id, version))
+        else:
+            self._check_version()
+            if self._dirty:
+                self.refresh()
+        return self.snapshot
+
+    def _check_version(self):
+        now = time.time()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            if self.storage.interaction_version() != self.snapshot.version:
+                self._dirty = True
+        except Exception as e:
+            print("Interaction version check error:", e)
+
+    def _covers(self, user_id, version):
+        snapshot = self.snapshot
+        return snapshot is not None and (user_id is None or snapshot.versions.get(user_id, 0) >= version)
+
+    def refresh(self, wait=False, need=None):
+        """Rebuild the snapshot in the background, or inline with wait.
+
+        need is current()'s (user_id, version); a waiting refresh is skipped
+        when the build it waited for already covers it.
+        """
+        with self._lock:
+            if wait:
+                # A build under way may have read the tables before the writes the caller needs
+                while self._running:
+                    self._idle.wait()
+                if need is not None and self._covers(*need):
+                    return False
+            throttled = (self.snapshot is not None
+                         and time.time() - self.snapshot.built_at < self.min_interval)
+            if self._running or (throttled and not wait):
+                return False
+            self._running = True
+            self._dirty = False
+
+        if wait:
+            self._build()
+        else:
+            threading.Thread(target=self._build, daemon=True).start()
+        return True
+
+    def _build(self):
+        try:
+            self.snapshot = self.build_snapshot()
+        except Exception as e:
+            self._dirty = True
+            print("Interaction matrix build error:", e)
+        finally:
+            with self._lock:
+                self._running = False
+                self._idle.notify_all()
+
+    def build_snapshot(self):
+        # Read first: writes that land during the pass only make the snapshot newer than this
+        versions = self.storage.interaction_versions()
+        # Interactions are streamed in batches so the raw rows never sit in memory as tuples
+        chunks = [np.array(rows, dtype=np.float64)
+                  for rows in self.storage.iter_interactions(self.weights)]
+
+        built_at = time.time()
+        if not chunks:
+            empty = sp.csr_matrix((0, 0), dtype=np.float32)
+            return InteractionSnapshot(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                                       empty, empty, built_at, versions=versions)
+
+        data = np.concatenate(chunks)
+        user_ids, user_rows = np.unique(data[:, 0].astype(np.int64), return_inverse=True)
+        movie_ids, movie_cols = np.unique(data[:, 1].astype(np.int64), return_inverse=True)
+
+        # Duplicate (user, movie) pairs are summed by the COO -> CSR conversion
+        interactions = sp.coo_matrix(
+            (data[:, 2].astype(np.float32), (user_rows, movie_cols)),
+            shape=(len(user_ids), len(movie_ids))
+        ).tocsr()
+
+        # cooccurrence[i, j]: total weight on movie j from users who also have movie i
+        seen = (interactions > 0).astype(np.float32)
+        cooccurrence = (seen.T @ interactions).tocsr()
+        cooccurrence.setdiag(0)
+        cooccurrence.eliminate_zeros()
+
+        # None ratings arrive as NaN; (rating - 5.5) / 4.5 is never 0 for integer ratings
+        explicit = ~np.isnan(data[:, 3])
+        ratings = sp.coo_matrix(
+            (((data[explicit, 3] - RATING_MIDPOINT) / RATING_SPREAD).astype(np.float32),
+             (user_rows[explicit], movie_cols[explicit])),
+            shape=interactions.shape
+        ).tocsr()
+
+        return InteractionSnapshot(user_ids, movie_ids, interactions, cooccurrence, built_at, ratings,
+                                   versions)
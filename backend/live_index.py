@@ -0,0 +1,160 @@
+"""In-memory indexes over the local catalog that follow its writes.
+
+An index is a stack of immutable views, oldest and largest first, that
+readers take once and never lock. Movies the catalog gains afterwards go
+into a new view of their own on top; a view is then merged into the one
+below it while that one is no more than twice its size (or smaller than
+merge_size), so the stack stays logarithmic in the catalog and each movie
+is rebuilt O(log n) times rather than with every merge into one main view.
+Copies of a movie that a newer view replaced are masked out by a skip
+array. rebuild() replaces the stack with one view of the catalog, which
+also picks up movies other workers wrote.
+
+add() only queues movies: one background thread indexes everything queued
+since its last pass, so catalog writers never wait on a view build and a
+burst of writes costs one pass, not one each.
+
+Subclasses set view to a class built from {movie_id: (key, popularity)}
+(with .movies, .ids and len()) and implement entry(). A movie is re-indexed
+when its key changes; popularity changes wait for the next rebuild.
+"""
+import threading
+import time
+
+import numpy as np
+
+
+class LiveIndex:
+    view = None
+    label = 'Index'  # for error messages
+
+    def __init__(self, merge_size=64):
+        self.merge_size = merge_size
+        self._levels = ((self.view({}), None),)  # (view, docs to skip), oldest first
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()  # one writer of the stack at a time
+        self._queued = {}  # movie_id -> entry, waiting for the indexing thread
+        self._indexing = False
+        self._thread = None
+        self.built_at = None
+        self.counters = {'adds': 0, 'merges': 0, 'rebuilds': 0}
+
+    def entry(self, movie):
+        """(movie_id, (key, popularity)) for a catalog movie, or None to leave it out"""
+        raise NotImplementedError
+
+    def start(self, load, interval):
+        """Build from load() in a background thread, then rebuild every interval seconds"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, args=(load, interval), daemon=True)
+            self._thread.start()
+
+    def _loop(self, load, interval):
+        while True:
+            try:
+                self.rebuild(load)
+            except Exception as e:
+                print(f"{self.label} build error:", e)
+            time.sleep(interval)
+
+    def add(self, movies):
+        """Queue new movies and changed keys for indexing (catalog listener)"""
+        items = [item for item in map(self.entry, movies) if item is not None]
+        if not items:
+            return
+        with self._lock:
+            self._queued.update(items)
+            if self._indexing:
+                return
+            self._indexing = True
+        threading.Thread(target=self._index_queued, daemon=True).start()
+
+    def _index_queued(self):
+        while True:
+            with self._lock:
+                queued, self._queued = self._queued, {}
+                if not queued:
+                    self._indexing = False
+                    return
+            try:
+                self._push(queued)
+            except Exception as e:
+                print(f"{self.label} add error:", e)
+
+    def _push(self, queued):
+        """Put the queued movies that are new or changed on top of the stack"""
+        with self._build_lock:
+            levels = self._levels
+            fresh = {}
+            for movie_id, entry in queued.items():
+                known = self._find(levels, movie_id)
+                if known is None or known[0] != entry[0]:
+                    fresh[movie_id] = entry
+            if not fresh:
+                return
+            levels = self._masked(levels, fresh) + [(self.view(fresh), None)]
+            merges = 0
+            while len(levels) > 1 and len(levels[-2][0]) <= max(2 * len(levels[-1][0]), self.merge_size):
+                levels[-2:] = [self._merged(levels[-2], levels[-1])]
+                merges += 1
+            with self._lock:
+                self._levels = tuple(levels)
+                self.counters['adds'] += len(fresh)
+                self.counters['merges'] += merges
+
+    def rebuild(self, load):
+        """Replace the index with the (movie_id, key, popularity) rows load() returns"""
+        # Movies queued meanwhile are indexed on top once this is done, unless the rows have them
+        with self._build_lock:
+            rows = load()
+            main = self.view({movie_id: (key, popularity) for movie_id, key, popularity in rows})
+            with self._lock:
+                self._levels = ((main, None),)
+                self.counters['rebuilds'] += 1
+            self.built_at = time.time()
+
+    @staticmethod
+    def _find(levels, movie_id):
+        """The newest entry for movie_id, or None"""
+        for view, _ in reversed(levels):
+            entry = view.movies.get(movie_id)
+            if entry is not None:
+                return entry
+        return None
+
+    @staticmethod
+    def _masked(levels, movie_ids):
+        """levels as a list, with any copies of movie_ids skipped"""
+        masked = []
+        for view, skip in levels:
+            present = [movie_id for movie_id in movie_ids if movie_id in view.movies]
+            if present:
+                hit = np.isin(view.ids, np.array(present, dtype=np.int64))
+                skip = hit if skip is None else skip | hit
+            masked.append((view, skip))
+        return masked
+
+    def _merged(self, older, newer):
+        """One level holding both, without the copies their skip arrays hide"""
+        movies = {}
+        for view, skip in (older, newer):
+            hidden = set(view.ids[skip].tolist()) if skip is not None else ()
+            movies.update((movie_id, entry) for movie_id, entry in view.movies.items()
+                          if movie_id not in hidden)
+        return self.view(movies), None
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def stats(self):
+        levels = self._levels
+        with self._lock:
+            stats = dict(self.counters)
+        sizes = [len(view) - (int(skip.sum()) if skip is not None else 0) for view, skip in levels]
+        stats['movies'] = sum(sizes)
+        stats['pending'] = sum(sizes[1:])
+        stats['levels'] = len(levels)
+        stats['queued'] = len(self._queued)
+        stats['built_at'] = self.built_at
+        return stats
@@ -0,0 +1,151 @@
+"""Precomputed top-K similarity neighbours for content-based recommendations.
+
+The table is built from the content index in row blocks, so only one block
+of similarity scores is materialised at a time, and each block is reduced
+with argpartition instead of a full sort. Serving a request is then a dict
+lookup plus a slice.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def top_k(scores, k, exclude=None):
+    """Indices of the k highest scores in descending order, skipping exclude"""
+    scores = np.asarray(scores, dtype=np.float32).copy()
+    if exclude is not None:
+        scores[exclude] = -np.inf
+    k = min(k, scores.shape[0] - (1 if exclude is not None else 0))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def top_k_neighbors(matrix, k=10, block_size=256):
+    """Top-k cosine neighbours for every row of an L2-normalised sparse matrix.
+
+    Returns (indices, scores), both shaped (n_rows, k). Rows with fewer than
+    k other rows available are padded with -1 / 0.
+    """
+    matrix = matrix.tocsr().astype(np.float32)
+    n_rows = matrix.shape[0]
+    k_eff = min(k, n_rows - 1)
+    indices = np.full((n_rows, k), -1, dtype=np.int32)
+    scores = np.zeros((n_rows, k), dtype=np.float32)
+    if k_eff <= 0:
+        return indices, scores
+
+    for start in range(0, n_rows, block_size):
+        stop = min(start + block_size, n_rows)
+        # Sparse x dense block product keeps the output dense and cheap to reduce
+        block = np.asarray(matrix @ matrix[start:stop].toarray().T).T
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        candidates = np.argpartition(-block, k_eff - 1, axis=1)[:, :k_eff]
+        candidate_scores = np.take_along_axis(block, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind='stable')
+
+        indices[start:stop, :k_eff] = np.take_along_axis(candidates, order, axis=1)
+        scores[start:stop, :k_eff] = np.take_along_axis(candidate_scores, order, axis=1)
+
+    return indices, scores
+
+
+class NeighborTable:
+    """Top-K neighbour lists for a fixed set of movies"""
+
+    def __init__(self, movie_ids, indices, scores, version=None):
+        self.movie_ids = np.asarray(movie_ids)
+        self.indices = indices
+        self.scores = scores
+        self.version = version
+        self.row_of = {int(movie_id): row for row, movie_id in enumerate(self.movie_ids)}
+
+    @classmethod
+    def build(cls, matrix, movie_ids, k=20, block_size=256, version=None):
+        indices, scores = top_k_neighbors(matrix, k, block_size)
+        return cls(movie_ids, indices, scores, version)
+
+    def save(self, path):
+        """Write movie_ids, indices and scores as .npy files in the directory path"""
+        os.makedirs(path, exist_ok=True)
+        for name in ('movie_ids', 'indices', 'scores'):
+            np.save(os.path.join(path, f"neighbors_{name}.npy"), np.asarray(getattr(self, name)))
+
+    @classmethod
+    def load(cls, path, mmap=True, version=None):
+        arrays = [np.load(os.path.join(path, f"neighbors_{name}.npy"), mmap_mode='r' if mmap else None)
+                  for name in ('movie_ids', 'indices', 'scores')]
+        return cls(*arrays, version=version)
+
+    def __contains__(self, movie_id):
+        return movie_id in self.row_of
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def lookup(self, movie_id, n=10):
+        """Most similar movie ids for movie_id, best first"""
+        row = self.row_of.get(movie_id)
+        if row is None:
+            return []
+        neighbors = self.indices[row, :n]
+        return [int(movie_id) for movie_id in self.movie_ids[neighbors[neighbors >= 0]]]
+
+
+class NeighborTableBuilder:
+    """Keep a NeighborTable in step with a ContentIndex.
+
+    Rebuilds run in a background thread, at most once per min_interval, and
+    the finished table is swapped in whole. Until a movie appears in the
+    table callers fall back to scoring it against the index directly.
+    """
+
+    def __init__(self, index, k=20, block_size=256, min_interval=60):
+        self.index = index
+        self.k = k
+        self.block_size = block_size
+        self.min_interval = min_interval
+        self.table = None
+
+        self._lock = threading.Lock()
+        self._running = False
+        self._last_build = 0.0
+
+    def lookup(self, movie_id, n=10):
+        """Neighbour ids from the current table, or None if movie_id is not in it"""
+        table = self.table
+        if table is None or movie_id not in table:
+            return None
+        return table.lookup(movie_id, n)
+
+    def refresh(self, wait=False):
+        """Rebuild the table if the index has moved on since the last build"""
+        with self._lock:
+            table = self.table
+            current = table is not None and table.version == self.index.version
+            throttled = table is not None and time.time() - self._last_build < self.min_interval
+            if self._running or current or (throttled and not wait) or len(self.index) < 2:
+                return False
+            self._running = True
+            self._last_build = time.time()
+
+        if wait:
+            self._build()
+        else:
+            threading.Thread(target=self._build, daemon=True).start()
+        return True
+
+    def _build(self):
+        try:
+            view = self.index.view()
+            self.table = NeighborTable.build(view.stacked(), view.all_ids(), self.k, self.block_size,
+                                             view.version)
+        except Exception as e:
+            print("Neighbor table build error:", e)
+        finally:
+            with self._lock:
+                self._running = False
@@ -0,0 +1,99 @@
+"""Materialised per-user recommendation lists.
+
+Reads are a dict lookup plus the user's interaction version from the
+database. Writes that change a user's taste invalidate the user's entry and
+queue a recompute on a small worker pool; until it lands the previous list
+keeps being served, marked stale. An entry computed at an older interaction
+version than the database holds is stale too, which is how writes handled
+by other worker processes reach this one. Entries older than max_age are
+refreshed the same way so collaborative signals from other users eventually
+flow in.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RecommendationEntry:
+    __slots__ = ('movie_ids', 'generated_at', 'version', 'stale')
+
+    def __init__(self, movie_ids, generated_at, version=0, stale=False):
+        self.movie_ids = movie_ids
+        self.generated_at = generated_at
+        self.version = version  # the user's interaction version it was computed at
+        self.stale = stale
+
+
+class RecommendationStore:
+    """Per-user lists, each computed by compute(user_id, version).
+
+    compute has to reflect the user's interactions up to version, which
+    version(user_id) reads from the database (Storage.interaction_version).
+    """
+
+    def __init__(self, compute, version, max_users=10000, max_age=60 * 60, max_workers=2):
+        self.compute = compute
+        self.version = version
+        self.max_users = max_users
+        self.max_age = max_age
+
+        self._entries = OrderedDict()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='recs')
+
+    def get(self, user_id):
+        """Return the user's RecommendationEntry, computing it inline on first use"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+
+        if entry is None:
+            return self._recompute(user_id)
+        if not entry.stale and self.version(user_id) != entry.version:
+            # Written through another worker since the list was computed
+            entry.stale = True
+        if entry.stale or time.time() - entry.generated_at > self.max_age:
+            self._schedule(user_id)
+        return entry
+
+    def invalidate(self, user_id):
+        """Mark the user's list stale and recompute it in the background"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry.stale = True
+        self._schedule(user_id)
+
+    def _schedule(self, user_id):
+        with self._lock:
+            if user_id in self._queued:
+                return
+            self._queued.add(user_id)
+        self._executor.submit(self._run, user_id)
+
+    def _run(self, user_id):
+        # Leave the queue first so invalidations during the compute queue another run
+        with self._lock:
+            self._queued.discard(user_id)
+        try:
+            self._recompute(user_id)
+        except Exception as e:
+            print(f"Recommendation recompute error for user {user_id}:", e)
+
+    def _recompute(self, user_id):
+        version = self.version(user_id)
+        entry = RecommendationEntry(self.compute(user_id, version), time.time(), version)
+        # A write that raced the compute leaves the result stale
+        entry.stale = self.version(user_id) != version
+
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        if entry.stale:
+            self._schedule(user_id)
+        return entry
@@ -0,0 +1,168 @@
+"""Pre-serialized, pre-compressed JSON bodies with ETags for the TMDB-backed GET routes.
+
+Payloads from the TMDB response cache are shared read-only objects, so a
+payload seen before maps straight to its stored body and is never
+serialized again. Bodies are stored by content hash, together with gzip and
+(when the brotli package is installed) brotli encodings made once, so a
+payload that is refetched unchanged keeps its ETag and compressed bodies.
+
+Payloads built fresh for each request (shared=False) skip the identity
+lookup and are matched by content hash alone, so they still get an ETag
+without crowding out the shared ones.
+
+respond() picks the best encoding the client accepts and answers a
+matching If-None-Match with an empty 304. Upstream errors, and the empty
+lists routes fall back to when TMDB fails, are not cacheable(): callers send
+those with no-store so neither browsers nor proxies keep a failure. The ETag is weak because the
+same representation is sent under several content codings.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows (q > 0)"""
+    accepted = set()
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against etag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    bare = etag[2:] if etag.startswith('W/') else etag
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith('W/') else tag) == bare:
+            return True
+    return False
+
+
+def cacheable(payload):
+    """False for TMDB error payloads and empty fallbacks, which must not be cached"""
+    return bool(payload) and not (isinstance(payload, dict) and 'error' in payload)
+
+
+class Body:
+    """One serialized payload: its ETag and each stored encoding"""
+
+    __slots__ = ('etag', 'encodings')
+
+    def __init__(self, etag, encodings):
+        self.etag = etag
+        self.encodings = encodings  # coding -> bytes, 'identity' always present
+
+
+class ResponseCache:
+    def __init__(self, dumps, max_entries=2000, min_compress_size=1024, gzip_level=6,
+                 brotli_quality=5):
+        self.dumps = dumps
+        self.max_entries = max_entries
+        self.min_compress_size = min_compress_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+        self._by_payload = OrderedDict()  # id(payload) -> (payload, Body)
+        self._by_hash = OrderedDict()  # etag -> Body
+        self._lock = threading.Lock()
+        self.counters = {'payload_hits': 0, 'content_hits': 0, 'serializations': 0,
+                         'not_modified': 0, 'bytes_sent': 0, 'bytes_uncompressed': 0}
+
+    def respond(self, payload, if_none_match=None, accept_encoding=None, max_age=60, private=False,
+                shared=True):
+        """(status, headers, body) for a cacheable() JSON payload; shared=False for one built per request"""
+        stored = self.body(payload, shared)
+        headers = [('ETag', stored.etag),
+                   ('Cache-Control', f"{'private' if private else 'public'}, max-age={max_age}"),
+                   ('Vary', 'Accept-Encoding')]
+        if etag_matches(if_none_match, stored.etag):
+            self._count(not_modified=1)
+            return 304, headers, b''
+
+        accepted = accepted_encodings(accept_encoding)
+        coding = next((c for c in ('br', 'gzip') if c in accepted and c in stored.encodings), 'identity')
+        body = stored.encodings[coding]
+        headers += [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))]
+        if coding != 'identity':
+            headers.append(('Content-Encoding', coding))
+        self._count(bytes_sent=len(body), bytes_uncompressed=len(stored.encodings['identity']))
+        return 200, headers, body
+
+    def body(self, payload, shared=True):
+        """The stored Body for payload, serializing and compressing it on first sight"""
+        if shared:
+            with self._lock:
+                entry = self._by_payload.get(id(payload))
+                if entry is not None and entry[0] is payload:
+                    self._by_payload.move_to_end(id(payload))
+                    self.counters['payload_hits'] += 1
+                    return entry[1]
+
+        identity = self.dumps(payload).encode('utf-8')
+        etag = f'W/"{hashlib.blake2b(identity, digest_size=16).hexdigest()}"'
+        with self._lock:
+            stored = self._by_hash.get(etag)
+            if stored is not None:
+                self._by_hash.move_to_end(etag)
+                self.counters['content_hits'] += 1
+        if stored is None:
+            stored = Body(etag, self._encode(identity))
+            with self._lock:
+                self.counters['serializations'] += 1
+                self._by_hash[etag] = stored
+                self._trim(self._by_hash)
+
+        if not shared:
+            return stored
+        with self._lock:
+            # Holding the payload keeps its id from being reused while the entry lives
+            self._by_payload[id(payload)] = (payload, stored)
+            self._by_payload.move_to_end(id(payload))
+            self._trim(self._by_payload)
+        return stored
+
+    def _encode(self, identity):
+        encodings = {'identity': identity}
+        if len(identity) >= self.min_compress_size:
+            encodings['gzip'] = gzip.compress(identity, compresslevel=self.gzip_level, mtime=0)
+            if brotli is not None:
+                encodings['br'] = brotli.compress(identity, quality=self.brotli_quality)
+        return encodings
+
+    def _trim(self, entries):
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self._by_hash)
+        uncompressed = stats['bytes_uncompressed']
+        stats['compression_ratio'] = round(stats['bytes_sent'] / uncompressed, 4) if uncompressed else None
+        stats['brotli'] = brotli is not None
+        return stats
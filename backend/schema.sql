@@ -2,6 +2,10 @@ DROP TABLE IF EXISTS users;
 DROP TABLE IF EXISTS watch_history;
 DROP TABLE IF EXISTS favorites;
 DROP TABLE IF EXISTS ratings;
+DROP TABLE IF EXISTS rating_stats;
+DROP TABLE IF EXISTS interaction_versions;
+DROP TABLE IF EXISTS refresh_tokens;
+DROP TABLE IF EXISTS movies;
 
 CREATE TABLE users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -44,7 +48,117 @@ CREATE TABLE ratings (
     UNIQUE (user_id, movie_id)
 );
 
+-- Refresh tokens handed out at login, stored as SHA-256 hashes; expires_at is a Unix time
+CREATE TABLE refresh_tokens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    token_hash TEXT UNIQUE NOT NULL,
+    expires_at REAL NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+-- Per-movie rating aggregates, kept up to date by the triggers below on every ratings write
+CREATE TABLE rating_stats (
+    movie_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    total_squares INTEGER NOT NULL
+);
+
+CREATE TRIGGER ratings_stats_insert AFTER INSERT ON ratings BEGIN
+    INSERT INTO rating_stats (movie_id, count, total, total_squares)
+    VALUES (NEW.movie_id, 1, NEW.rating, NEW.rating * NEW.rating)
+    ON CONFLICT (movie_id) DO UPDATE SET count = count + 1, total = total + excluded.total,
+        total_squares = total_squares + excluded.total_squares;
+END;
+
+CREATE TRIGGER ratings_stats_update AFTER UPDATE OF rating ON ratings BEGIN
+    UPDATE rating_stats SET total = total - OLD.rating + NEW.rating,
+        total_squares = total_squares - OLD.rating * OLD.rating + NEW.rating * NEW.rating
+    WHERE movie_id = NEW.movie_id;
+END;
+
+CREATE TRIGGER ratings_stats_delete AFTER DELETE ON ratings BEGIN
+    UPDATE rating_stats SET count = count - 1, total = total - OLD.rating,
+        total_squares = total_squares - OLD.rating * OLD.rating
+    WHERE movie_id = OLD.movie_id;
+END;
+
+-- Count of interaction writes (favorites, watch_history, ratings) per user, kept up to date
+-- by the triggers below; they only grow, so their sum counts every write. Workers compare
+-- them with the versions their in-memory interaction matrix was built from
+CREATE TABLE interaction_versions (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+CREATE TRIGGER favorites_version_insert AFTER INSERT ON favorites BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER favorites_version_update AFTER UPDATE ON favorites BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER favorites_version_delete AFTER DELETE ON favorites BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER watch_history_version_insert AFTER INSERT ON watch_history BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER watch_history_version_update AFTER UPDATE ON watch_history BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER watch_history_version_delete AFTER DELETE ON watch_history BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER ratings_version_insert AFTER INSERT ON ratings BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER ratings_version_update AFTER UPDATE ON ratings BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER ratings_version_delete AFTER DELETE ON ratings BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+-- Local copy of TMDB movie metadata, written through from every TMDB response
+CREATE TABLE movies (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    overview TEXT,
+    poster_path TEXT,
+    backdrop_path TEXT,
+    release_date TEXT,
+    vote_average REAL,
+    vote_count INTEGER,
+    popularity REAL,
+    original_language TEXT,
+    genre_ids TEXT, -- JSON array of TMDB genre ids
+    details TEXT, -- Full movie/{id} payload as JSON, when one has been seen
+    updated_at REAL NOT NULL
+);
+
 -- Optional: Indexes for better performance on larger datasets
-CREATE INDEX IF NOT EXISTS idx_favorites_user_id ON favorites (user_id);
-CREATE INDEX IF NOT EXISTS idx_watch_history_user_id ON watch_history (user_id);
-CREATE INDEX IF NOT EXISTS idx_ratings_user_id ON ratings (user_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_favorites_user_created ON favorites (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_watch_history_user_viewed ON watch_history (user_id, viewed_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_ratings_user_id ON ratings (user_id);
+CREATE INDEX IF NOT EXISTS idx_ratings_movie_id ON ratings (movie_id);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens (user_id);
+CREATE INDEX IF NOT EXISTS idx_movies_popularity ON movies (popularity DESC);
+CREATE INDEX IF NOT EXISTS idx_movies_release_date ON movies (release_date);
\ No newline at end of file
@@ -0,0 +1,116 @@
+-- PostgreSQL schema for storage.PostgresStorage (same tables as schema.sql)
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username TEXT NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS favorites (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    movie_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    poster_path TEXT,
+    release_date TEXT,
+    vote_average REAL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, movie_id)
+);
+
+CREATE TABLE IF NOT EXISTS watch_history (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    movie_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    poster_path TEXT,
+    viewed_at TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ratings (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    movie_id INTEGER NOT NULL,
+    rating INTEGER NOT NULL CHECK (rating BETWEEN 1 AND 10),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, movie_id)
+);
+
+-- Refresh tokens handed out at login, stored as SHA-256 hashes; expires_at is a Unix time
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    token_hash TEXT UNIQUE NOT NULL,
+    expires_at DOUBLE PRECISION NOT NULL
+);
+
+-- Per-movie rating aggregates, kept up to date by ratings_stats_trigger on every ratings write
+CREATE TABLE IF NOT EXISTS rating_stats (
+    movie_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL,
+    total BIGINT NOT NULL,
+    total_squares BIGINT NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION ratings_stats() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE rating_stats SET count = count - 1, total = total - OLD.rating,
+            total_squares = total_squares - OLD.rating * OLD.rating
+        WHERE movie_id = OLD.movie_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO rating_stats AS s (movie_id, count, total, total_squares)
+        VALUES (NEW.movie_id, 1, NEW.rating, NEW.rating * NEW.rating)
+        ON CONFLICT (movie_id) DO UPDATE SET count = s.count + 1, total = s.total + excluded.total,
+            total_squares = s.total_squares + excluded.total_squares;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS ratings_stats_trigger ON ratings;
+CREATE TRIGGER ratings_stats_trigger AFTER INSERT OR UPDATE OF rating, movie_id OR DELETE ON ratings
+    FOR EACH ROW EXECUTE FUNCTION ratings_stats();
+
+-- Backfill once for ratings written before rating_stats existed
+INSERT INTO rating_stats (movie_id, count, total, total_squares)
+SELECT movie_id, COUNT(*), SUM(rating), SUM(rating * rating) FROM ratings
+WHERE NOT EXISTS (SELECT 1 FROM rating_stats)
+GROUP BY movie_id;
+
+-- Count of interaction writes (favorites, watch_history, ratings) per user, kept up to date
+-- by the triggers below; they only grow, so their sum counts every write. Workers compare
+-- them with the versions their in-memory interaction matrix was built from
+CREATE TABLE IF NOT EXISTS interaction_versions (
+    user_id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION bump_interaction_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO interaction_versions AS v (user_id, version)
+    VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD.user_id ELSE NEW.user_id END, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = v.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS favorites_version_trigger ON favorites;
+CREATE TRIGGER favorites_version_trigger AFTER INSERT OR UPDATE OR DELETE ON favorites
+    FOR EACH ROW EXECUTE FUNCTION bump_interaction_version();
+DROP TRIGGER IF EXISTS watch_history_version_trigger ON watch_history;
+CREATE TRIGGER watch_history_version_trigger AFTER INSERT OR UPDATE OR DELETE ON watch_history
+    FOR EACH ROW EXECUTE FUNCTION bump_interaction_version();
+DROP TRIGGER IF EXISTS ratings_version_trigger ON ratings;
+CREATE TRIGGER ratings_version_trigger AFTER INSERT OR UPDATE OR DELETE ON ratings
+    FOR EACH ROW EXECUTE FUNCTION bump_interaction_version();
+
+CREATE INDEX IF NOT EXISTS idx_favorites_user_created ON favorites (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_favorites_movie_id ON favorites (movie_id);
+CREATE INDEX IF NOT EXISTS idx_watch_history_user_viewed ON watch_history (user_id, viewed_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_watch_history_movie_id ON watch_history (movie_id);
+CREATE INDEX IF NOT EXISTS idx_ratings_user_id ON ratings (user_id);
+CREATE INDEX IF NOT EXISTS idx_ratings_movie_id ON ratings (movie_id);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens (user_id);
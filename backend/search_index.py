@@ -0,0 +1,244 @@
+"""In-process title search over the local movie catalog.
+
+Titles are split into accent-folded lowercase words. The sorted vocabulary
+is stored twice: as a prefix trie, and as a CSR of posting lists in the
+same order, so every trie node covers a contiguous run of term ids and a
+whole prefix expands to one slice of the postings. Query words are looked
+up in the trie: the last word of a query matches as a prefix (the user may
+still be typing it), the others as whole words. Only when that finds
+nothing is the query retried allowing typos, walking the trie with
+edit-distance rows (Levenshtein plus adjacent swaps, first letter fixed).
+
+Every query word must match. Scores combine how well each word matched,
+how much of the title the query covers and the movie's TMDB popularity.
+
+The indexed movies live in immutable SearchViews, kept up to date with the
+catalog by LiveIndex (see live_index.py).
+"""
+import math
+import re
+import time
+import unicodedata
+
+import numpy as np
+
+from live_index import LiveIndex
+
+WORD = re.compile(r'\w+')
+MAX_QUERY_WORDS = 8
+POPULARITY_SCALE = math.log1p(1000)  # TMDB popularity that counts as fully popular
+
+
+def tokenize(text):
+    """Lowercase words of text with accents removed"""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    return WORD.findall(''.join(c for c in text if not unicodedata.combining(c)))
+
+
+def max_typos(word):
+    """Edits tolerated in a query word: none for short words, two for long ones"""
+    return 0 if len(word) <= 3 else 1 if len(word) <= 7 else 2
+
+
+def match_weight(distance, whole_word):
+    # Any prefix match outranks any misspelt whole word
+    return (1.0 if whole_word else 0.8) / (1 + distance)
+
+
+class TrieNode:
+    __slots__ = ('children', 'lo', 'hi', 'term')
+
+    def __init__(self, lo):
+        self.children = None
+        self.lo = lo  # term ids [lo, hi) start with this node's prefix
+        self.hi = lo + 1
+        self.term = -1  # term id when the prefix is itself a word
+
+
+class SearchView:
+    """Index over one fixed set of movies; never modified once built.
+
+    movies maps movie_id -> (title, popularity). Documents are numbered by
+    descending popularity, so ties in score go to the more popular movie.
+    """
+
+    def __init__(self, movies):
+        order = sorted(movies, key=lambda movie_id: (-(movies[movie_id][1] or 0), movie_id))
+        self.movies = {movie_id: movies[movie_id] for movie_id in order}
+        self.ids = np.array(order, dtype=np.int64)
+        self.rank = np.array([min(1.0, math.log1p(max(movies[m][1] or 0, 0)) / POPULARITY_SCALE)
+                              for m in order], dtype=np.float32)
+
+        postings = {}
+        lengths = []
+        for doc, movie_id in enumerate(order):
+            words = tokenize(movies[movie_id][0])
+            lengths.append(len(words))
+            for word in set(words):
+                postings.setdefault(word, []).append(doc)
+        self.lengths = np.array(lengths, dtype=np.float32)
+
+        terms = sorted(postings)
+        self.indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum([len(postings[term]) for term in terms])
+        self.docs = np.fromiter((doc for term in terms for doc in postings[term]),
+                                dtype=np.int32, count=int(self.indptr[-1]))
+        self.root = self._build_trie(terms)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def terms(self):
+        return len(self.indptr) - 1
+
+    @staticmethod
+    def _build_trie(terms):
+        root = TrieNode(0)
+        root.hi = len(terms)
+        for term_id, term in enumerate(terms):
+            node = root
+            for char in term:
+                if node.children is None:
+                    node.children = {}
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = TrieNode(term_id)
+                else:
+                    child.hi = term_id + 1
+                node = child
+            node.term = term_id
+        return root
+
+    def matches(self, word, prefix, typos=0):
+        """(weight, lo, hi) runs of term ids within typos edits of word"""
+        if not typos:
+            node = self.root
+            for char in word:
+                node = (node.children or {}).get(char)
+                if node is None:
+                    return []
+            found = [(match_weight(0, True), node.term, node.term + 1)] if node.term >= 0 else []
+            if prefix:
+                found.append((match_weight(0, False), node.lo, node.hi))
+            return found
+
+        # The first letter has to be right, which keeps the walk to one subtree
+        first = (self.root.children or {}).get(word[0])
+        if first is None:
+            return []
+        found = []
+        capped = typos + 1  # stands for "too many edits" in a row
+        # (node, its letter, its depth, edit row of the parent, of the grandparent, parent's letter)
+        stack = [(first, word[0], 1, list(range(len(word) + 1)), None, None)]
+        while stack:
+            node, char, depth, above, above2, char_above = stack.pop()
+            # Edits between word[:i] and this node's prefix; only the band
+            # |i - depth| <= typos can stay under the limit
+            row = [capped] * (len(word) + 1)
+            if depth <= typos:
+                row[0] = depth
+            best = row[0]
+            for i in range(max(1, depth - typos), min(len(word), depth + typos) + 1):
+                letter = word[i - 1]
+                edits = above[i - 1] if letter == char else above[i - 1] + 1
+                if above[i] < edits:
+                    edits = above[i] + 1
+                if row[i - 1] < edits:
+                    edits = row[i - 1] + 1
+                if (above2 is not None and i > 1 and letter == char_above and word[i - 2] == char
+                        and above2[i - 2] < edits):
+                    edits = above2[i - 2] + 1
+                if edits < capped:
+                    row[i] = edits
+                    if edits < best:
+                        best = edits
+            distance = row[-1]
+            if distance <= typos:
+                if node.term >= 0:
+                    found.append((match_weight(distance, True), node.term, node.term + 1))
+                if prefix:
+                    found.append((match_weight(distance, False), node.lo, node.hi))
+                    if distance == 0:
+                        # Nothing deeper can match better than this whole run
+                        continue
+            if node.children and best <= typos:
+                stack.extend((child, letter, depth + 1, row, above, char)
+                             for letter, child in node.children.items())
+        return found
+
+    def search(self, words, limit, skip=None, fuzzy=False):
+        """[(score, movie_id)] for the best documents matching every word"""
+        if not len(self.ids):
+            return []
+        total = np.zeros(len(self.ids), dtype=np.float32)
+        matched = np.ones(len(self.ids), dtype=bool) if skip is None else ~skip
+        for position, word in enumerate(words):
+            weights = np.zeros(len(self.ids), dtype=np.float32)
+            # Ascending weight, so a document keeps the best way it matched
+            last = position == len(words) - 1
+            for weight, lo, hi in sorted(self.matches(word, last, max_typos(word) if fuzzy else 0)):
+                weights[self.docs[self.indptr[lo]:self.indptr[hi]]] = weight
+            matched &= weights > 0
+            if not matched.any():
+                return []
+            total += weights
+
+        candidates = np.flatnonzero(matched)
+        coverage = len(words) / np.maximum(self.lengths[candidates], len(words))
+        scores = (total[candidates] / len(words) * (0.75 + 0.25 * coverage)
+                  * (0.5 + 0.5 * self.rank[candidates]))
+        if len(candidates) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[best], scores[best]
+        order = np.lexsort((candidates, -scores))
+        return [(float(scores[i]), int(self.ids[candidates[i]])) for i in order]
+
+
+class SearchIndex(LiveIndex):
+    view = SearchView
+    label = 'Search index'
+
+    def __init__(self, merge_size=64):
+        super().__init__(merge_size)
+        self.counters.update({'searches': 0, 'misses': 0})
+        self._timings = {'total_ms': 0.0, 'max_ms': 0.0}
+
+    def entry(self, movie):
+        """Index by title; movies without one are left out"""
+        if movie.get('title'):
+            return movie.get('id'), (movie['title'], movie.get('popularity'))
+        return None
+
+    def search(self, query, limit=20, min_results=1):
+        """Ids of the best matching movies, or [] when fewer than min_results match"""
+        started = time.perf_counter()
+        words = tokenize(query)[:MAX_QUERY_WORDS]
+        movie_ids = []
+        if words:
+            levels = self._levels
+            hits = [hit for view, skip in levels for hit in view.search(words, limit, skip)]
+            if not hits:
+                # Misspellings are only looked for when the words as typed match nothing
+                hits = [hit for view, skip in levels for hit in view.search(words, limit, skip, True)]
+            hits.sort(key=lambda hit: -hit[0])
+            movie_ids = [movie_id for _, movie_id in hits[:limit]]
+        if len(movie_ids) < min_results:
+            movie_ids = []
+
+        ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.counters['searches'] += 1
+            self.counters['misses'] += not movie_ids
+            self._timings['total_ms'] += ms
+            self._timings['max_ms'] = max(self._timings['max_ms'], ms)
+        return movie_ids
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            searches = stats['searches']
+            stats['avg_search_ms'] = round(self._timings['total_ms'] / searches, 3) if searches else 0.0
+            stats['max_search_ms'] = round(self._timings['max_ms'], 3)
+        stats['terms'] = self._levels[0][0].terms
+        return stats
@@ -0,0 +1,188 @@
+"""Pluggable similarity backends for content-based recommendations.
+
+Every backend answers neighbors(movie_id, n) over the movies in a
+ContentIndex and returns None only when the movie is not indexed at all.
+neighbor_table() and restore(table) let engine snapshots carry a
+precomputed NeighborTable between processes.
+
+    exact  score the movie against the whole index on each request
+    table  precomputed top-K neighbour table (NeighborTableBuilder)
+    ann    LSH index over SVD-reduced embeddings (ann_index.LSHIndex)
+"""
+import threading
+import time
+
+from ann_index import LSHIndex
+from engine_snapshot import SnapshotStore
+from neighbors import NeighborTableBuilder, top_k
+
+
+class ExactBackend:
+    def __init__(self, index):
+        self.index = index
+
+    def neighbors(self, movie_id, n=10):
+        # One view for the whole request, so rows and ids always line up
+        view = self.index.view()
+        row = view.row(movie_id) if view is not None else None
+        if row is None:
+            return None
+        movie_ids = view.all_ids()
+        return [movie_ids[i] for i in top_k(view.scores(view.vector(row)), n, exclude=row)]
+
+    def refresh(self, wait=False):
+        return False
+
+    def neighbor_table(self):
+        return None
+
+    def restore(self, table):
+        pass
+
+
+class TableBackend(ExactBackend):
+    def __init__(self, index, k=20, min_interval=60):
+        super().__init__(index)
+        self.builder = NeighborTableBuilder(index, k=k, min_interval=min_interval)
+
+    def neighbors(self, movie_id, n=10):
+        neighbors = self.builder.lookup(movie_id, n)
+        if neighbors is not None:
+            return neighbors
+        # Movie is newer than the table: score it against the index directly
+        self.builder.refresh()
+        return super().neighbors(movie_id, n)
+
+    def refresh(self, wait=False):
+        return self.builder.refresh(wait)
+
+    def neighbor_table(self):
+        """The current table, if it covers the index as it stands"""
+        table = self.builder.table
+        if table is None or table.version != self.index.version:
+            return None
+        return table
+
+    def restore(self, table):
+        """Adopt a table saved alongside this backend's index"""
+        table.version = self.index.version
+        self.builder.table = table
+
+
+class ANNBackend(ExactBackend):
+    """Approximate neighbours from an LSHIndex, rebuilt in the background.
+
+    When path is set it is a SnapshotStore: the published index is loaded
+    from it at startup, and rebuilds adopt a newer published one that covers
+    the live corpus before building their own. Only the holder of the build
+    lock publishes, so other workers can map its index instead of building.
+    """
+
+    def __init__(self, index, path=None, min_interval=300, **options):
+        super().__init__(index)
+        self.store = SnapshotStore(path) if path else None
+        self.min_interval = min_interval
+        self.options = options
+        self.ann = None
+        self._vectorizer = None
+        self._version = None
+        self._published = None  # store version self.ann was loaded from or saved as
+        self._lock = threading.Lock()
+        self._running = False
+        self._last_build = 0.0
+        self._adopt()
+
+    def _adopt(self):
+        """Load the published index if it is one this backend has not seen; True if it did"""
+        if self.store is None:
+            return False
+        try:
+            version = self.store.current_version()
+            if version is None or version == self._published:
+                return False
+            ann = LSHIndex.load(self.store.path(version))
+        except (OSError, ValueError) as e:
+            print("ANN index load error:", e)
+            return False
+        self.ann, self._vectorizer, self._version, self._published = ann, None, 'loaded', version
+        return True
+
+    def neighbors(self, movie_id, n=10):
+        ann = self.ann
+        if ann is not None:
+            # Built from the live index: rows line up, so candidates can be
+            # re-ranked on their full TF-IDF vectors
+            rerank = None
+            view = self.index.view()
+            if view is not None and self._vectorizer is view.vectorizer and movie_id in view:
+                vector = view.vector(view.row(movie_id))
+                rerank = lambda rows: (view.rows(rows) @ vector.T).toarray()
+
+            neighbors = ann.query_movie(movie_id, n, rerank=rerank)
+            if neighbors is None and rerank is not None:
+                # Not in the ANN index yet; project it onto the index's embedding space
+                self.refresh()
+                neighbors = ann.query(ann.embed(vector)[0], n, exclude=movie_id, rerank=rerank)[0]
+            # Sparse buckets (small corpora) fall through to an exact scan
+            if neighbors is not None and len(neighbors) >= min(n, len(ann) - 1):
+                return neighbors
+        self.refresh()
+        return super().neighbors(movie_id, n)
+
+    def refresh(self, wait=False):
+        with self._lock:
+            current = self.ann is not None and self._version == self.index.version
+            # A prebuilt catalog index is kept until the live corpus outgrows it
+            if self._version == 'loaded' and len(self.ann) >= len(self.index):
+                current = True
+            throttled = self.ann is not None and time.time() - self._last_build < self.min_interval
+            if self._running or current or (throttled and not wait) or len(self.index) < 2:
+                return False
+            self._running = True
+            self._last_build = time.time()
+
+        if wait:
+            self._build()
+        else:
+            threading.Thread(target=self._build, daemon=True).start()
+        return True
+
+    def _build(self):
+        try:
+            # Another worker may already have published an index for this corpus
+            if self._adopt() and len(self.ann) >= len(self.index):
+                return
+            view = self.index.view()
+            version, vectorizer = view.version, view.vectorizer
+            ann = LSHIndex.build(view.stacked(), view.all_ids(), **self.options)
+            published = None
+            if self.store is not None and self.store.acquire_build_lock():
+                try:
+                    published = self.store.publish(lambda path, _: ann.save(path))
+                except OSError as e:
+                    print("ANN index save error:", e)
+                finally:
+                    self.store.release_build_lock()
+            self.ann, self._vectorizer, self._version = ann, vectorizer, version
+            self._published = published or self._published
+        except Exception as e:
+            print("ANN index build error:", e)
+        finally:
+            with self._lock:
+                self._running = False
+
+
+BACKENDS = {
+    'exact': ExactBackend,
+    'table': TableBackend,
+    'ann': ANNBackend,
+}
+
+
+def make_backend(name, index, **options):
+    """Create the similarity backend registered under name"""
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown similarity backend: {name}") from None
+    return backend(index, **options)
@@ -0,0 +1,94 @@
+"""Coalesce identical concurrent calls so only one of them does the work."""
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Share one in-flight call per key between all concurrent callers.
+
+    The first caller for a key runs fn(); callers arriving while it is still
+    running block until it finishes and receive the same result (or the same
+    exception). Safe to use from any number of request threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.counters = {'calls': 0, 'shared': 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.counters['calls'] += 1
+            else:
+                self.counters['shared'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop.
+
+    The shared call runs as its own task, so callers await it without
+    blocking a thread, and a caller that is cancelled (say, its client
+    disconnected) does not cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.counters = {'calls': 0, 'shared': 0}
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.get_running_loop().create_task(fn())
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.counters['calls'] += 1
+        else:
+            self.counters['shared'] += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the outcome retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['in_flight'] = len(self._calls)
+        return stats
@@ -0,0 +1,663 @@
+"""Persistence for users, favorites, watch history and ratings.
+
+Route handlers and background jobs talk to a Storage object instead of
+writing SQL inline. Every query lives once, in SQLStorage, written with
+'?' placeholders; the two backends only differ in how they connect and
+in their bulk paths:
+
+    SQLiteStorage    the original single-file database, through db_pool
+    PostgresStorage  psycopg2 connection pool, COPY for bulk loads and a
+                     server-side cursor for streaming interactions
+
+make_storage(url) picks one: 'postgresql://...' selects Postgres,
+anything else is treated as a SQLite path.
+
+    python storage.py --source database.db --target postgresql://localhost/movies
+"""
+import csv
+import datetime
+import io
+import os
+import time
+from contextlib import contextmanager
+
+from db_pool import PRAGMAS, ConnectionPool
+
+try:
+    import psycopg2
+    import psycopg2.extras
+    import psycopg2.pool
+except ImportError:  # Only needed for PostgresStorage
+    psycopg2 = None
+
+SCHEMA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Columns copied by migrate(), in dependency order
+TABLES = {
+    'users': ('id', 'username', 'email', 'password', 'created_at'),
+    'favorites': ('id', 'user_id', 'movie_id', 'title', 'poster_path', 'release_date',
+                  'vote_average', 'created_at'),
+    'watch_history': ('id', 'user_id', 'movie_id', 'title', 'poster_path', 'viewed_at'),
+    'ratings': ('id', 'user_id', 'movie_id', 'rating', 'created_at'),
+}
+
+# Additions to schema.sql since its first release, applied on start-up to SQLite
+# databases created before them. Must stay idempotent.
+SQLITE_UPGRADES = '''
+CREATE INDEX IF NOT EXISTS idx_favorites_user_created ON favorites (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_watch_history_user_viewed ON watch_history (user_id, viewed_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_ratings_movie_id ON ratings (movie_id);
+
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    token_hash TEXT UNIQUE NOT NULL,
+    expires_at REAL NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens (user_id);
+
+CREATE TABLE IF NOT EXISTS rating_stats (
+    movie_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    total_squares INTEGER NOT NULL
+);
+
+-- Backfill before the triggers exist, and only if they never have
+INSERT INTO rating_stats (movie_id, count, total, total_squares)
+SELECT movie_id, COUNT(*), SUM(rating), SUM(rating * rating) FROM ratings
+WHERE NOT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'ratings_stats_insert')
+GROUP BY movie_id;
+
+CREATE TRIGGER IF NOT EXISTS ratings_stats_insert AFTER INSERT ON ratings BEGIN
+    INSERT INTO rating_stats (movie_id, count, total, total_squares)
+    VALUES (NEW.movie_id, 1, NEW.rating, NEW.rating * NEW.rating)
+    ON CONFLICT (movie_id) DO UPDATE SET count = count + 1, total = total + excluded.total,
+        total_squares = total_squares + excluded.total_squares;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ratings_stats_update AFTER UPDATE OF rating ON ratings BEGIN
+    UPDATE rating_stats SET total = total - OLD.rating + NEW.rating,
+        total_squares = total_squares - OLD.rating * OLD.rating + NEW.rating * NEW.rating
+    WHERE movie_id = NEW.movie_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ratings_stats_delete AFTER DELETE ON ratings BEGIN
+    UPDATE rating_stats SET count = count - 1, total = total - OLD.rating,
+        total_squares = total_squares - OLD.rating * OLD.rating
+    WHERE movie_id = OLD.movie_id;
+END;
+
+CREATE TABLE IF NOT EXISTS interaction_versions (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS favorites_version_insert AFTER INSERT ON favorites BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS favorites_version_update AFTER UPDATE ON favorites BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS favorites_version_delete AFTER DELETE ON favorites BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS watch_history_version_insert AFTER INSERT ON watch_history BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS watch_history_version_update AFTER UPDATE ON watch_history BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS watch_history_version_delete AFTER DELETE ON watch_history BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ratings_version_insert AFTER INSERT ON ratings BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ratings_version_update AFTER UPDATE ON ratings BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ratings_version_delete AFTER DELETE ON ratings BEGIN
+    INSERT INTO interaction_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+'''
+
+
+def _plain(row):
+    """Row as a dict with timestamps rendered the way SQLite stores them"""
+    return {key: value.isoformat() if isinstance(value, datetime.datetime) else value
+            for key, value in dict(row).items()}
+
+
+class SQLStorage:
+    """Queries shared by every backend; subclasses supply connection()"""
+
+    placeholder = '?'
+
+    def _sql(self, query):
+        return query if self.placeholder == '?' else query.replace('?', self.placeholder)
+
+    def _tuple_cursor(self, db):
+        """Cursor whose rows unpack as plain value tuples"""
+        return db.cursor()
+
+    def _all(self, query, params=()):
+        with self.connection() as db:
+            cursor = db.cursor()
+            cursor.execute(self._sql(query), params)
+            return [_plain(row) for row in cursor.fetchall()]
+
+    def _one(self, query, params=()):
+        rows = self._all(query, params)
+        return rows[0] if rows else None
+
+    def _write(self, query, params=()):
+        with self.connection() as db:
+            cursor = db.cursor()
+            cursor.execute(self._sql(query), params)
+            db.commit()
+            return cursor.rowcount
+
+    def _keyset(self, select, column, user_id, limit, after):
+        """One page of select ordered by (column, id) descending, starting after the key after.
+
+        The (user_id, column, id) indexes make each page a short index range
+        scan, however deep into the list it is.
+        """
+        alias = column.split('.')[0]
+        params = [user_id]
+        if after is not None:
+            select += f' AND ({column}, {alias}.id) < (?, ?)'
+            params += list(after)
+        params.append(limit)
+        return self._all(select + f' ORDER BY {column} DESC, {alias}.id DESC LIMIT ?', params)
+
+    def _iter_keyset(self, page, key, user_id, batch_size):
+        """Yield every row page by page; only one page is ever held in memory"""
+        after = None
+        while True:
+            rows = page(user_id, batch_size, after)
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1][key], rows[-1]['id'])
+
+    def _write_batch(self, statements):
+        """Run each (query, rows) pair with executemany, all in one transaction"""
+        with self.connection() as db:
+            cursor = db.cursor()
+            for query, rows in statements:
+                if rows:
+                    self._executemany(cursor, self._sql(query), rows)
+            db.commit()
+
+    def _executemany(self, cursor, query, rows):
+        cursor.executemany(query, rows)
+
+    def _movie_rows(self, query, user_id, movie_ids):
+        """Run query for the user, with {movie_ids} expanded to a placeholder list"""
+        movie_ids = list(movie_ids)
+        if not movie_ids:
+            return []
+        return self._all(query.format(movie_ids=', '.join('?' * len(movie_ids))),
+                         [user_id] + movie_ids)
+
+    # Users
+
+    def get_user(self, user_id):
+        return self._one('SELECT * FROM users WHERE id = ?', (user_id,))
+
+    def get_user_by_email(self, email):
+        return self._one('SELECT * FROM users WHERE email = ?', (email,))
+
+    def create_user(self, username, email, password):
+        """Insert a user and return its public fields (id, username, email)"""
+        self._write('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                    (username, email, password))
+        return self._one('SELECT id, username, email FROM users WHERE email = ?', (email,))
+
+    def update_user(self, user_id, username, email):
+        self._write('UPDATE users SET username = ?, email = ? WHERE id = ?', (username, email, user_id))
+
+    def delete_user(self, user_id):
+        """Delete the user and everything they own in one transaction"""
+        self._write_batch([(f'DELETE FROM {table} WHERE user_id = ?', [(user_id,)])
+                           for table in ('favorites', 'watch_history', 'ratings', 'refresh_tokens')]
+                          + [('DELETE FROM users WHERE id = ?', [(user_id,)])])
+
+    # Refresh tokens, stored as SHA-256 hashes of the opaque tokens handed out
+
+    def add_refresh_token(self, user_id, token_hash, expires_at):
+        """Store a new refresh token and drop the user's expired ones"""
+        self._write_batch([
+            ('DELETE FROM refresh_tokens WHERE user_id = ? AND expires_at < ?', [(user_id, time.time())]),
+            ('INSERT INTO refresh_tokens (user_id, token_hash, expires_at) VALUES (?, ?, ?)',
+             [(user_id, token_hash, expires_at)]),
+        ])
+
+    def consume_refresh_token(self, token_hash):
+        """Delete a refresh token; returns its user id if it existed and had not expired"""
+        row = self._one('SELECT user_id, expires_at FROM refresh_tokens WHERE token_hash = ?',
+                        (token_hash,))
+        # Whoever deletes the row owns it, so a token can't be redeemed twice
+        if row is None or not self._write('DELETE FROM refresh_tokens WHERE token_hash = ?',
+                                           (token_hash,)):
+            return None
+        return row['user_id'] if row['expires_at'] > time.time() else None
+
+    def revoke_refresh_token(self, token_hash):
+        self._write('DELETE FROM refresh_tokens WHERE token_hash = ?', (token_hash,))
+
+    # Favorites
+
+    FAVORITES_SELECT = '''
+        SELECT f.id, f.movie_id AS "movieId", f.title, f.poster_path AS "posterPath",
+               f.release_date AS "releaseDate", f.vote_average AS "voteAverage",
+               f.created_at AS "createdAt"
+        FROM favorites f
+        WHERE f.user_id = ?
+    '''
+
+    def list_favorites(self, user_id):
+        return self._all(self.FAVORITES_SELECT + ' ORDER BY f.created_at DESC, f.id DESC',
+                         (user_id,))
+
+    def favorites_page(self, user_id, limit, after=None):
+        """Up to limit favorites older than the (createdAt, id) key after, newest first"""
+        return self._keyset(self.FAVORITES_SELECT, 'f.created_at', user_id, limit, after)
+
+    def iter_favorites(self, user_id, batch_size=500):
+        return self._iter_keyset(self.favorites_page, 'createdAt', user_id, batch_size)
+
+    def get_favorite(self, user_id, movie_id):
+        return self._one('SELECT * FROM favorites WHERE user_id = ? AND movie_id = ?',
+                         (user_id, movie_id))
+
+    def add_favorite(self, user_id, movie):
+        self._write('''
+            INSERT INTO favorites
+            (user_id, movie_id, title, poster_path, release_date, vote_average)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (
+            user_id,
+            movie['id'],
+            movie['title'],
+            movie.get('poster_path', ''),
+            movie.get('release_date', ''),
+            movie.get('vote_average', 0)
+        ))
+
+    def remove_favorite(self, favorite_id):
+        self._write('DELETE FROM favorites WHERE id = ?', (favorite_id,))
+
+    def favorite_movie_ids(self, user_id, movie_ids):
+        """The subset of movie_ids the user has favorited"""
+        rows = self._movie_rows(
+            'SELECT movie_id FROM favorites WHERE user_id = ? AND movie_id IN ({movie_ids})',
+            user_id, movie_ids)
+        return {row['movie_id'] for row in rows}
+
+    def update_favorites(self, user_id, add=(), remove=()):
+        """Add favorites (movie dicts) and remove others (movie ids) in one transaction"""
+        self._write_batch([
+            ('''
+                INSERT INTO favorites
+                (user_id, movie_id, title, poster_path, release_date, vote_average)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, movie_id) DO NOTHING
+            ''', [(user_id, movie['id'], movie['title'], movie.get('poster_path', ''),
+                   movie.get('release_date', ''), movie.get('vote_average', 0)) for movie in add]),
+            ('DELETE FROM favorites WHERE user_id = ? AND movie_id = ?',
+             [(user_id, movie_id) for movie_id in remove]),
+        ])
+
+    # Watch history
+
+    HISTORY_SELECT = '''
+        SELECT h.id, h.movie_id AS "movieId", h.title, h.poster_path AS "posterPath",
+               h.viewed_at AS "viewedAt"
+        FROM watch_history h
+        WHERE h.user_id = ?
+    '''
+
+    def list_history(self, user_id):
+        return self._all(self.HISTORY_SELECT + ' ORDER BY h.viewed_at DESC, h.id DESC',
+                         (user_id,))
+
+    def history_page(self, user_id, limit, after=None):
+        """Up to limit history entries older than the (viewedAt, id) key after, newest first"""
+        return self._keyset(self.HISTORY_SELECT, 'h.viewed_at', user_id, limit, after)
+
+    def iter_history(self, user_id, batch_size=500):
+        return self._iter_keyset(self.history_page, 'viewedAt', user_id, batch_size)
+
+    def last_viewed_at(self, user_id, movie_id):
+        """datetime of the user's latest view of movie_id, or None"""
+        row = self._one('''
+            SELECT viewed_at FROM watch_history
+            WHERE user_id = ? AND movie_id = ?
+            ORDER BY viewed_at DESC LIMIT 1
+        ''', (user_id, movie_id))
+        return datetime.datetime.fromisoformat(row['viewed_at']) if row else None
+
+    def recent_history(self, user_id, limit=1):
+        """Movie ids the user viewed most recently, newest first"""
+        rows = self._all('''
+            SELECT movie_id FROM watch_history
+            WHERE user_id = ?
+            ORDER BY viewed_at DESC
+            LIMIT ?
+        ''', (user_id, limit))
+        return [row['movie_id'] for row in rows]
+
+    def history_count(self, user_id):
+        return self._one('SELECT COUNT(*) AS count FROM watch_history WHERE user_id = ?',
+                         (user_id,))['count']
+
+    def add_history(self, user_id, movie, viewed_at):
+        self._write('''
+            INSERT INTO watch_history
+            (user_id, movie_id, title, poster_path, viewed_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            user_id,
+            movie['id'],
+            movie['title'],
+            movie.get('poster_path', ''),
+            viewed_at.isoformat()
+        ))
+
+    def last_views(self, user_id, movie_ids):
+        """{movie_id: datetime of the user's latest view} for the movie_ids viewed at all"""
+        rows = self._movie_rows('''
+            SELECT movie_id, MAX(viewed_at) AS viewed_at FROM watch_history
+            WHERE user_id = ? AND movie_id IN ({movie_ids})
+            GROUP BY movie_id
+        ''', user_id, movie_ids)
+        return {row['movie_id']: datetime.datetime.fromisoformat(row['viewed_at']) for row in rows}
+
+    def add_history_many(self, user_id, entries):
+        """Insert (movie, viewed_at) pairs in one transaction"""
+        self._write_batch([('''
+            INSERT INTO watch_history
+            (user_id, movie_id, title, poster_path, viewed_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(user_id, movie['id'], movie['title'], movie.get('poster_path', ''),
+               viewed_at.isoformat()) for movie, viewed_at in entries])])
+
+    def remove_history(self, user_id, movie_id):
+        self._write('DELETE FROM watch_history WHERE user_id = ? AND movie_id = ?',
+                    (user_id, movie_id))
+
+    def clear_history(self, user_id):
+        self._write('DELETE FROM watch_history WHERE user_id = ?', (user_id,))
+
+    # Ratings
+
+    def list_ratings(self, user_id):
+        return self._all('''
+            SELECT movie_id AS "movieId", rating, created_at AS "createdAt"
+            FROM ratings WHERE user_id = ? ORDER BY created_at DESC
+        ''', (user_id,))
+
+    def set_rating(self, user_id, movie_id, rating):
+        self._write('''
+            INSERT INTO ratings (user_id, movie_id, rating) VALUES (?, ?, ?)
+            ON CONFLICT (user_id, movie_id) DO UPDATE SET rating = excluded.rating
+        ''', (user_id, movie_id, rating))
+
+    def remove_rating(self, user_id, movie_id):
+        self._write('DELETE FROM ratings WHERE user_id = ? AND movie_id = ?', (user_id, movie_id))
+
+    def user_ratings(self, user_id, movie_ids):
+        """{movie_id: rating} for the movie_ids the user has rated"""
+        rows = self._movie_rows(
+            'SELECT movie_id, rating FROM ratings WHERE user_id = ? AND movie_id IN ({movie_ids})',
+            user_id, movie_ids)
+        return {row['movie_id']: row['rating'] for row in rows}
+
+    def rating_stats(self, movie_ids):
+        """{movie_id: {count, average, stddev}} from the trigger-maintained aggregates"""
+        movie_ids = list(movie_ids)
+        if not movie_ids:
+            return {}
+        rows = self._all(f"SELECT * FROM rating_stats WHERE count > 0 AND movie_id IN "
+                         f"({', '.join('?' * len(movie_ids))})", movie_ids)
+        stats = {}
+        for row in rows:
+            count, mean = row['count'], row['total'] / row['count']
+            variance = max(row['total_squares'] / count - mean * mean, 0.0)
+            stats[row['movie_id']] = {'count': count, 'average': round(mean, 2),
+                                      'stddev': round(variance ** 0.5, 2)}
+        return stats
+
+    def update_ratings(self, user_id, ratings=(), remove=()):
+        """Upsert (movie_id, rating) pairs and delete ratings for movie ids, in one transaction"""
+        self._write_batch([
+            ('''
+                INSERT INTO ratings (user_id, movie_id, rating) VALUES (?, ?, ?)
+                ON CONFLICT (user_id, movie_id) DO UPDATE SET rating = excluded.rating
+            ''', [(user_id, movie_id, rating) for movie_id, rating in ratings]),
+            ('DELETE FROM ratings WHERE user_id = ? AND movie_id = ?',
+             [(user_id, movie_id) for movie_id in remove]),
+        ])
+
+    # Collaborative filtering
+
+    INTERACTIONS_SQL = '''
+        SELECT user_id, movie_id, ?, NULL FROM watch_history
+        UNION ALL
+        SELECT user_id, movie_id, ?, NULL FROM favorites
+        UNION ALL
+        SELECT user_id, movie_id, ? * rating / 10.0, rating FROM ratings
+    '''
+
+    def iter_interactions(self, weights, batch_size=50000):
+        """Yield lists of (user_id, movie_id, weight, rating) covering every interaction.
+
+        rating is the explicit 1-10 rating for rows from the ratings table, else None.
+        """
+        with self.connection() as db:
+            cursor = self._tuple_cursor(db)
+            cursor.execute(self._sql(self.INTERACTIONS_SQL),
+                           (weights['history'], weights['favorites'], weights['ratings']))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield [tuple(row) for row in rows]
+
+    def interaction_version(self, user_id=None):
+        """Interaction writes so far by user_id, or by everyone (see interaction_versions)"""
+        if user_id is None:
+            row = self._one('SELECT COALESCE(SUM(version), 0) AS version FROM interaction_versions')
+        else:
+            row = self._one('SELECT version FROM interaction_versions WHERE user_id = ?', (user_id,))
+        return int(row['version']) if row else 0
+
+    def interaction_versions(self):
+        """{user_id: interaction version} for every user who has written any"""
+        with self.connection() as db:
+            cursor = self._tuple_cursor(db)
+            cursor.execute('SELECT user_id, version FROM interaction_versions')
+            return dict(cursor.fetchall())
+
+    def iter_table(self, table, batch_size=50000):
+        """Yield batches of rows from one of TABLES, as tuples in TABLES order"""
+        with self.connection() as db:
+            cursor = self._tuple_cursor(db)
+            cursor.execute(f"SELECT {', '.join(TABLES[table])} FROM {table} ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield [tuple(row) for row in rows]
+
+
+class SQLiteStorage(SQLStorage):
+    def __init__(self, db_path, pool_size=16, pragmas=PRAGMAS):
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, size=pool_size, pragmas=pragmas)
+
+    @contextmanager
+    def connection(self):
+        db = self.pool.acquire()
+        try:
+            yield db
+        finally:
+            self.pool.release(db)
+
+    def init_schema(self):
+        """Create the tables from schema.sql, dropping any existing ones"""
+        with open(os.path.join(SCHEMA_DIR, 'schema.sql')) as f:
+            script = f.read()
+        with self.connection() as db:
+            db.executescript(script)
+            db.commit()
+
+    def ensure_schema(self):
+        """Create the database on first run and bring older ones up to date"""
+        if not os.path.exists(self.db_path):
+            self.init_schema()
+            return
+        with self.connection() as db:
+            db.executescript(SQLITE_UPGRADES)
+            db.commit()
+
+    def bulk_load(self, table, columns, rows):
+        """Insert many rows in one transaction"""
+        with self.connection() as db:
+            db.executemany(f"INSERT INTO {table} ({', '.join(columns)}) "
+                           f"VALUES ({', '.join('?' * len(columns))})", rows)
+            db.commit()
+
+
+class PostgresStorage(SQLStorage):
+    placeholder = '%s'
+
+    def __init__(self, dsn, min_connections=1, max_connections=16):
+        if psycopg2 is None:
+            raise RuntimeError("PostgresStorage requires psycopg2 (pip install psycopg2-binary)")
+        self.dsn = dsn
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            min_connections, max_connections, dsn, cursor_factory=psycopg2.extras.RealDictCursor)
+
+    @contextmanager
+    def connection(self):
+        db = self.pool.getconn()
+        try:
+            yield db
+        finally:
+            # Leave the connection clean for the next borrower
+            if db.status != psycopg2.extensions.STATUS_READY:
+                db.rollback()
+            self.pool.putconn(db)
+
+    def _tuple_cursor(self, db):
+        return db.cursor(cursor_factory=psycopg2.extensions.cursor)
+
+    def _executemany(self, cursor, query, rows):
+        # psycopg2's executemany makes a round trip per row; execute_batch sends pages of them
+        psycopg2.extras.execute_batch(cursor, query, rows)
+
+    def init_schema(self):
+        """Create any missing tables from schema_postgres.sql"""
+        with open(os.path.join(SCHEMA_DIR, 'schema_postgres.sql')) as f:
+            script = f.read()
+        with self.connection() as db:
+            db.cursor().execute(script)
+            db.commit()
+
+    def ensure_schema(self):
+        self.init_schema()
+
+    def bulk_load(self, table, columns, rows):
+        """Stream rows into table with COPY"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['\\N' if value is None else value for value in row])
+        buffer.seek(0)
+        with self.connection() as db:
+            db.cursor().copy_expert(
+                f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer)
+            db.commit()
+
+    def iter_interactions(self, weights, batch_size=50000):
+        """Like SQLStorage.iter_interactions, streamed through a server-side cursor"""
+        with self.connection() as db:
+            # Named cursors live on the server; rows arrive itersize at a time
+            cursor = db.cursor(name='interactions', cursor_factory=psycopg2.extensions.cursor)
+            cursor.itersize = batch_size
+            cursor.execute(self._sql(self.INTERACTIONS_SQL),
+                           (weights['history'], weights['favorites'], weights['ratings']))
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield [tuple(row) for row in rows]
+            finally:
+                cursor.close()
+                db.commit()
+
+    def reset_sequences(self):
+        """Move each id sequence past the largest id, e.g. after COPYing explicit ids"""
+        with self.connection() as db:
+            cursor = db.cursor()
+            for table in TABLES:
+                cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                               f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+            db.commit()
+
+
+def make_storage(url, pool_size=16):
+    if url.startswith(('postgres://', 'postgresql://')):
+        return PostgresStorage(url, max_connections=pool_size)
+    return SQLiteStorage(url, pool_size)
+
+
+def migrate(source, target, batch_size=50000):
+    """Copy every user, favorite, history entry and rating from source into target"""
+    counts = {}
+    for table, columns in TABLES.items():
+        counts[table] = 0
+        for rows in source.iter_table(table, batch_size):
+            target.bulk_load(table, columns, rows)
+            counts[table] += len(rows)
+    if isinstance(target, PostgresStorage):
+        target.reset_sequences()
+    return counts
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Copy user data between storage backends')
+    parser.add_argument('--source', default='database.db')
+    parser.add_argument('--target', required=True, help='SQLite path or postgresql:// URL')
+    args = parser.parse_args()
+
+    target = make_storage(args.target)
+    target.init_schema()
+    print(json.dumps(migrate(make_storage(args.source), target)))
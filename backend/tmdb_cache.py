@@ -0,0 +1,315 @@
+"""Two-tier cache for TMDB responses: a bounded in-process LRU in front of a
+persistent SQLite table.
+
+Entries are keyed by endpoint plus the normalized query parameters (the API
+key is never part of the key). Each endpoint class gets its own TTL, and an
+expired entry is still served for a grace window while a background refresh
+fetches the new value (stale-while-revalidate). Concurrent misses for the
+same key share a single upstream call. Listeners are told about every
+successful upstream fetch, which is how movie metadata reaches the local
+catalog.
+
+get_or_fetch_async is the same lookup for the ASGI entry point: fetch is a
+coroutine function, and the SQLite reads and writes (the disk tier and the
+listeners) run in worker threads so the event loop never blocks on them.
+"""
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+# (endpoint pattern, fresh seconds, stale-while-revalidate seconds)
+TTL_RULES = [
+    (r'trending/.*', 10 * 60, 30 * 60),
+    (r'search/.*', 30 * 60, 60 * 60),
+    (r'movie/(popular|now_playing|upcoming)', 60 * 60, 3 * 60 * 60),
+    (r'movie/top_rated', 6 * 60 * 60, 24 * 60 * 60),
+    (r'discover/.*', 60 * 60, 3 * 60 * 60),
+    (r'genre/.*', 7 * 24 * 60 * 60, 7 * 24 * 60 * 60),
+    (r'movie/\d+/watch/providers', 6 * 60 * 60, 24 * 60 * 60),
+    (r'movie/\d+(/.*)?', 24 * 60 * 60, 7 * 24 * 60 * 60),
+]
+DEFAULT_TTL = (60 * 60, 60 * 60)
+
+IGNORED_PARAMS = {'api_key'}
+
+
+def cache_key(endpoint, params=None):
+    """Build a stable key from an endpoint and its query parameters"""
+    endpoint = endpoint.strip('/')
+    items = sorted((str(k), str(v)) for k, v in (params or {}).items()
+                   if k not in IGNORED_PARAMS and v is not None)
+    return f"{endpoint}?{urlencode(items)}" if items else endpoint
+
+
+class TMDBCache:
+    """LRU + SQLite cache with per-endpoint TTLs and hit/miss/eviction counters.
+
+    Values handed out are shared between callers and must be treated as
+    read-only.
+    """
+
+    def __init__(self, db_path=None, max_entries=2000, ttl_rules=TTL_RULES,
+                 default_ttl=DEFAULT_TTL, flights=None):
+        self.db_path = db_path
+        self.flights = flights or SingleFlight()
+        self.async_flights = AsyncSingleFlight()
+        self.max_entries = max_entries
+        self.ttl_rules = [(re.compile(pattern), fresh, stale) for pattern, fresh, stale in ttl_rules]
+        self.default_ttl = default_ttl
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._refreshing = set()
+        self._refresh_tasks = set()
+        self._writes = 0
+        self.listeners = []
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'disk_evictions': 0,
+            'refreshes': 0,
+        }
+
+        if self.db_path:
+            self._connection().execute('''
+                CREATE TABLE IF NOT EXISTS tmdb_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    stale_until REAL NOT NULL
+                )
+            ''')
+            self._connection().commit()
+
+    def ttl_for(self, endpoint):
+        """Return (fresh, stale) seconds for an endpoint"""
+        endpoint = endpoint.strip('/')
+        for pattern, fresh, stale in self.ttl_rules:
+            if pattern.fullmatch(endpoint):
+                return fresh, stale
+        return self.default_ttl
+
+    def get_or_fetch(self, endpoint, params, fetch):
+        """Return the cached response for endpoint/params, calling fetch() on a miss"""
+        key = cache_key(endpoint, params)
+
+        entry = self._memory_get(key)
+        tier = 'memory_hits'
+        if entry is None:
+            entry = self._disk_get(key)
+            tier = 'disk_hits'
+            if entry is not None:
+                self._memory_put(key, entry)
+
+        state = self._classify(entry, tier)
+        if state == 'fresh':
+            return entry[0]
+        if state == 'stale':
+            self._refresh_in_background(key, endpoint, fetch)
+            return entry[0]
+        return self._fetch_and_store(key, endpoint, fetch)
+
+    async def get_or_fetch_async(self, endpoint, params, fetch):
+        """get_or_fetch for coroutine fetch functions; call from the event loop"""
+        key = cache_key(endpoint, params)
+
+        entry = self._memory_get(key)
+        tier = 'memory_hits'
+        if entry is None and self.db_path:
+            entry = await asyncio.to_thread(self._disk_get, key)
+            tier = 'disk_hits'
+            if entry is not None:
+                self._memory_put(key, entry)
+
+        state = self._classify(entry, tier)
+        if state == 'fresh':
+            return entry[0]
+        if state == 'stale':
+            self._refresh_async(key, endpoint, fetch)
+            return entry[0]
+        return await self.async_flights.do(key, lambda: self._fetch_and_store_async(key, endpoint, fetch))
+
+    def _classify(self, entry, tier):
+        """'fresh', 'stale' or 'miss' for a looked-up entry, counting the outcome"""
+        if entry is not None:
+            _, expires_at, stale_until = entry
+            now = time.time()
+            if now < expires_at:
+                self._count(tier)
+                return 'fresh'
+            if now < stale_until:
+                self._count('stale_hits')
+                return 'stale'
+        self._count('misses')
+        return 'miss'
+
+    def invalidate(self, endpoint, params=None):
+        key = cache_key(endpoint, params)
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.db_path:
+            db = self._connection()
+            db.execute('DELETE FROM tmdb_cache WHERE key = ?', (key,))
+            db.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = round(1 - stats['misses'] / lookups, 4) if lookups else 0.0
+        flights, async_flights = self.flights.stats(), self.async_flights.stats()
+        stats['upstream_calls'] = flights['calls'] + async_flights['calls']
+        stats['coalesced_calls'] = flights['shared'] + async_flights['shared']
+        return stats
+
+    def _fetch_and_store(self, key, endpoint, fetch):
+        return self.flights.do(key, lambda: self._fetch_and_store_once(key, endpoint, fetch))
+
+    def _fetch_and_store_once(self, key, endpoint, fetch):
+        value = fetch()
+        entry = self._entry_for(endpoint, value)
+        if entry is not None:
+            self._memory_put(key, entry)
+            self._persist(key, endpoint, entry)
+        return value
+
+    async def _fetch_and_store_async(self, key, endpoint, fetch):
+        value = await fetch()
+        entry = self._entry_for(endpoint, value)
+        if entry is not None:
+            self._memory_put(key, entry)
+            await asyncio.to_thread(self._persist, key, endpoint, entry)
+        return value
+
+    def _entry_for(self, endpoint, value):
+        """Cache entry for a fetched value, or None if it should not be cached"""
+        # Only successful payloads are cached; errors are retried next time
+        if isinstance(value, (dict, list)) and not (isinstance(value, dict) and 'error' in value):
+            fresh, stale = self.ttl_for(endpoint)
+            now = time.time()
+            return (value, now + fresh, now + fresh + stale)
+        return None
+
+    def _persist(self, key, endpoint, entry):
+        """Write an entry to the disk tier and tell the listeners"""
+        self._disk_put(key, entry)
+        for listener in self.listeners:
+            listener(endpoint, entry[0])
+
+    def _refresh_in_background(self, key, endpoint, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self.counters['refreshes'] += 1
+
+        def refresh():
+            try:
+                self._fetch_and_store(key, endpoint, fetch)
+            except Exception as e:
+                print(f"TMDB cache refresh error for {key}:", e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _refresh_async(self, key, endpoint, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self.counters['refreshes'] += 1
+
+        async def refresh():
+            try:
+                await self.async_flights.do(key, lambda: self._fetch_and_store_async(key, endpoint, fetch))
+            except Exception as e:
+                print(f"TMDB cache refresh error for {key}:", e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        # Keep a reference so the task is not garbage collected mid-flight
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def _memory_put(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.db_path, timeout=5)
+        return db
+
+    def _disk_get(self, key):
+        if not self.db_path:
+            return None
+        try:
+            row = self._connection().execute(
+                'SELECT value, expires_at, stale_until FROM tmdb_cache WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print("TMDB cache read error:", e)
+            return None
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def _disk_put(self, key, entry):
+        if not self.db_path:
+            return
+        value, expires_at, stale_until = entry
+        try:
+            db = self._connection()
+            db.execute('INSERT OR REPLACE INTO tmdb_cache (key, value, expires_at, stale_until) '
+                       'VALUES (?, ?, ?, ?)', (key, json.dumps(value), expires_at, stale_until))
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % 500 == 0
+            if purge:
+                # Periodically drop rows that are past their stale window
+                purged = db.execute('DELETE FROM tmdb_cache WHERE stale_until < ?',
+                                    (time.time(),)).rowcount
+                self._count('disk_evictions', purged)
+            db.commit()
+        except sqlite3.Error as e:
+            print("TMDB cache write error:", e)
+
+
+# Shared cache used by app.py and utils.py; set TMDB_CACHE_DB to '' to keep it in memory only
+cache = TMDBCache(
+    db_path=os.getenv('TMDB_CACHE_DB', 'tmdb_cache.db') or None,
+    max_entries=int(os.getenv('TMDB_CACHE_SIZE', 2000))
+)
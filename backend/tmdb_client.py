@@ -0,0 +1,194 @@
+"""Shared HTTP client for all TMDB traffic.
+
+One pooled requests.Session keeps connections alive across calls. Every
+request has a timeout, transient failures are retried with capped
+exponential backoff and full jitter, and a 429 response pauses all callers
+until TMDB's rate-limit window reopens so bursts queue instead of failing.
+
+AsyncTMDBClient is the asyncio counterpart used by the ASGI entry point
+(asgi.py). It shares the rate-limit state of a TMDBClient, so a 429 seen on
+either side pauses both.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:  # Only needed for AsyncTMDBClient
+    aiohttp = None
+
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """Full-jitter exponential backoff for the given zero-based attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TMDBClient:
+    def __init__(self, base_url, pool_size=20, timeout=(3.05, 10), max_retries=3,
+                 backoff_base=0.5, backoff_cap=8.0, max_rate_limit_wait=30.0):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_rate_limit_wait = max_rate_limit_wait
+
+        self.session = requests.Session()
+        # pool_block makes callers wait for a free connection rather than
+        # opening throwaway ones past the pool size
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+
+    def get(self, endpoint, params=None, timeout=None):
+        """GET an endpoint relative to base_url and return the decoded JSON"""
+        return self.get_url(f"{self.base_url}/{endpoint.lstrip('/')}", params, timeout)
+
+    def get_url(self, url, params=None, timeout=None):
+        """GET an absolute URL, returning the decoded JSON or an {'error': ...} dict"""
+        error = 'TMDB API error: no response'
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_rate_limit()
+            try:
+                response = self.session.get(url, params=params, timeout=timeout or self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f"TMDB API error: {e.__class__.__name__}"
+                self._sleep_before_retry(attempt)
+                continue
+
+            if response.status_code == 200:
+                try:
+                    return response.json()
+                except ValueError:
+                    # Truncated body or a proxy's HTML error page: retry like a 5xx
+                    error = 'TMDB API error: invalid JSON'
+                    self._sleep_before_retry(attempt)
+                    continue
+            error = f"TMDB API error: {response.status_code}"
+
+            if response.status_code == 429:
+                self._block_for(self._retry_after(response))
+            elif response.status_code in RETRY_STATUSES:
+                self._sleep_before_retry(attempt)
+            else:
+                break
+
+        return {'error': error}
+
+    def _sleep_before_retry(self, attempt):
+        if attempt < self.max_retries:
+            time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_cap))
+
+    def _retry_after(self, response):
+        """Seconds to wait according to TMDB's rate-limit headers"""
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_rate_limit_wait)
+            except ValueError:
+                pass
+        reset = response.headers.get('X-RateLimit-Reset')
+        if reset:
+            try:
+                return min(max(float(reset) - time.time(), 0.0), self.max_rate_limit_wait)
+            except ValueError:
+                pass
+        return backoff_delay(1, self.backoff_base, self.backoff_cap)
+
+    def _block_for(self, seconds):
+        # Jitter the reopen time slightly so queued callers do not stampede
+        with self._lock:
+            until = time.time() + seconds + random.uniform(0, 0.25)
+            self._blocked_until = max(self._blocked_until, until)
+
+    def _wait_for_rate_limit(self):
+        delay = self._rate_limit_delay()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _rate_limit_delay(self):
+        with self._lock:
+            return self._blocked_until - time.time()
+
+
+class AsyncTMDBClient:
+    """Non-blocking TMDBClient.get_url over one pooled aiohttp session.
+
+    Create and use it from inside a single running event loop. Timeouts,
+    retries and backoff come from the wrapped sync client.
+    """
+
+    def __init__(self, sync_client, pool_size=100):
+        if aiohttp is None:
+            raise RuntimeError("AsyncTMDBClient requires aiohttp (pip install aiohttp)")
+        self.sync = sync_client
+        connect, read = sync_client.timeout
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read),
+            connector=aiohttp.TCPConnector(limit=pool_size))
+
+    async def get(self, endpoint, params=None):
+        return await self.get_url(f"{self.sync.base_url}/{endpoint.lstrip('/')}", params)
+
+    async def get_url(self, url, params=None):
+        """GET an absolute URL, returning the decoded JSON or an {'error': ...} dict"""
+        sync = self.sync
+        # Encode params the way requests does: None dropped, bools as 'True'/'False'
+        params = {k: str(v) if isinstance(v, bool) else v
+                  for k, v in (params or {}).items() if v is not None}
+        error = 'TMDB API error: no response'
+        for attempt in range(sync.max_retries + 1):
+            delay = sync._rate_limit_delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                async with self.session.get(url, params=params) as response:
+                    if response.status == 200:
+                        return await response.json(content_type=None)
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f"TMDB API error: {e.__class__.__name__}"
+                await self._sleep_before_retry(attempt)
+                continue
+            except ValueError:
+                # Truncated body or a proxy's HTML error page: retry like a 5xx
+                error = 'TMDB API error: invalid JSON'
+                await self._sleep_before_retry(attempt)
+                continue
+
+            error = f"TMDB API error: {status}"
+            if status == 429:
+                sync._block_for(sync._retry_after(response))
+            elif status in RETRY_STATUSES:
+                await self._sleep_before_retry(attempt)
+            else:
+                break
+
+        return {'error': error}
+
+    async def _sleep_before_retry(self, attempt):
+        if attempt < self.sync.max_retries:
+            await asyncio.sleep(backoff_delay(attempt, self.sync.backoff_base, self.sync.backoff_cap))
+
+    async def close(self):
+        await self.session.close()
+
+
+# Shared client used by app.py and utils.py
+client = TMDBClient(
+    base_url=os.getenv('TMDB_BASE_URL', 'https://api.themoviedb.org/3'),
+    pool_size=int(os.getenv('TMDB_POOL_SIZE', 20)),
+    timeout=(float(os.getenv('TMDB_CONNECT_TIMEOUT', 3.05)), float(os.getenv('TMDB_READ_TIMEOUT', 10))),
+    max_retries=int(os.getenv('TMDB_MAX_RETRIES', 3))
+)
@@ -1,62 +1,63 @@
-import requests
-import time
-BASE_URL = "https://api.themoviedb.org/3"
-
-
-def fetch_with_retry(url, params, retries=2, delay=0.5):
-    for _ in range(retries + 1):
-        try:
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                data = response.json().get("results", [])
-                if data:
-                    return data
-        except Exception as e:
-            print("Error:", e)
-        time.sleep(delay)
-    return []
-
-# Example: trending
-def get_trending_movies(api_key):
-    url = "https://api.themoviedb.org/3/trending/movie/week"
-    params = {'api_key': api_key}
-    return fetch_with_retry(url, params)
+from tmdb_cache import cache
+from tmdb_client import client
+
+BASE_URL = client.base_url
+
+
+def fetch_with_retry(url, params):
+    """Results list for a TMDB URL, [] on failure; client.get_url does the retrying"""
+    try:
+        return client.get_url(url, params).get("results", [])
+    except Exception as e:
+        print("Error:", e)
+        return []
+
+
+def cached_results(endpoint, params):
+    """Return the results list for a TMDB endpoint, served from the shared cache"""
+    return cache.get_or_fetch(endpoint, params, lambda: client.get(endpoint, params)).get('results', [])
+
+async def cached_results_async(tmdb, endpoint, params):
+    """cached_results for the ASGI entry point, fetching through an AsyncTMDBClient"""
+    response = await cache.get_or_fetch_async(endpoint, params, lambda: tmdb.get(endpoint, params))
+    return response.get('results', [])
+
+# (endpoint, params) for each movie list; the helpers below and asgi.py serve them
+def search_request(query, api_key):
+    return 'search/movie', {'api_key': api_key, 'query': query, 'include_adult': False}
 
-# Do the same for other categories (top rated, new releases, etc.)
+def popular_request(api_key, page=1):
+    return 'movie/popular', {'api_key': api_key, 'page': page}
 
+def top_rated_request(api_key, page=1):
+    return 'movie/top_rated', {'api_key': api_key, 'page': page}
+
+def trending_request(api_key):
+    return 'trending/movie/week', {'api_key': api_key}
+
+def new_releases_request(api_key, page=1):
+    return 'movie/now_playing', {'api_key': api_key, 'page': page}
+
+def genre_request(genre_id, api_key, page=1):
+    # A list of ids asks for movies in all of them
+    if isinstance(genre_id, (list, tuple)):
+        genre_id = genre_id[0] if len(genre_id) == 1 else ','.join(str(g) for g in genre_id)
+    return 'discover/movie', {'api_key': api_key, 'with_genres': genre_id, 'page': page}
 
 def search_movie(query, api_key):
-    url = f"{BASE_URL}/search/movie"
-    params = {'api_key': api_key, 'query': query, 'include_adult': False}
-    response = requests.get(url, params=params)
-    return response.json().get('results', []) if response.status_code == 200 else []
-
-def get_popular_movies(api_key):
-    url = f"{BASE_URL}/movie/popular"
-    params = {'api_key': api_key}
-    response = requests.get(url, params=params)
-    return response.json().get('results', []) if response.status_code == 200 else []
-
-def get_top_rated_movies(api_key):
-    url = f"{BASE_URL}/movie/top_rated"
-    params = {'api_key': api_key}
-    response = requests.get(url, params=params)
-    return response.json().get('results', []) if response.status_code == 200 else []
+    return cached_results(*search_request(query, api_key))
+
+def get_popular_movies(api_key, page=1):
+    return cached_results(*popular_request(api_key, page))
+
+def get_top_rated_movies(api_key, page=1):
+    return cached_results(*top_rated_request(api_key, page))
 
 def get_trending_movies(api_key):
-    url = f"{BASE_URL}/trending/movie/week"
-    params = {'api_key': api_key}
-    response = requests.get(url, params=params)
-    return response.json().get('results', []) if response.status_code == 200 else []
-
-def get_new_releases(api_key):
-    url = f"{BASE_URL}/movie/now_playing"
-    params = {'api_key': api_key}
-    response = requests.get(url, params=params)
-    return response.json().get('results', []) if response.status_code == 200 else []
-
-def get_movies_by_genre(genre_id, api_key):
-    url = f"{BASE_URL}/discover/movie"
-    params = {'api_key': api_key, 'with_genres': genre_id}
-    response = requests.get(url, params=params)
-    return response.json().get('results', []) if response.status_code == 200 else []
\ No newline at end of file
+    return cached_results(*trending_request(api_key))
+
+def get_new_releases(api_key, page=1):
+    return cached_results(*new_releases_request(api_key, page))
+
+def get_movies_by_genre(genre_id, api_key, page=1):
+    return cached_results(*genre_request(genre_id, api_key, page))